@@ -0,0 +1,197 @@
+"""Valorant Graph Analytics File
+
+This python module contains analytics of the map-agent weighted graph that are computed on its sparse adjacency
+matrix (see WeightedGraph.to_csr) instead of vertex by vertex:
+    - the weighted PageRank of every agent in the co-play graph (the agent-agent edges), a measure of how central an
+      agent is to the compositions played
+    - communities of agents that are played together (e.g. the agents of the main compositions of a period), found by
+      spectral clustering of the co-play graph
+    - the centrality of every agent on each map, in the co-play graph with each edge scaled by the map-agent weights
+      of its two agents on that map
+
+The analytics are kept in the registry, so they are computed once per data version.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+from scipy.cluster.vq import kmeans2
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.csgraph import laplacian
+
+from graph import WeightedGraph
+from instrumentation import timed
+
+DAMPING = 0.85
+MAX_COMMUNITIES = 6
+SEED = 0
+
+
+def pagerank(matrix: csr_matrix, damping: float = DAMPING, tolerance: float = 1e-10,
+             max_iterations: int = 200) -> np.ndarray:
+    """
+    Return the weighted PageRank of every vertex of the graph with the given adjacency matrix, where a random walk
+    follows each edge with a probability proportional to its weight (and jumps to any vertex from a vertex with no
+    edges)
+
+    >>> ranks = pagerank(csr_matrix(np.array([[0, 1, 1], [1, 0, 0], [1, 0, 0]], dtype=float)))
+    >>> [round(float(r), 3) for r in ranks]
+    [0.486, 0.257, 0.257]
+    """
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out_weights = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_weights == 0
+    transition = (diags(np.divide(1, out_weights, out=np.zeros(n), where=~dangling)) @ matrix).T.tocsr()
+    ranks = np.full(n, 1 / n)
+    for _ in range(max_iterations):
+        updated = damping * (transition @ ranks + ranks[dangling].sum() / n) + (1 - damping) / n
+        if np.abs(updated - ranks).sum() < tolerance:
+            return updated
+        ranks = updated
+    return ranks
+
+
+def spectral_communities(matrix: csr_matrix, max_communities: int = MAX_COMMUNITIES, seed: int = SEED) -> np.ndarray:
+    """
+    Return the community of every vertex of the graph with the given (symmetric) adjacency matrix, numbered from 0 in
+    the order of their first vertex, or -1 for a vertex with no edges
+
+    The communities are found by spectral clustering: the number of communities is the one (from 2 to
+    max_communities) with the largest gap between consecutive eigenvalues of the normalized Laplacian, and the
+    vertices are clustered by k-means on the matching eigenvectors.
+
+    >>> block = np.ones((3, 3)) - np.eye(3)
+    >>> adjacency = np.block([[block, np.zeros((3, 4))], [np.zeros((3, 3)), block, np.zeros((3, 1))],
+    ...                       [np.zeros((1, 7))]])
+    >>> adjacency[2, 3] = adjacency[3, 2] = 0.1
+    >>> spectral_communities(csr_matrix(adjacency)).tolist()
+    [0, 0, 0, 1, 1, 1, -1]
+    """
+    communities = np.full(matrix.shape[0], -1, dtype=np.int64)
+    connected = np.flatnonzero(np.asarray(matrix.sum(axis=1)).ravel() > 0)
+    n = len(connected)
+    if n <= 2:
+        communities[connected] = 0
+        return communities
+    values, vectors = np.linalg.eigh(laplacian(matrix[connected][:, connected], normed=True).toarray())
+    limit = min(max_communities, n - 1)
+    k = int(np.argmax(np.diff(values[:limit + 1])[1:])) + 2
+    embedding = vectors[:, :k]
+    norms = np.linalg.norm(embedding, axis=1, keepdims=True)
+    embedding = np.divide(embedding, norms, out=np.zeros_like(embedding), where=norms > 0)
+    _, labels = kmeans2(embedding, k, minit='++', seed=seed)
+    # number the communities in the order of their first vertex
+    _, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    communities[connected] = np.argsort(np.argsort(first))[inverse]
+    return communities
+
+
+class GraphAnalytics:
+    """The PageRank, communities and per-map centrality of the agents of a map-agent weighted graph.
+
+    Instance Attributes:
+        - agents: the agents, in the order of the rows and columns of self.co_play
+        - roles: the role of each agent, in the same order
+        - maps: the maps, in the order of the rows of self.map_weights
+        - co_play: the agent-agent weights of the graph (without self-loops)
+        - map_weights: the map-agent weight of every map and agent
+        - pagerank: the weighted PageRank of each agent in the co-play graph
+        - communities: the community of each agent in the co-play graph (-1 for an agent with no agent-agent edges)
+        - strength: the weighted degree of each agent on each map (with shape (len(maps), len(agents))), in the
+          co-play graph with the edge between a and b scaled by the weights of a and b on the map, as a share of the
+          total of the map
+        - map_pagerank: the PageRank of each agent on each map in the same scaled graph, with the same shape
+
+    Representation Invariants:
+        - self.co_play.shape == (len(self.agents), len(self.agents))
+        - self.map_weights.shape == (len(self.maps), len(self.agents))
+    """
+    agents: list[str]
+    roles: list[str]
+    maps: list[str]
+    co_play: csr_matrix
+    map_weights: csr_matrix
+    pagerank: np.ndarray
+    communities: np.ndarray
+    strength: np.ndarray
+    map_pagerank: np.ndarray
+
+    def __init__(self, graph: WeightedGraph, maps: list[str]) -> None:
+        """Initialize the analytics of the agents adjacent to maps in graph, including their agent-agent edges."""
+        matrix, index = graph.to_csr()
+        self.maps = [m for m in maps if m in index]
+        self.agents = sorted({a for m in self.maps for a in graph.get_neighbours(m)
+                              if graph.get_vertex(a).type == 'agent'})
+        self.roles = [graph.get_vertex(a).role for a in self.agents]
+        agent_ids = np.array([index[a] for a in self.agents], dtype=np.int64)
+        map_ids = np.array([index[m] for m in self.maps], dtype=np.int64)
+
+        co_play = matrix[agent_ids][:, agent_ids].tolil()
+        co_play.setdiag(0)
+        self.co_play = co_play.tocsr()
+        self.co_play.eliminate_zeros()
+        self.map_weights = matrix[map_ids][:, agent_ids].tocsr()
+
+        self.pagerank = pagerank(self.co_play)
+        self.communities = spectral_communities(self.co_play)
+        weights = self.map_weights.toarray()
+        strength = weights * (self.co_play @ weights.T).T
+        totals = strength.sum(axis=1, keepdims=True)
+        self.strength = np.divide(strength, totals, out=np.zeros_like(strength), where=totals > 0)
+        self.map_pagerank = np.array([pagerank(diags(w) @ self.co_play @ diags(w)) for w in weights])
+
+    def top_agents(self, map_played: Optional[str] = None, k: int = 5) -> list[dict]:
+        """
+        Return the k most central agents (on map_played if it is not None, and in the whole co-play graph otherwise)
+        in descending order of PageRank, in the format
+        [{'agent': agent_name, 'pagerank': pagerank, 'strength': strength, 'role': role}, ...]
+        where strength is only given for a map
+
+        Raise a KeyError if map_played is unknown.
+        """
+        if map_played is None:
+            ranks, strength = self.pagerank, None
+        elif map_played in self.maps:
+            ranks, strength = self.map_pagerank[self.maps.index(map_played)], self.strength[self.maps.index(map_played)]
+        else:
+            raise KeyError(map_played)
+        result = []
+        for i in np.argsort(-ranks, kind='stable')[:k].tolist():
+            item = {'agent': self.agents[i], 'pagerank': round(float(ranks[i]), 4), 'role': self.roles[i]}
+            if strength is not None:
+                item['strength'] = round(float(strength[i]), 4)
+            result.append(item)
+        return result
+
+    def community_list(self) -> list[list[str]]:
+        """
+        Return the agents of each community, in the order of the communities, in descending order of PageRank (leaving
+        out the agents with no community)
+        """
+        order = np.argsort(-self.pagerank, kind='stable').tolist()
+        return [[self.agents[i] for i in order if self.communities[i] == c]
+                for c in range(int(self.communities.max(initial=-1)) + 1)]
+
+
+@timed('build.graph_analytics')
+def build_graph_analytics(graph: WeightedGraph, maps: list[str]) -> GraphAnalytics:
+    """Return the analytics of the agents of graph (see GraphAnalytics)."""
+    return GraphAnalytics(graph, maps)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['numpy', 'scipy.cluster.vq', 'scipy.sparse', 'scipy.sparse.csgraph', 'graph',
+                          'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
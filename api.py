@@ -0,0 +1,365 @@
+"""Valorant Recommendation API File
+
+This python module contains a JSON API, served by the same Flask server as the Dash app, that answers batches of
+recommendation queries in one request. The queries are answered from an index that is built once per data version
+from the datasets in a DataRegistry, and the answers are returned as structured scores instead of English sentences.
+
+Example request (POST /api/recommend):
+    {"queries": [{"type": "best_agents", "map": "lotus", "role": "duelists", "teammates": ["raze", "jett"]},
+                 {"type": "compatible_agents", "agent": "omen", "limit": 3},
+                 {"type": "best_side", "map": "ascent"},
+                 {"type": "best_buy", "map": "ascent"},
+                 {"type": "team_rating", "team": "fnatic", "map": "lotus", "as_of": "2022"},
+                 {"type": "completions", "picks": ["jett", "omen"], "size": 5, "limit": 3},
+                 {"type": "similar_agents", "agent": "jett", "role": "duelists", "limit": 3},
+                 {"type": "substitute_agents", "agent": "jett", "teammates": ["raze", "reyna"], "limit": 3},
+                 {"type": "best_comp", "map": "lotus", "locked": ["raze"], "min_roles": {"controllers": 1},
+                  "max_roles": {"duelists": 2}, "excluded": ["jett"], "limit": 3},
+                 {"type": "central_agents", "map": "lotus", "limit": 5},
+                 {"type": "agent_communities"}]}
+
+The response contains one result per query, in the same order. A query that cannot be answered gets a result with
+an "error" key instead of failing the whole batch.
+
+The API also serves the probability of winning a round for each bin of loadout difference between the two teams
+(see loadout.py), e.g. GET /api/loadout-curve?map=lotus&year=2021&bin=1000 (map and year are optional; the year
+must have a full eco_data file).
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import threading
+
+from flask import Blueprint, Response, jsonify, request
+
+from graph import WeightedGraph
+from instrumentation import stage
+from itemsets import MAX_SET_SIZE
+from registry import DataRegistry
+from snapshot import Snapshot
+from tree import BUY_TYPES, side_verdict, buy_verdict
+
+MAX_QUERIES = 10000
+MIN_BIN_WIDTH = 100
+# the query fields that are lists of agent names
+AGENT_LIST_FIELDS = ('teammates', 'picks', 'locked', 'excluded')
+
+
+class RecommendationIndex:
+    """An index of every recommendation that can be asked for, built from a DataRegistry.
+
+    The best agents and compatible agents are read from the memory-mapped arrays of the snapshot of the registry if
+    it uses one (see snapshot.py), so that the worker does not build the weighted graph to answer them.
+
+    Instance Attributes:
+        - map_agents: maps each map to its agents in descending order of score, as (agent, score, role) tuples (empty
+          if they are read from a snapshot)
+        - partners: maps each agent to the agents most played with it, in descending order of score,
+          as (agent, score) tuples (empty if they are read from a snapshot)
+
+    Representation Invariants:
+        - all(s1[1] >= s2[1] for agents in self.map_agents.values() for s1, s2 in zip(agents, agents[1:]))
+    """
+    map_agents: dict[str, list[tuple[str, float, str]]]
+    partners: dict[str, list[tuple[str, float]]]
+    # Private Instance Attributes:
+    #     - _registry: the registry the side and buy type totals (and the other derived structures) come from
+    #     - _snapshot: the snapshot that the best agents and compatible agents are read from, or None if they are in
+    #       map_agents and partners
+    #     - _sides: the attacker/defender totals of each map asked for so far
+    #     - _buys: the buy type wins of each map asked for so far
+    #     - _lock: protects _sides and _buys
+    _registry: DataRegistry
+    _snapshot: Optional[Snapshot]
+    _sides: dict[str, tuple[int, int]]
+    _buys: dict[str, dict[str, int]]
+    _lock: threading.Lock
+
+    def __init__(self, registry: DataRegistry) -> None:
+        """Initialize an index of the data in registry."""
+        self.map_agents = {}
+        self.partners = {}
+        self._registry = registry
+        self._snapshot = registry.snapshot if isinstance(registry.snapshot, Snapshot) else None
+        if self._snapshot is None:
+            graph = registry.map_agent_graph()
+            for m in registry.map_ref():
+                self.map_agents[m] = _ranked([(a, graph.get_weight(a, m), graph.get_vertex(a).role)
+                                              for a in graph.get_neighbours(m)])
+                for a in graph.get_neighbours(m):
+                    if a not in self.partners:
+                        self.partners[a] = _ranked([(u, graph.get_weight(u, a)) for u in _agent_neighbours(graph, a)])
+        self._sides = {}
+        self._buys = {}
+        self._lock = threading.Lock()
+
+    def maps(self) -> list[str]:
+        """Return the maps of this index."""
+        return list(self.map_agents) if self._snapshot is None else list(self._snapshot.maps)
+
+    def best_agents(self, map_played: str, teammates: list[str], role: str = '',
+                    limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the agents to play on map_played in descending order of score, in the format
+        [{'agent': agent_name, 'score': score, 'role': role}, ...] (see graph.best_agent_for_map)
+
+        Raise a KeyError if map_played is not in this index.
+        """
+        taken = set(teammates)
+        ranked = self.map_agents[map_played] if self._snapshot is None else self._snapshot.ranked_agents(map_played)
+        agents = [{'agent': a, 'score': score, 'role': r} for a, score, r in ranked
+                  if a not in taken and (not role or r == role)]
+        return agents[:limit]
+
+    def compatible_agents(self, agent: str, limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the agents most played with agent in descending order of score, in the format
+        [{'agent': agent_name, 'score': score}, ...] (see graph.compatible_agents)
+
+        Raise a KeyError if agent is not in this index.
+        """
+        ranked = self.partners[agent] if self._snapshot is None else self._snapshot.ranked_partners(agent)
+        return [{'agent': a, 'score': score} for a, score in ranked[:limit]]
+
+    def best_side(self, map_played: str) -> dict:
+        """
+        Return the attacker and defender rounds won on map_played and which side it favours
+
+        Raise a KeyError if no round was played on map_played.
+        """
+        if map_played not in self._sides:
+            totals = self._registry.side_totals_for_map(map_played)
+            with self._lock:
+                self._sides[map_played] = totals
+        attack, defend = self._sides[map_played]
+        total = attack + defend
+        if not total:
+            raise KeyError(map_played)
+        return {'attack_rounds': attack, 'defend_rounds': defend,
+                'attack_share': round(attack / total, 4) if total else None, 'verdict': side_verdict(attack, defend)}
+
+    def similar_agents(self, agent: str, role: str = '', limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the agents (of the given role, if it is not empty) most similar to agent, in the format
+        [{'agent': agent_name, 'similarity': similarity, 'role': role}, ...] (see similarity.AgentSimilarity.similar)
+
+        Raise a KeyError if agent is unknown.
+        """
+        return self._registry.agent_similarity().similar(agent, 5 if limit is None else limit, role)
+
+    def substitute_agents(self, agent: str, teammates: list[str], limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the agents to play instead of agent when a teammate has taken it, in the same format as
+        RecommendationIndex.similar_agents (see similarity.AgentSimilarity.substitutes)
+
+        Raise a KeyError if agent is unknown.
+        """
+        return self._registry.agent_similarity().substitutes(agent, teammates, 3 if limit is None else limit)
+
+    def completions(self, picks: list[str], size: Optional[int] = None, limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the most frequent agent sets of the given size containing every agent in picks, in the format
+        [{'agents': [...], 'count': count, 'support': support, 'lift': lift}, ...] (see itemsets.AgentSets.completions)
+
+        Raise a KeyError if an agent in picks is unknown.
+        """
+        return self._registry.agent_sets().completions(picks, size, 10 if limit is None else limit)
+
+    def team_rating(self, team: str, map_played: Optional[str] = None, as_of: Optional[str] = None) -> dict:
+        """
+        Return the Elo rating of team (on map_played, if it is not None) as of the snapshot as_of, a year or a
+        'year/tournament' (see ratings.RatingEngine.rating)
+
+        Raise a KeyError if the team, the map or the snapshot is unknown.
+        """
+        return {'rating': self._registry.ratings().rating(team, map_played, as_of)}
+
+    def best_comps(self, map_played: str, locked: list[str], min_roles: dict[str, int], max_roles: dict[str, int],
+                   excluded: list[str], limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the best five-agent compositions on map_played with the given locked agents and role constraints, in
+        the format [{'agents': [...], 'score': score, 'map_score': map_score, 'pair_score': pair_score}, ...]
+        (see composition.CompOptimizer.best_comps)
+
+        Raise a KeyError if map_played or a locked agent is unknown, and a ValueError if too many agents are locked or
+        a role in min_roles or max_roles is unknown.
+        """
+        if limit == 0:
+            return []
+        return self._registry.comp_optimizer().best_comps(map_played, locked, min_roles, max_roles, excluded,
+                                                          1 if limit is None else limit)
+
+    def central_agents(self, map_played: Optional[str] = None, limit: Optional[int] = None) -> list[dict]:
+        """
+        Return the most central agents (on map_played, if it is not None) in descending order of PageRank, in the
+        format [{'agent': agent_name, 'pagerank': pagerank, 'role': role}, ...]
+        (see analytics.GraphAnalytics.top_agents)
+
+        Raise a KeyError if map_played is unknown.
+        """
+        return self._registry.graph_analytics().top_agents(map_played, 5 if limit is None else limit)
+
+    def agent_communities(self) -> list[list[str]]:
+        """Return the communities of agents played together (see analytics.GraphAnalytics.community_list)."""
+        return self._registry.graph_analytics().community_list()
+
+    def best_buy(self, map_played: str) -> dict:
+        """Return the rounds won with each buy type on map_played and which buy type is most effective."""
+        if map_played not in self._buys:
+            wins = self._registry.buy_wins_for_map(map_played)
+            with self._lock:
+                self._buys[map_played] = wins
+        wins = self._buys[map_played]
+        return {'wins': {buy_type: wins[buy_type] for buy_type in BUY_TYPES}, 'verdict': buy_verdict(wins)}
+
+
+def _agent_neighbours(graph: WeightedGraph, agent: str) -> list[str]:
+    """Return the agents (other than agent itself) adjacent to agent in graph."""
+    return [u for u in graph.get_neighbours(agent) if u != agent and graph.get_vertex(u).type == 'agent']
+
+
+def _ranked(items: list[tuple]) -> list[tuple]:
+    """
+    Return items sorted in descending order of their second element, breaking ties by their first element
+
+    >>> _ranked([('b', 1.0), ('a', 1.0), ('c', 2.0)])
+    [('c', 2.0), ('a', 1.0), ('b', 1.0)]
+    """
+    return sorted(items, key=lambda item: (-item[1], item[0]))
+
+
+def recommendation_index(registry: DataRegistry) -> RecommendationIndex:
+    """Return the recommendation index of the current data in registry, building it if necessary."""
+    return registry.cached('recommendation_index', lambda: RecommendationIndex(registry))
+
+
+def answer_query(index: RecommendationIndex, query: Any) -> dict:
+    """
+    Return the answer to one query of a batch, or a dictionary with an 'error' key if it cannot be answered
+
+    >>> answer_query(None, {'type': 'best_agents', 'map': 'lotus', 'teammates': 'raze'})
+    {'type': 'best_agents', 'error': 'teammates must be a list of strings'}
+    >>> answer_query(None, {'type': 'best_agents', 'map': 'lotus', 'teammates': 5})
+    {'type': 'best_agents', 'error': 'teammates must be a list of strings'}
+    """
+    if not isinstance(query, dict):
+        return {'error': 'each query must be an object'}
+    query_type = query.get('type')
+    limit = query.get('limit')
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        return {'type': query_type, 'error': 'limit must be a non-negative integer'}
+    for field in AGENT_LIST_FIELDS:
+        value = query.get(field)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            return {'type': query_type, 'error': f'{field} must be a list of strings'}
+    try:
+        if query_type == 'best_agents':
+            role = query.get('role') or ''
+            agents = index.best_agents(str(query['map']).lower(), [t.lower() for t in query.get('teammates') or []],
+                                       '' if role == 'all' else role, limit)
+            return {'type': query_type, 'map': query['map'], 'role': role, 'agents': agents}
+        elif query_type == 'compatible_agents':
+            return {'type': query_type, 'agent': query['agent'],
+                    'agents': index.compatible_agents(str(query['agent']).lower(), limit)}
+        elif query_type == 'best_side':
+            return dict({'type': query_type, 'map': query['map']}, **index.best_side(str(query['map']).lower()))
+        elif query_type == 'best_buy':
+            return dict({'type': query_type, 'map': query['map']}, **index.best_buy(str(query['map']).lower()))
+        elif query_type == 'similar_agents':
+            role = query.get('role') or ''
+            return {'type': query_type, 'agent': query['agent'],
+                    'agents': index.similar_agents(str(query['agent']).lower(), '' if role == 'all' else role, limit)}
+        elif query_type == 'substitute_agents':
+            teammates = [t.lower() for t in query.get('teammates') or []]
+            return {'type': query_type, 'agent': query['agent'],
+                    'agents': index.substitute_agents(str(query['agent']).lower(), teammates, limit)}
+        elif query_type == 'completions':
+            if query.get('picks') is None:
+                raise KeyError('picks')
+            picks = [agent.lower() for agent in query['picks']]
+            size = query.get('size')
+            if size is not None and (not isinstance(size, int) or not len(picks) < size <= MAX_SET_SIZE):
+                return {'type': query_type, 'error': f'size must be an integer from {len(picks) + 1} to {MAX_SET_SIZE}'}
+            return {'type': query_type, 'picks': picks, 'sets': index.completions(picks, size, limit)}
+        elif query_type == 'team_rating':
+            map_played, as_of = query.get('map'), query.get('as_of')
+            return dict({'type': query_type, 'team': query['team'], 'map': map_played, 'as_of': as_of},
+                        **index.team_rating(str(query['team']), None if map_played is None else str(map_played),
+                                            None if as_of is None else str(as_of)))
+        elif query_type == 'best_comp':
+            roles = {name: query.get(name) or {} for name in ('min_roles', 'max_roles')}
+            if not all(isinstance(r, dict) and all(isinstance(n, int) for n in r.values()) for r in roles.values()):
+                return {'type': query_type, 'error': 'min_roles and max_roles must map roles to integers'}
+            locked = [agent.lower() for agent in query.get('locked') or []]
+            excluded = [agent.lower() for agent in query.get('excluded') or []]
+            try:
+                comps = index.best_comps(str(query['map']).lower(), locked, roles['min_roles'], roles['max_roles'],
+                                         excluded, limit)
+            except ValueError as error:
+                return {'type': query_type, 'error': str(error)}
+            return {'type': query_type, 'map': query['map'], 'locked': locked, 'comps': comps}
+        elif query_type == 'central_agents':
+            map_played = query.get('map')
+            return {'type': query_type, 'map': map_played,
+                    'agents': index.central_agents(None if map_played is None else str(map_played).lower(), limit)}
+        elif query_type == 'agent_communities':
+            return {'type': query_type, 'communities': index.agent_communities()}
+        else:
+            return {'type': query_type, 'error': 'unknown query type'}
+    except KeyError as error:
+        return {'type': query_type, 'error': f'unknown or missing {error.args[0]}'}
+
+
+def api_blueprint(registry: DataRegistry) -> Blueprint:
+    """Return a Flask blueprint of the recommendation API, answering queries from the data in registry."""
+    blueprint = Blueprint('api', __name__, url_prefix='/api')
+
+    @blueprint.route('/recommend', methods=['POST'])
+    def recommend() -> tuple[Response, int]:
+        """Answer a batch of recommendation queries."""
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict) or not isinstance(body.get('queries'), list):
+            return jsonify({'error': 'expected a JSON object with a "queries" list'}), 400
+        if len(body['queries']) > MAX_QUERIES:
+            return jsonify({'error': f'at most {MAX_QUERIES} queries per request'}), 413
+        with stage('api.recommend'):
+            index = recommendation_index(registry)
+            results = [answer_query(index, query) for query in body['queries']]
+        return jsonify({'data_version': registry.data_version(), 'results': results}), 200
+
+    @blueprint.route('/loadout-curve', methods=['GET'])
+    def loadout_curve() -> tuple[Response, int]:
+        """Return the round win probability for each bin of loadout difference on a map in a year."""
+        map_played, year = request.args.get('map'), request.args.get('year')
+        try:
+            bin_width = int(request.args.get('bin', '1000'))
+        except ValueError:
+            bin_width = None
+        if bin_width is None or bin_width < MIN_BIN_WIDTH:
+            return jsonify({'error': f'bin must be an integer of at least {MIN_BIN_WIDTH}'}), 400
+        if year is not None and year not in registry.eco_years:  # the loadouts are only read from the full eco data
+            return jsonify({'error': f'year must be one of {list(registry.eco_years)}'}), 400
+        try:
+            with stage('api.loadout_curve'):
+                curve = registry.loadouts().win_probability_curve(map_played, year, bin_width)
+        except OSError:
+            return jsonify({'error': 'no eco data available'}), 503
+        return jsonify(dict({'data_version': registry.data_version(), 'map': map_played, 'year': year,
+                             'bin_width': bin_width}, **curve)), 200
+
+    return blueprint
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['threading', 'flask', 'graph', 'instrumentation', 'itemsets', 'registry', 'snapshot',
+                          'tree'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
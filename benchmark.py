@@ -0,0 +1,232 @@
+"""Valorant Benchmark File
+
+This python module contains a benchmark suite for the whole pipeline of the app. For each scale, it generates a
+synthetic dataset (see synthetic.py) and measures how long each phase takes and how much memory it needs at its peak:
+    - parse: reading the maps_scores and eco_data files and loading the agent csv files
+    - build: building the trees of every year and the weighted graph of every map and agent
+    - query: answering every best side, best buy, best agent and compatible agents question
+    - layout: laying out the agent graph and the game and eco trees (of the first matches of each year, like the
+      matches sampled for the tree visualizations of the app, see sampling.py)
+
+Each scale is run twice: once to time the phases, and once with tracemalloc to measure their peak memory, so that
+the allocation tracking does not slow down the timings. The results are saved as JSON, and can be compared with the
+results of an earlier commit to catch regressions, e.g.
+    python benchmark.py --scales 1 5 --output benchmarks/new.json --compare benchmarks/old.json
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from graph import best_agent_for_map, compatible_agents, return_graph
+from registry import DataRegistry
+from synthetic import MAPS, AGENT_ROLES, generate_dataset
+from tree import visualize_tree_game, visualize_tree_eco
+
+PHASES = ('parse', 'build', 'query', 'layout')
+ROLES = ('duelists', 'controllers', 'initiators', 'sentinels')
+LAYOUT_MATCHES = 16
+REGRESSION_RATIO = 1.2
+
+
+def phase_functions(registry: DataRegistry, layout_matches: int = LAYOUT_MATCHES) -> dict[str, Callable[[], Any]]:
+    """
+    Return a function running each phase of the pipeline on the data in registry, in the format {phase: function}
+
+    The phases must be run in the order of PHASES, since each phase uses the data loaded by the previous ones.
+    """
+    years = registry.years[-3:]  # the tree visualizations show three years
+
+    def parse() -> None:
+        for year in registry.years:
+            registry.game_data(year)
+        for year in registry.eco_years:
+            registry.eco_data(year)
+        registry.map_ref()
+        registry.agent_combos()
+
+    def build() -> None:
+        registry.vct_tree()
+        registry.eco_tree()
+        registry.map_agent_graph()
+
+    def query() -> None:
+        graph = registry.map_agent_graph()
+        for m in MAPS:
+            registry.best_side_for_map(m.lower())
+            registry.best_buy_for_map(m.lower())
+            for role in ROLES:
+                best_agent_for_map(graph, m.lower(), [], role)
+        for agent in AGENT_ROLES:
+            compatible_agents(graph, agent.lower())
+
+    def layout() -> None:
+        return_graph(registry.map_ref(), registry.agent_combos(), 'all', 'all', True)
+        visualize_tree_game(*[registry.game_sample(year, layout_matches) for year in years], years)
+        visualize_tree_eco(*[registry.eco_sample(year, layout_matches) for year in years], years)
+
+    return {'parse': parse, 'build': build, 'query': query, 'layout': layout}
+
+
+@contextmanager
+def working_directory(path: str) -> Iterator[None]:
+    """Run the code inside this context manager with path as the working directory.
+
+    The graph cleaning functions write their output to the working directory, so the benchmark runs in the directory
+    of the synthetic data to leave the cleaned files of the real data untouched.
+    """
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+def run_scale(data_dir: str, years: tuple[str, ...], layout_matches: int = LAYOUT_MATCHES) -> dict[str, dict]:
+    """
+    Return the time (in seconds) and the peak memory (in bytes) of every phase of the pipeline run on the data in
+    data_dir, in the format {phase: {'seconds': seconds, 'peak_bytes': peak_bytes}}
+    """
+    data_dir = os.path.abspath(data_dir)
+    results = {phase: {} for phase in PHASES}
+    with working_directory(data_dir):
+        registry = DataRegistry(os.path.join(data_dir, 'graph_data'), os.path.join(data_dir, 'tree_data'), years)
+        for phase, run in phase_functions(registry, layout_matches).items():
+            start = time.perf_counter()
+            run()
+            results[phase]['seconds'] = round(time.perf_counter() - start, 6)
+
+        registry = DataRegistry(os.path.join(data_dir, 'graph_data'), os.path.join(data_dir, 'tree_data'), years)
+        tracemalloc.start()
+        try:
+            for phase, run in phase_functions(registry, layout_matches).items():
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                run()
+                results[phase]['peak_bytes'] = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def run_benchmarks(scales: list[float], seed: int = 0, years: tuple[str, ...] = ('2021', '2022', '2023'),
+                   data_root: str = '', layout_matches: int = LAYOUT_MATCHES) -> dict[str, Any]:
+    """
+    Return the results of the benchmark at every scale in scales, together with the commit and environment they
+    were measured in
+
+    The synthetic datasets are generated in data_root (and kept there), or in a temporary directory if data_root is
+    empty.
+    """
+    results = {'commit': _commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+               'seed': seed, 'years': list(years), 'scales': {}}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for scale in scales:
+            data_dir = os.path.join(data_root or temp_dir, f'scale-{scale}-seed-{seed}')
+            start = time.perf_counter()
+            rows = generate_dataset(data_dir, scale, seed, years)
+            generate_seconds = round(time.perf_counter() - start, 6)
+            results['scales'][str(scale)] = {
+                'rows': {os.path.relpath(path, data_dir): n for path, n in rows.items()},
+                'generate_seconds': generate_seconds,
+                'phases': run_scale(data_dir, years, layout_matches)
+            }
+    return results
+
+
+def _commit() -> str:
+    """Return the hash of the current git commit, or 'unknown' if it cannot be found."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare_results(old: dict[str, Any], new: dict[str, Any], ratio: float = REGRESSION_RATIO) -> list[str]:
+    """
+    Return one line comparing the time and peak memory of each phase at each scale measured in both old and new,
+    marking with REGRESSION the ones where new is more than ratio times old
+
+    >>> old = {'commit': 'a', 'scales': {'1': {'phases': {'parse': {'seconds': 1.0, 'peak_bytes': 100}}}}}
+    >>> new = {'commit': 'b', 'scales': {'1': {'phases': {'parse': {'seconds': 1.5, 'peak_bytes': 100}}}}}
+    >>> for line in compare_results(old, new):
+    ...     print(line)
+    scale 1 parse: time 1.000s -> 1.500s (x1.50) REGRESSION, peak 0.0 MiB -> 0.0 MiB (x1.00)
+    """
+    lines = []
+    for scale, result in new['scales'].items():
+        if scale not in old['scales']:
+            continue
+        for phase, metrics in result['phases'].items():
+            before = old['scales'][scale]['phases'].get(phase)
+            if before is None:
+                continue
+            time_ratio = metrics['seconds'] / before['seconds'] if before['seconds'] else 1.0
+            peak_ratio = metrics['peak_bytes'] / before['peak_bytes'] if before['peak_bytes'] else 1.0
+            lines.append(f'scale {scale} {phase}: time {before["seconds"]:.3f}s -> {metrics["seconds"]:.3f}s '
+                         f'(x{time_ratio:.2f}){" REGRESSION" if time_ratio > ratio else ""}, '
+                         f'peak {before["peak_bytes"] / 2 ** 20:.1f} MiB -> {metrics["peak_bytes"] / 2 ** 20:.1f} MiB '
+                         f'(x{peak_ratio:.2f}){" REGRESSION" if peak_ratio > ratio else ""}')
+    return lines
+
+
+def format_results(results: dict[str, Any]) -> str:
+    """Return the time and peak memory of every phase at every scale in results as a table."""
+    lines = [f'{"scale":>8}  {"phase":<8}{"seconds":>12}{"peak MiB":>12}']
+    for scale, result in results['scales'].items():
+        for phase, metrics in result['phases'].items():
+            lines.append(f'{scale:>8}  {phase:<8}{metrics["seconds"]:>12.3f}{metrics["peak_bytes"] / 2 ** 20:>12.1f}')
+    return '\n'.join(lines)
+
+
+def _parse_args() -> argparse.Namespace:
+    """Return the command line arguments of the benchmark."""
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic data at several scales.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default='', help='keep the generated datasets in this directory')
+    parser.add_argument('--layout-matches', type=int, default=LAYOUT_MATCHES)
+    parser.add_argument('--output', default='', help='default: benchmarks/<commit>.json')
+    parser.add_argument('--compare', default='', help='results of an earlier run to compare with')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    args = _parse_args()
+    previous = None
+    if args.compare:
+        with open(args.compare) as old_file:
+            previous = json.load(old_file)
+    benchmark = run_benchmarks(args.scales, args.seed, data_root=args.data_dir, layout_matches=args.layout_matches)
+    output = args.output or os.path.join('benchmarks', f'{benchmark["commit"]}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as out_file:
+        json.dump(benchmark, out_file, indent=2)
+    print(format_results(benchmark))
+    print(f'results saved to {output}')
+    if previous is not None:
+        print('\n'.join(compare_results(previous, benchmark)))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['contextlib', 'argparse', 'json', 'os', 'platform', 'subprocess', 'tempfile', 'time',
+                          'tracemalloc', 'graph', 'registry', 'synthetic', 'tree'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,316 @@
+"""Valorant Columnar Cache File
+
+This python module contains a converter that writes each csv dataset (the map scores, the eco rounds, the agent pick
+rates and the agents picked by each team of every year) once into a directory of typed column files, and a reader that
+memory-maps only the columns a query needs.
+
+Layout of a dataset directory:
+    meta.json         the schema, the number of rows, the row groups and the min/max statistics of each row group
+    <column>.npy      one array per column; string columns are dictionary-encoded as int32 codes
+    <column>.json     the sorted dictionary of each string column
+
+The rows are clustered by year and map, and split into row groups of ROW_GROUP_SIZE rows. A query with filters (e.g.
+map='haven', year='2022') first skips every row group whose min/max statistics exclude the filters, and only then reads
+the filtered columns of the remaining groups to find the matching rows, so a year x map slice is read without parsing
+or scanning the whole dataset. The original row number of each row is kept in the 'row' column.
+
+Like a snapshot, a dataset directory is never modified: a new data version is written into a new directory. The
+columns are mapped lazily, so a registry still serving an older version may open its files long after it was loaded:
+the KEEP_VERSIONS most recent versions of each dataset are kept, and only older ones are deleted.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Optional, Union
+import csv
+import json
+import os
+import shutil
+
+import numpy as np
+
+from loadout import parse_credits
+from instrumentation import timed
+
+ROW_GROUP_SIZE = 4096
+MISSING = -1  # the value of missing integers
+KEEP_VERSIONS = 3  # the number of versions of each dataset kept in the cache directory
+
+# the columns of each dataset, in the order of the columns of its csv files, after the 'year' column added to every
+# dataset. Types: 'str' (dictionary-encoded), 'lower' (lowercased, then dictionary-encoded), 'int', 'credits'
+# (e.g. 3.9k) and 'percent' (e.g. 16%, stored as 0.16)
+DATASETS = {
+    'maps_scores': [('tournament', 'str'), ('stage', 'str'), ('match_type', 'str'), ('match', 'str'), ('map', 'lower'),
+                    ('team_a', 'str'), ('score_a', 'int'), ('attack_a', 'int'), ('defend_a', 'int'),
+                    ('overtime_a', 'int'), ('team_b', 'str'), ('score_b', 'int'), ('attack_b', 'int'),
+                    ('defend_b', 'int'), ('overtime_b', 'int'), ('duration', 'str')],
+    'eco_data': [('tournament', 'str'), ('stage', 'str'), ('match_type', 'str'), ('match', 'str'), ('map', 'lower'),
+                 ('round', 'int'), ('team', 'str'), ('loadout', 'credits'), ('remaining', 'credits'), ('type', 'str'),
+                 ('outcome', 'str')],
+    'agents_pick_rates': [('tournament', 'str'), ('stage', 'str'), ('match_type', 'str'), ('map', 'lower'),
+                          ('agent', 'str'), ('pick_rate', 'percent')],
+    'teams_picked_agents': [('tournament', 'str'), ('stage', 'str'), ('match_type', 'str'), ('map', 'lower'),
+                            ('team', 'str'), ('agent', 'str'), ('wins', 'int'), ('losses', 'int'), ('played', 'int')],
+}
+STRING_TYPES = ('str', 'lower')
+
+
+def encode_column(values: np.ndarray, column_type: str) -> tuple[np.ndarray, Optional[list[str]]]:
+    """
+    Return the array of the given csv values of a column of column_type, with the dictionary of its codes if it is a
+    string column (or None otherwise)
+
+    >>> encode_column(np.array(['Haven', 'bind', 'haven']), 'lower')
+    (array([1, 0, 1], dtype=int32), ['bind', 'haven'])
+    >>> encode_column(np.array(['13', '', '7']), 'int')
+    (array([13, -1,  7], dtype=int32), None)
+    >>> encode_column(np.array(['16%', '5%']), 'percent')
+    (array([0.16, 0.05]), None)
+    """
+    values = np.char.strip(values.astype(str))
+    if column_type in STRING_TYPES:
+        dictionary, codes = np.unique(np.char.lower(values) if column_type == 'lower' else values, return_inverse=True)
+        return codes.reshape(-1).astype(np.int32), dictionary.tolist()
+    elif column_type == 'int':
+        digits = np.char.isdigit(values)
+        return np.where(digits, np.where(digits, values, '0').astype(np.int64), MISSING).astype(np.int32), None
+    elif column_type == 'percent':
+        return np.char.rstrip(values, '%').astype(np.int64) / 100, None
+    else:
+        filled = values != ''
+        credits = parse_credits(np.where(filled, values, '0'))
+        return np.where(filled, credits, np.nan).astype(np.float32), None
+
+
+def write_dataset(dataset: str, sources: list[tuple[str, str]], path: str,
+                  row_group_size: int = ROW_GROUP_SIZE) -> None:
+    """
+    Write the csv files of dataset in sources (in the format [(year, csv_path), ...]) into the new directory path
+
+    Rows that do not have every column of the dataset are left out, and so are the sources that do not exist. If
+    another process writes path at the same time, the first directory to be complete is kept (both are written from
+    the same files), and this one is deleted.
+    """
+    schema = [('year', 'str')] + DATASETS[dataset]
+    rows = []
+    for year, source in sources:
+        if os.path.exists(source):
+            with open(source, newline='') as file:
+                reader = csv.reader(file)
+                next(reader, None)
+                rows.extend([year] + row for row in reader if len(row) >= len(schema) - 1 and row[0])
+    transposed = list(zip(*rows)) if rows else [() for _ in schema]
+
+    columns, dictionaries = {}, {}
+    for i, (name, column_type) in enumerate(schema):
+        columns[name], dictionary = encode_column(np.array(transposed[i], dtype=str), column_type)
+        if dictionary is not None:
+            dictionaries[name] = dictionary
+    # cluster the rows by year and map, keeping their order otherwise, so that row groups can be skipped
+    order = np.lexsort((columns['map'], columns['year']))
+    columns = {name: column[order] for name, column in columns.items()}
+    columns['row'] = order.astype(np.int32)
+
+    starts = list(range(0, len(order), row_group_size))
+    stats = {name: [[column[s:s + row_group_size].min().item(), column[s:s + row_group_size].max().item()]
+                    for s in starts] for name, column in columns.items() if column.dtype.kind == 'i'}
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for name, column in columns.items():
+        np.save(os.path.join(temp_path, name + '.npy'), column)
+    for name, dictionary in dictionaries.items():
+        with open(os.path.join(temp_path, name + '.json'), 'w') as file:
+            json.dump(dictionary, file)
+    with open(os.path.join(temp_path, 'meta.json'), 'w') as file:
+        json.dump({'dataset': dataset, 'rows': len(order), 'schema': schema + [('row', 'int')],
+                   'row_groups': [[s, min(s + row_group_size, len(order))] for s in starts], 'stats': stats}, file)
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+class ColumnarTable:
+    """A read-only, memory-mapped dataset written by write_dataset.
+
+    Instance Attributes:
+        - path: the directory of this dataset
+        - rows: the number of rows
+        - types: the type of each column, by name
+        - row_groups: the [start, stop) rows of each row group
+        - stats: the [min, max] of each integer (or string code) column in each row group, by name
+    """
+    path: str
+    rows: int
+    types: dict[str, str]
+    row_groups: np.ndarray
+    stats: dict[str, np.ndarray]
+    # Private Instance Attributes:
+    #     - _columns: the columns that have been mapped so far, by name
+    #     - _dictionaries: the dictionaries of the string columns that have been read so far, by name
+    _columns: dict[str, np.ndarray]
+    _dictionaries: dict[str, list[str]]
+
+    def __init__(self, path: str) -> None:
+        """Open the dataset in the directory path, without reading any column or dictionary yet."""
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        self.rows = meta['rows']
+        self.types = dict((name, column_type) for name, column_type in meta['schema'])
+        self.row_groups = np.array(meta['row_groups'], dtype=np.int64).reshape(-1, 2)
+        self.stats = {name: np.array(values, dtype=np.int64).reshape(-1, 2) for name, values in meta['stats'].items()}
+        self._columns = {}
+        self._dictionaries = {}
+
+    def dictionary(self, name: str) -> list[str]:
+        """Return the sorted dictionary of the string column called name."""
+        if name not in self._dictionaries:
+            with open(os.path.join(self.path, name + '.json'), 'r') as file:
+                self._dictionaries[name] = json.load(file)
+        return self._dictionaries[name]
+
+    def column(self, name: str) -> np.ndarray:
+        """Return the column called name, memory-mapped read-only (string columns are returned as codes)."""
+        if name not in self._columns:
+            self._columns[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode='r')
+        return self._columns[name]
+
+    def codes(self, name: str, values: Union[Any, list]) -> np.ndarray:
+        """Return the codes (or values, for a column that is not a string column) of the given value or values."""
+        values = values if isinstance(values, (list, tuple, set)) else [values]
+        if self.types[name] not in STRING_TYPES:
+            return np.array(list(values))
+        dictionary = self.dictionary(name)
+        if self.types[name] == 'lower':
+            values = [str(v).lower() for v in values]
+        positions = np.searchsorted(dictionary, values)
+        return np.array([p for p, v in zip(positions.tolist(), values) if p < len(dictionary) and dictionary[p] == v],
+                        dtype=np.int64)
+
+    def select(self, **filters: Any) -> np.ndarray:
+        """
+        Return the rows (in storage order) whose column equals each filter that is not None, where a filter is a value
+        or a list of accepted values, e.g. select(map='haven', year=['2021', '2022'])
+
+        The row groups whose statistics exclude a filter are skipped without reading them.
+        """
+        wanted = {name: self.codes(name, value) for name, value in filters.items() if value is not None}
+        keep = np.ones(len(self.row_groups), dtype=bool)
+        for name, codes in wanted.items():
+            if name in self.stats and len(codes):
+                low, high = self.stats[name][:, 0], self.stats[name][:, 1]
+                keep &= ((codes[None, :] >= low[:, None]) & (codes[None, :] <= high[:, None])).any(axis=1)
+            elif len(codes) == 0:
+                keep[:] = False
+        if not wanted:
+            return np.arange(self.rows)
+
+        selected = []
+        for start, stop in self.row_groups[keep].tolist():
+            mask = np.ones(stop - start, dtype=bool)
+            for name, codes in wanted.items():
+                mask &= np.isin(self.column(name)[start:stop], codes)
+            selected.append(np.nonzero(mask)[0] + start)
+        return np.concatenate(selected) if selected else np.empty(0, dtype=np.int64)
+
+    def read(self, columns: list[str], decode: bool = True, **filters: Any) -> dict[str, np.ndarray]:
+        """
+        Return the given columns of the rows matching filters (see ColumnarTable.select), in the format
+        {name: array}, with string columns decoded to their values if decode is True (and left as codes otherwise)
+        """
+        rows = self.select(**filters)
+        result = {}
+        for name in columns:
+            values = self.column(name)[rows]
+            if decode and self.types[name] in STRING_TYPES:
+                values = np.array(self.dictionary(name), dtype=object)[values]
+            result[name] = values
+        return result
+
+
+def ensure_dataset(dataset: str, sources: list[tuple[str, str]], root: str, version: str) -> ColumnarTable:
+    """
+    Return the columnar cache of dataset for the given data version in root, writing it from sources (see
+    write_dataset) first if it does not exist yet. Only the KEEP_VERSIONS most recently written versions of dataset
+    are kept in root, so that the registries still serving the previous versions can keep reading their columns.
+    """
+    os.makedirs(root, exist_ok=True)
+    name = f'{dataset}-{version}'
+    path = os.path.join(root, name)
+    if not os.path.isdir(path):
+        write_dataset(dataset, sources, path)
+        versions = [os.path.join(root, old) for old in os.listdir(root)
+                    if old.startswith(dataset + '-') and not old.endswith('.tmp')]
+        versions.sort(key=_written_time, reverse=True)
+        for old in versions[KEEP_VERSIONS:]:
+            if old != path:
+                shutil.rmtree(old, ignore_errors=True)
+    return ColumnarTable(path)
+
+
+def _written_time(path: str) -> float:
+    """Return the modification time of path, or 0 if it was deleted (e.g. by another worker) in the meantime."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0.0
+
+
+@timed('load.columnar_map_agent_data')
+def load_map_agent_data(picks: ColumnarTable, teams: ColumnarTable, agent_roles: dict,
+                        map_played: Optional[str] = None, year: Optional[str] = None) -> dict[str, dict[str, list]]:
+    """
+    Return the same dictionary as graph.load_map_agent_data, in the format {map_name: agent_ref}, from the columnar
+    caches of the agents_pick_rates (picks) and teams_picked_agents (teams) datasets, restricted to map_played and year
+    if they are not None
+
+    Rows of 'All Maps' are left out, and the maps and agents are in the order they first appear in the csv files.
+    """
+    pick = picks.read(['map', 'agent', 'pick_rate', 'row'], decode=False, map=map_played, year=year)
+    all_maps = picks.codes('map', 'all maps')
+    kept = ~np.isin(pick['map'], all_maps)
+    n_agents = len(picks.dictionary('agent'))
+    keys = pick['map'][kept].astype(np.int64) * n_agents + pick['agent'][kept]
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    rate_sums = np.bincount(inverse, weights=pick['pick_rate'][kept], minlength=len(unique))
+    rate_counts = np.bincount(inverse, minlength=len(unique))
+    first_rows = np.full(len(unique), np.iinfo(np.int64).max)
+    np.minimum.at(first_rows, inverse, pick['row'][kept])
+
+    team = teams.read(['map', 'agent', 'wins', 'played'], map=map_played, year=year)
+    positions = {(m, a): i for i, (m, a) in enumerate((picks.dictionary('map')[k // n_agents],
+                                                        picks.dictionary('agent')[k % n_agents])
+                                                       for k in unique.tolist())}
+    wins = np.zeros(len(unique), dtype=np.int64)
+    played = np.zeros(len(unique), dtype=np.int64)
+    index = np.array([positions.get(pair, -1) for pair in zip(team['map'].tolist(), team['agent'].tolist())],
+                     dtype=np.int64)
+    matched = index >= 0
+    np.add.at(wins, index[matched], team['wins'][matched])
+    np.add.at(played, index[matched], team['played'][matched])
+
+    map_ref = {}
+    for i in np.argsort(first_rows, kind='stable').tolist():
+        m, a = picks.dictionary('map')[unique[i] // n_agents], picks.dictionary('agent')[unique[i] % n_agents]
+        map_ref.setdefault(m, {})[a] = [float(rate_sums[i]), int(rate_counts[i]), int(wins[i]), int(played[i]),
+                                        agent_roles[a]]
+    return map_ref
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['csv', 'json', 'os', 'shutil', 'numpy', 'loadout', 'instrumentation'],
+        'allowed-io': ['write_dataset', 'ColumnarTable.__init__', 'ColumnarTable.dictionary'],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,236 @@
+"""Valorant Team Composition File
+
+This python module contains a solver for the best full five-agent team composition on a map. Given a map, agents
+that are already locked in and constraints on the number of agents of each role (e.g. at least one controller), it
+finds the compositions with the highest score, where the score of a composition is
+    (sum of the map-agent weights of its agents) + PAIR_WEIGHT * (sum of the co-play weights of its pairs of agents)
+The map-agent weights are the ones of the weighted graph (see graph.calc_map_agent_weight), and the co-play weights
+are the agent-agent weights of the graph (how often two agents are played together), scaled so that the highest one
+is MAX_PAIR_SCORE.
+
+The weights are copied once into matrices, and the search is a depth-first branch and bound over the agents in
+descending order of map-agent weight: a branch is cut as soon as an upper bound of the best score it can reach is no
+better than the worst of the best compositions found so far, or when the constraints can no longer be met.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+import heapq
+
+import numpy as np
+
+from graph import WeightedGraph
+from instrumentation import timed
+
+TEAM_SIZE = 5
+# the co-play weights are scaled so that the most played pair scores as much as the best map-agent weight
+MAX_PAIR_SCORE = 15.0
+# a team has twice as many pairs of agents (10) as agents (5), so each pair counts half as much as an agent
+PAIR_WEIGHT = 0.5
+
+
+class CompOptimizer:
+    """A solver for the best five-agent compositions on each map, over the weights of a weighted graph.
+
+    Instance Attributes:
+        - agents: the agents, in the order of the rows of self.map_weights and self.pair_scores
+        - roles: the role of each agent, in the same order
+        - maps: the maps, in the order of the columns of self.map_weights
+        - map_weights: the map-agent weight of every agent and map
+        - pair_scores: the scaled co-play weight of every pair of agents (0 on the diagonal)
+        - pair_weight: how much the co-play weights count compared to the map-agent weights
+
+    Representation Invariants:
+        - self.map_weights.shape == (len(self.agents), len(self.maps))
+        - self.pair_scores.shape == (len(self.agents), len(self.agents))
+        - np.allclose(self.pair_scores, self.pair_scores.T)
+    """
+    agents: list[str]
+    roles: list[str]
+    maps: list[str]
+    map_weights: np.ndarray
+    pair_scores: np.ndarray
+    pair_weight: float
+
+    def __init__(self, graph: WeightedGraph, maps: list[str], pair_weight: float = PAIR_WEIGHT) -> None:
+        """Initialize a solver over the agents adjacent to maps in graph, including their agent-agent edges."""
+        self.maps = list(maps)
+        self.agents = sorted({a for m in self.maps for a in graph.get_neighbours(m)
+                              if graph.get_vertex(a).type == 'agent'})
+        self.roles = [graph.get_vertex(a).role for a in self.agents]
+        self.pair_weight = pair_weight
+        self.map_weights = np.array([[graph.get_weight(a, m) for m in self.maps] for a in self.agents], dtype=float)
+        co_play = np.array([[graph.get_weight(a, b) if a != b else 0 for b in self.agents] for a in self.agents],
+                           dtype=float)
+        top = co_play.max(initial=0)
+        self.pair_scores = co_play * (MAX_PAIR_SCORE / top) if top > 0 else co_play
+
+    def best_comps(self, map_played: str, locked: Optional[list[str]] = None,
+                   min_roles: Optional[dict[str, int]] = None, max_roles: Optional[dict[str, int]] = None,
+                   excluded: Optional[list[str]] = None, k: int = 1) -> list[dict]:
+        """
+        Return the k best compositions of TEAM_SIZE agents on map_played that contain every agent in locked, none of
+        the agents in excluded, and at least min_roles[role] and at most max_roles[role] agents of each role in these
+        dictionaries, in descending order of score, in the format
+        [{'agents': [...], 'score': score, 'map_score': map_score, 'pair_score': pair_score}, ...]
+        where the agents of each composition are in descending order of map-agent weight. Return an empty list if no
+        composition meets the constraints.
+
+        Raise a KeyError if map_played or an agent in locked is unknown, and a ValueError if more than TEAM_SIZE agents
+        are locked, if a role in min_roles or max_roles is unknown or if k is less than 1.
+
+        >>> g = WeightedGraph()
+        >>> g.add_vertex('ascent', 'map')
+        >>> for agent, role, weight in [('jett', 'duelists', 9), ('raze', 'duelists', 8), ('omen', 'controllers', 7),
+        ...                             ('sova', 'initiators', 6), ('killjoy', 'sentinels', 5),
+        ...                             ('cypher', 'sentinels', 4)]:
+        ...     g.add_vertex(agent, 'agent', role)
+        ...     g.add_edge('ascent', agent, weight)
+        >>> CompOptimizer(g, ['ascent']).best_comps('ascent', max_roles={'duelists': 1})
+        [{'agents': ['jett', 'omen', 'sova', 'killjoy', 'cypher'], 'score': 31.0, 'map_score': 31.0, 'pair_score': 0.0}]
+        >>> CompOptimizer(g, ['ascent']).best_comps('ascent', min_roles={'duelist': 1})
+        Traceback (most recent call last):
+        ...
+        ValueError: unknown roles: duelist
+        """
+        if map_played not in self.maps:
+            raise KeyError(map_played)
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        unknown_roles = (set(min_roles or {}) | set(max_roles or {})) - set(self.roles)
+        if unknown_roles:
+            raise ValueError(f'unknown roles: {", ".join(sorted(unknown_roles))}')
+        column = self.map_weights[:, self.maps.index(map_played)]
+        locked_ids = [self._index(a) for a in dict.fromkeys(locked or [])]
+        if len(locked_ids) > TEAM_SIZE:
+            raise ValueError(f'at most {TEAM_SIZE} agents can be locked')
+        skipped = set(locked_ids) | {self.agents.index(a) for a in excluded or [] if a in self.agents}
+        candidates = sorted((i for i in range(len(self.agents)) if i not in skipped), key=lambda i: (-column[i], i))
+
+        search = _Search(self, column.tolist(), candidates, dict(min_roles or {}), dict(max_roles or {}), k)
+        search.run(locked_ids)
+        return [self._result(ids, column) for _, ids in sorted(search.best, key=lambda item: (-item[0], item[1]))]
+
+    def _index(self, agent: str) -> int:
+        """Return the index of agent in self.agents, raising a KeyError if it is unknown."""
+        if agent not in self.agents:
+            raise KeyError(agent)
+        return self.agents.index(agent)
+
+    def _result(self, ids: tuple[int, ...], column: np.ndarray) -> dict:
+        """Return the description of the composition of the agents with the given indexes on a map (see best_comps)."""
+        ordered = sorted(ids, key=lambda i: (-column[i], i))
+        map_score = float(column[list(ordered)].sum())
+        pair_score = self.pair_weight * float(sum(self.pair_scores[i, j] for n, i in enumerate(ordered)
+                                                  for j in ordered[n + 1:]))
+        return {'agents': [self.agents[i] for i in ordered], 'score': round(map_score + pair_score, 2),
+                'map_score': round(map_score, 2), 'pair_score': round(pair_score, 2)}
+
+
+class _Search:
+    """The state of one branch and bound search of CompOptimizer.best_comps.
+
+    Instance Attributes:
+        - best: a min-heap of the (score, agent indexes) of the best compositions found so far, at most k of them
+        - nodes: the number of partial compositions visited
+    """
+    best: list[tuple[float, tuple[int, ...]]]
+    nodes: int
+    # Private Instance Attributes:
+    #     - _map: the map-agent weight of each agent on the map
+    #     - _pairs: the co-play score of every pair of agents, multiplied by the pair weight
+    #     - _best_pair: the highest value of _pairs of each agent
+    #     - _roles: the role of each agent
+    #     - _candidates: the agents that can be added to the locked agents, in descending order of map-agent weight
+    #     - _min_roles, _max_roles: the role constraints
+    #     - _k: the number of compositions to find
+    _map: list[float]
+    _pairs: list[list[float]]
+    _best_pair: list[float]
+    _roles: list[str]
+    _candidates: list[int]
+    _min_roles: dict[str, int]
+    _max_roles: dict[str, int]
+    _k: int
+
+    def __init__(self, optimizer: CompOptimizer, map_weights: list[float], candidates: list[int],
+                 min_roles: dict[str, int], max_roles: dict[str, int], k: int) -> None:
+        """Initialize a search of the k best compositions of the candidates on a map with the given weights."""
+        pairs = optimizer.pair_weight * optimizer.pair_scores
+        self._map = map_weights
+        self._pairs = pairs.tolist()
+        self._best_pair = pairs.max(axis=1, initial=0).tolist()
+        self._roles = optimizer.roles
+        self._candidates = candidates
+        self._min_roles, self._max_roles = min_roles, max_roles
+        self._k = k
+        self.best = []
+        self.nodes = 0
+
+    def run(self, locked: list[int]) -> None:
+        """Search every composition containing the locked agents, if the locked agents meet the role maxima."""
+        counts = {}
+        for i in locked:
+            counts[self._roles[i]] = counts.get(self._roles[i], 0) + 1
+        if all(counts.get(role, 0) <= limit for role, limit in self._max_roles.items()):
+            score = sum(self._map[i] for i in locked) + sum(self._pairs[i][j] for n, i in enumerate(locked)
+                                                            for j in locked[n + 1:])
+            self._expand(list(locked), counts, score, 0)
+
+    def _expand(self, chosen: list[int], counts: dict[str, int], score: float, start: int) -> None:
+        """Search every composition made of chosen and of agents of self._candidates from position start on."""
+        self.nodes += 1
+        missing = TEAM_SIZE - len(chosen)
+        if sum(max(0, n - counts.get(role, 0)) for role, n in self._min_roles.items()) > missing:
+            return
+        if missing == 0:
+            self._record(score, chosen)
+            return
+
+        gains = []
+        for position in range(start, len(self._candidates)):
+            i = self._candidates[position]
+            if counts.get(self._roles[i], 0) < self._max_roles.get(self._roles[i], TEAM_SIZE):
+                gains.append((self._map[i] + sum(self._pairs[c][i] for c in chosen), position, i))
+        if len(gains) < missing:
+            return
+        # every pair of added agents scores at most the mean of their highest pair scores
+        bound = score + sum(sorted((g + (missing - 1) / 2 * self._best_pair[i] for g, _, i in gains),
+                                   reverse=True)[:missing])
+        if len(self.best) == self._k and bound <= self.best[0][0]:
+            return
+
+        for gain, position, i in gains:
+            counts[self._roles[i]] = counts.get(self._roles[i], 0) + 1
+            chosen.append(i)
+            self._expand(chosen, counts, score + gain, position + 1)
+            chosen.pop()
+            counts[self._roles[i]] -= 1
+
+    def _record(self, score: float, chosen: list[int]) -> None:
+        """Keep the composition of the chosen agents if it is one of the k best found so far."""
+        item = (score, tuple(sorted(chosen)))
+        if len(self.best) < self._k:
+            heapq.heappush(self.best, item)
+        elif score > self.best[0][0]:
+            heapq.heapreplace(self.best, item)
+
+
+@timed('build.comp_optimizer')
+def build_comp_optimizer(graph: WeightedGraph, maps: list[str]) -> CompOptimizer:
+    """Return the composition solver of the agents of graph (see CompOptimizer)."""
+    return CompOptimizer(graph, maps)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['heapq', 'numpy', 'graph', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
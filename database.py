@@ -0,0 +1,292 @@
+"""Valorant Database File
+
+This python module contains an optional storage backend that ingests every dataset of a DataRegistry (the agent
+pick rates, the agents picked by each team, the agent combinations and roles, the map scores and the eco rounds of
+every year) into a local SQLite database, and answers the same queries as a Snapshot with SQL.
+
+The tables are indexed on (map), (year, map), (team) and (agent), so filters on any of these and the aggregations
+behind each query are pushed down into SQLite and only touch the relevant rows, instead of rescanning a whole csv
+file in Python. Each file is ingested with one executemany call, in a single transaction, and the indexes are built
+once every row has been inserted.
+
+Maps are stored lowercased. Every row is kept, so (like a snapshot's) the attacker/defender totals can be slightly
+higher than the ones computed from the trees, which keep one row per team in a match. This difference is intended:
+the tables hold the files as they are, and a query is a plain aggregation over them, so the totals are the same as
+the ones the side intervals read from the columnar cache (see side_bias.columnar_side_rounds). Like a snapshot, a
+database is never modified after it is written: it is written into a temporary file that atomically replaces the
+database file once it is complete, while holding an exclusive lock on <path>.lock so that only one server worker
+writes it.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from itertools import groupby
+from typing import Iterator, Optional
+import csv
+import os
+import sqlite3
+import threading
+
+from tree import BUY_TYPES, side_verdict, buy_verdict
+from registry import DataRegistry
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where only one worker should write the database
+    fcntl = None
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE agent_roles (agent TEXT PRIMARY KEY, role TEXT);
+CREATE TABLE pick_rates (tournament TEXT, stage TEXT, match_type TEXT, map TEXT, agent TEXT, pick_rate REAL);
+CREATE TABLE teams_picked (tournament TEXT, stage TEXT, match_type TEXT, map TEXT, team TEXT, agent TEXT,
+                           wins INTEGER, losses INTEGER, played INTEGER);
+CREATE TABLE agent_combos (combo INTEGER, agent TEXT);
+CREATE TABLE map_sides (year TEXT, tournament TEXT, stage TEXT, match_type TEXT, match TEXT, map TEXT, team TEXT,
+                        score INTEGER, attack INTEGER, defend INTEGER, overtime INTEGER, duration TEXT);
+CREATE TABLE eco_rounds (year TEXT, tournament TEXT, stage TEXT, match_type TEXT, match TEXT, map TEXT,
+                         round INTEGER, team TEXT, loadout REAL, remaining REAL, type TEXT, outcome TEXT);
+"""
+INDEXES = """
+CREATE INDEX pick_rates_map ON pick_rates (map);
+CREATE INDEX pick_rates_agent ON pick_rates (agent);
+CREATE INDEX teams_picked_map ON teams_picked (map);
+CREATE INDEX teams_picked_team ON teams_picked (team);
+CREATE INDEX teams_picked_agent ON teams_picked (agent);
+CREATE INDEX agent_combos_agent ON agent_combos (agent);
+CREATE INDEX map_sides_map ON map_sides (map);
+CREATE INDEX map_sides_year_map ON map_sides (year, map);
+CREATE INDEX map_sides_team ON map_sides (team);
+CREATE INDEX eco_rounds_map ON eco_rounds (map);
+CREATE INDEX eco_rounds_year_map ON eco_rounds (year, map);
+CREATE INDEX eco_rounds_team ON eco_rounds (team);
+"""
+
+
+class Database:
+    """A read-only SQLite database of the datasets of a DataRegistry, with the same queries as a Snapshot.
+
+    Instance Attributes:
+        - path: the database file
+        - version: the data version of the files this database was written from
+    """
+    path: str
+    version: str
+    # Private Instance Attributes:
+    #     - _local: holds the connection of each thread (sqlite3 connections cannot be shared between threads)
+    _local: threading.local
+
+    def __init__(self, path: str) -> None:
+        """Open the database at path read-only."""
+        self.path = path
+        self._local = threading.local()
+        self.version = self._query('SELECT value FROM meta WHERE key = ?', ('version',))[0][0]
+
+    def _query(self, sql: str, parameters: tuple = ()) -> list[tuple]:
+        """Return the rows of the result of sql with the given parameters, on the connection of this thread."""
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)
+        return self._local.connection.execute(sql, parameters).fetchall()
+
+    def map_ref(self, map_played: Optional[str] = None, agent: Optional[str] = None) -> dict[str, dict[str, list]]:
+        """
+        Return the map-agent data in the format {map_name: agent_ref} (see graph.load_map_agent_data), restricted to
+        map_played and agent if they are not None
+        """
+        where, parameters = _where({'map': map_played, 'agent': agent})
+        picks = self._query('SELECT p.map, p.agent, SUM(p.pick_rate), COUNT(*), r.role FROM pick_rates p '
+                            'LEFT JOIN agent_roles r ON r.agent = p.agent '
+                            + _where({'map': map_played, 'agent': agent}, 'p.')[0] + ' GROUP BY p.map, p.agent',
+                            parameters)
+        map_ref = {}
+        for m, a, rate_sum, rate_count, role in picks:
+            map_ref.setdefault(m, {})[a] = [rate_sum, rate_count, 0, 0, role]
+        for m, a, wins, played in self._query('SELECT map, agent, SUM(wins), SUM(played) FROM teams_picked ' + where
+                                              + ' GROUP BY map, agent', parameters):
+            if m in map_ref and a in map_ref[m]:
+                map_ref[m][a][2], map_ref[m][a][3] = wins, played
+        return map_ref
+
+    def agent_combos(self) -> list[set]:
+        """Return the list of agent combinations (see graph.load_agent_combo_data)."""
+        rows = self._query('SELECT combo, agent FROM agent_combos ORDER BY combo')
+        return [{agent for _, agent in group} for _, group in groupby(rows, key=lambda row: row[0])]
+
+    def side_totals_for_map(self, map_played: str, year: Optional[str] = None,
+                            team: Optional[str] = None) -> tuple[int, int]:
+        """
+        Return the total Attacker and Defender rounds won on map_played (see Tree.side_totals_for_map), in year and by
+        team if they are not None
+        """
+        where, parameters = _where({'year': year, 'map': map_played.lower(), 'team': team})
+        attack, defend = self._query('SELECT SUM(attack), SUM(defend) FROM map_sides ' + where, parameters)[0]
+        return (attack or 0, defend or 0)
+
+    def buy_wins_for_map(self, map_played: str, year: Optional[str] = None,
+                         team: Optional[str] = None) -> dict[str, int]:
+        """
+        Return the number of rounds won with each buy type on map_played (see Tree.buy_wins_for_map), in year and by
+        team if they are not None
+        """
+        where, parameters = _where({'year': year, 'map': map_played.lower(), 'team': team})
+        wins = dict(self._query(f"SELECT type, COUNT(*) FROM eco_rounds {where} AND outcome = 'Win' GROUP BY type",
+                                parameters))
+        return {buy_type: wins.get(buy_type, 0) for buy_type in BUY_TYPES}
+
+    def best_side_for_map(self, map_played: str) -> str:
+        """Return the same string as Tree.best_side_for_map, computed from this database."""
+        return side_verdict(*self.side_totals_for_map(map_played))
+
+    def best_buy_for_map(self, map_played: str) -> str:
+        """Return the same string as Tree.best_buy_for_map, computed from this database."""
+        return buy_verdict(self.buy_wins_for_map(map_played))
+
+
+def _where(filters: dict[str, Optional[str]], prefix: str = '') -> tuple[str, tuple]:
+    """
+    Return the WHERE clause and parameters that keep the rows whose column (prefixed by prefix, e.g. a table alias)
+    equals each filter that is not None
+
+    >>> _where({'year': None, 'map': 'haven', 'team': 'FNATIC'})
+    ('WHERE map = ? AND team = ?', ('haven', 'FNATIC'))
+    """
+    used = {column: value for column, value in filters.items() if value is not None}
+    if not used:
+        return ('WHERE 1', ())
+    return ('WHERE ' + ' AND '.join(f'{prefix}{column} = ?' for column in used), tuple(used.values()))
+
+
+def _int(value: str) -> Optional[int]:
+    """Return value as an integer, or None if it is empty or not a number."""
+    return int(value) if value.strip().isdigit() else None
+
+
+def _credits(value: str) -> Optional[float]:
+    """
+    Return a credit value of the eco_data files (e.g. '3.9k') as a number of credits, or None if it is empty
+
+    >>> _credits('3.9k'), _credits('800'), _credits('')
+    (3900.0, 800.0, None)
+    """
+    value = value.strip()
+    if not value:
+        return None
+    return float(value[:-1]) * 1000 if value.endswith('k') else float(value)
+
+
+def _rows(path: str) -> Iterator[list[str]]:
+    """Yield the rows of the csv file at path, without its header."""
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        yield from reader
+
+
+def _map_sides(year: str, path: str) -> Iterator[tuple]:
+    """Yield one map_sides row for each team of each map of the maps_scores file at path."""
+    for row in _rows(path):
+        if len(row) > 14 and row[0]:
+            for team in (5, 10):
+                yield (year, row[0], row[1], row[2], row[3], row[4].lower(), row[team], _int(row[team + 1]),
+                       _int(row[team + 2]), _int(row[team + 3]), _int(row[team + 4]), row[15] if len(row) > 15 else '')
+
+
+def _eco_rounds(year: str, path: str) -> Iterator[tuple]:
+    """Yield the eco_rounds row of each row of the eco_data file at path."""
+    for row in _rows(path):
+        if len(row) > 10 and row[0]:
+            yield (year, row[0], row[1], row[2], row[3], row[4].lower(), _int(row[5]), row[6], _credits(row[7]),
+                   _credits(row[8]), row[9], row[10])
+
+
+def _agent_combos(path: str) -> Iterator[tuple[int, str]]:
+    """Yield a (combo id, agent) row for each agent of each combination of the all_agents file at path."""
+    for combo, row in enumerate(_rows(path)):
+        for agent in set(row[0].replace(' ', '').split(',')):
+            yield (combo, agent)
+
+
+def write_database(registry: DataRegistry, path: str) -> Database:
+    """
+    Ingest every dataset of registry into a new SQLite database at path (replacing the database there, if any), and
+    return it
+
+    Data files of registry that do not exist are left out.
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            insert = {
+                registry.graph_path('agent_roles.csv'): ('agent_roles', lambda p: (
+                    (row[0].lower(), row[1].lower()) for row in _rows(p))),
+                registry.graph_path('all_agents.csv'): ('agent_combos', _agent_combos),
+            }
+            for _, source in registry.columnar_sources('agents_pick_rates'):
+                insert[source] = ('pick_rates', lambda p: (
+                    (*row[:3], row[3].lower(), row[4], int(row[5][:-1]) / 100)
+                    for row in _rows(p) if row[3] != 'All Maps'))
+            for _, source in registry.columnar_sources('teams_picked_agents'):
+                insert[source] = ('teams_picked', lambda p: (
+                    (*row[:3], row[3].lower(), *row[4:6], _int(row[6]), _int(row[7]), _int(row[8]))
+                    for row in _rows(p)))
+            for source, (table, rows) in insert.items():
+                if os.path.exists(source):
+                    _insert(connection, table, rows(source))
+            for year in registry.years:
+                if os.path.exists(registry.game_path(year)):
+                    _insert(connection, 'map_sides', _map_sides(year, registry.game_path(year)))
+                if year in registry.eco_years:
+                    _insert(connection, 'eco_rounds', _eco_rounds(year, registry.eco_path(year)))
+            connection.executescript(INDEXES)
+            connection.execute('INSERT INTO meta VALUES (?, ?)', ('version', registry.data_version()))
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+    os.replace(temp_path, path)  # atomic, so no process opens a partial database
+    return Database(path)
+
+
+def _insert(connection: sqlite3.Connection, table: str, rows: Iterator[tuple]) -> None:
+    """Insert rows into table with one executemany call."""
+    n_columns = len(connection.execute(f'SELECT * FROM {table} LIMIT 0').description)
+    connection.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" * n_columns)})', rows)
+
+
+def ensure_database(registry: DataRegistry, path: str) -> Database:
+    """
+    Return the database at path if it was written from the same data version as registry, and otherwise write a new
+    one from registry and return it
+
+    Only one process at a time checks and writes the database; the others wait and then open the database written by
+    the first one instead of ingesting the data themselves.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                database = Database(path)
+                if database.version == registry.data_version():
+                    return database
+            return write_database(registry, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['itertools', 'csv', 'os', 'sqlite3', 'threading', 'fcntl', 'tree', 'registry'],
+        'allowed-io': ['_rows', 'ensure_database'],
+        'max-nested-blocks': 5
+    })
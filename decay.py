@@ -0,0 +1,194 @@
+"""Valorant Time Decay File
+
+This python module contains an optional exponential time-decay weighting of the map-agent data of
+load_map_agent_data, so that the map-agent weights reflect the current meta instead of treating a pick from the first
+qualifier of a year the same as one from Champions. Each pick rate and win record is weighted by
+    0.5 ** ((latest event date - event date) / half_life_days)
+and the four sums behind each map-agent weight (see graph.calc_map_agent_weight) become decayed sums.
+
+The pick files have no dates, so the date of each record is the end date of its event, looked up from the tournament
+name in EVENT_CALENDAR (see event_date).
+
+The decayed sums are kept as accumulators relative to a fixed epoch: a record of date t adds its values multiplied by
+2 ** ((t - epoch) / half_life_days), so adding a record is O(1), and a sum at any later date is its accumulator times
+one common factor. Every map-agent weight is a ratio of two of these sums, so the common factor cancels out: the
+weights do not need to be recomputed when time advances, only when new records are added. The app does not add
+records one at a time: when the data files change, the new registry (see watcher.py) rebuilds the accumulators in
+full from its partitions with load_decayed_map_ref. add_pick and add_result are the per-record form of the same sums,
+for a caller that extends an existing DecayedMapRef.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+import datetime
+import re
+
+import numpy as np
+
+from instrumentation import timed
+from partitions import AgentPartitions, SUMS
+
+HALF_LIFE_DAYS = 90.0
+# the (month, day) each kind of event ends, checked in order against the part of the tournament name after the colon
+# (e.g. 'Masters Tokyo' in 'Champions Tour 2023: Masters Tokyo'), with the first matching keyword used
+EVENT_CALENDAR = (
+    ('Lock-In', (3, 4)),
+    ('League', (5, 28)),
+    ('Masters', (6, 25)),
+    ('Qualifier', (7, 16)),
+    ('Champions', (8, 26)),
+)
+# the (month, day) of an event whose name matches no keyword
+DEFAULT_EVENT_DAY = (7, 1)
+# the largest accumulator scale before the accumulators are moved to a later epoch
+MAX_SCALE = 2.0 ** 64
+
+
+def event_date(tournament: str, year: Optional[str] = None) -> datetime.date:
+    """
+    Return the (approximate) end date of the event tournament, taking its year from its name, or from year if the
+    name has none (or from the current year if year is None too)
+
+    >>> event_date('Champions Tour 2023: Masters Tokyo')
+    datetime.date(2023, 6, 25)
+    >>> event_date('Champions Tour 2023: Champions China Qualifier')
+    datetime.date(2023, 7, 16)
+    >>> event_date('Valorant Champions 2023')
+    datetime.date(2023, 8, 26)
+    >>> event_date('Spring Invitational', '2022')
+    datetime.date(2022, 7, 1)
+    """
+    found = re.search(r'\b(\d{4})\b', tournament)
+    event_year = int(found.group(1)) if found else int(year) if year else datetime.date.today().year
+    name = tournament.split(':', 1)[-1]
+    month, day = next((date for keyword, date in EVENT_CALENDAR if keyword in name), DEFAULT_EVENT_DAY)
+    return datetime.date(event_year, month, day)
+
+
+class DecayedMapRef:
+    """The time-decayed sums of the map-agent data, updatable one record at a time.
+
+    Instance Attributes:
+        - half_life_days: the number of days after which a record counts half as much
+        - epoch: the date the accumulators are relative to
+        - roles: the role of each agent
+
+    Representation Invariants:
+        - self.half_life_days > 0
+    """
+    half_life_days: float
+    epoch: datetime.date
+    roles: dict[str, str]
+    # Private Instance Attributes:
+    #     - _sums: the accumulators of each map and agent (see SUMS), in the order the maps and agents were added
+    _sums: dict[str, dict[str, list[float]]]
+
+    def __init__(self, roles: dict[str, str], epoch: datetime.date, half_life_days: float = HALF_LIFE_DAYS) -> None:
+        """Initialize empty decayed sums of agents with the given roles, relative to epoch."""
+        self.half_life_days = half_life_days
+        self.epoch = epoch
+        self.roles = roles
+        self._sums = {}
+
+    def scale(self, when: datetime.date) -> float:
+        """
+        Return the factor a record of date when is multiplied by in the accumulators
+
+        >>> DecayedMapRef({}, datetime.date(2023, 1, 1), 10).scale(datetime.date(2023, 1, 21))
+        4.0
+        """
+        return 2.0 ** ((when - self.epoch).days / self.half_life_days)
+
+    def _accumulator(self, map_played: str, agent: str, when: datetime.date) -> tuple[list[float], float]:
+        """Return the accumulators of map_played and agent, and the scale of a record of date when."""
+        scale = self.scale(when)
+        if scale > MAX_SCALE:
+            self._rebase(when)
+            scale = 1.0
+        return self._sums.setdefault(map_played, {}).setdefault(agent, [0.0] * len(SUMS)), scale
+
+    def _rebase(self, epoch: datetime.date) -> None:
+        """Make every accumulator relative to epoch instead of self.epoch."""
+        factor = 1 / self.scale(epoch)
+        for agent_ref in self._sums.values():
+            for sums in agent_ref.values():
+                sums[:] = [value * factor for value in sums]
+        self.epoch = epoch
+
+    def add_pick(self, map_played: str, agent: str, pick_rate: float, when: datetime.date) -> None:
+        """Add one pick rate record of agent on map_played from an event that ended on the date when."""
+        sums, scale = self._accumulator(map_played, agent, when)
+        sums[0] += pick_rate * scale
+        sums[1] += scale
+
+    def add_result(self, map_played: str, agent: str, wins: int, played: int, when: datetime.date) -> None:
+        """
+        Add one win record of agent on map_played from an event that ended on the date when
+
+        As in load_map_agent_data, a record of an agent that has no pick rate record on map_played is left out.
+        """
+        if agent in self._sums.get(map_played, {}):
+            sums, scale = self._accumulator(map_played, agent, when)
+            sums[2] += wins * scale
+            sums[3] += played * scale
+
+    def add_sums(self, map_played: str, agent: str, sums: list[float]) -> None:
+        """Add sums, accumulators of agent on map_played that are already relative to self.epoch (see SUMS)."""
+        accumulator = self._sums.setdefault(map_played, {}).setdefault(agent, [0.0] * len(SUMS))
+        accumulator[:] = [total + value for total, value in zip(accumulator, sums)]
+
+    def add_map(self, map_played: str) -> None:
+        """Add map_played with no records, if it is not already in these sums."""
+        self._sums.setdefault(map_played, {})
+
+    def map_ref(self) -> dict[str, dict[str, list]]:
+        """
+        Return the decayed map-agent data in the same format as graph.load_map_agent_data, {map_name: agent_ref}, with
+        the decayed sums in place of the sums
+
+        >>> ref = DecayedMapRef({'jett': 'duelists'}, datetime.date(2023, 1, 1), 10)
+        >>> ref.add_pick('ascent', 'jett', 20, datetime.date(2023, 1, 1))
+        >>> ref.add_pick('ascent', 'jett', 80, datetime.date(2023, 1, 11))
+        >>> ref.add_result('ascent', 'jett', 1, 1, datetime.date(2023, 1, 11))
+        >>> ref.map_ref()
+        {'ascent': {'jett': [180.0, 3.0, 2.0, 2.0, 'duelists']}}
+        """
+        return {m: {a: sums + [self.roles[a]] for a, sums in agent_ref.items()} for m, agent_ref in self._sums.items()}
+
+
+@timed('build.decayed_map_ref')
+def load_decayed_map_ref(partitions: AgentPartitions, year: Optional[str] = None,
+                         half_life_days: float = HALF_LIFE_DAYS, tournaments: Optional[list[str]] = None,
+                         stages: Optional[list[str]] = None) -> DecayedMapRef:
+    """
+    Return the decayed sums of the map-agent data in partitions (see partitions.py) of the given tournaments and
+    stages (every one of them if None or empty), dating each partition from its tournament (see event_date, with year
+    as the default year), relative to the date of the latest event
+
+    The maps and agents are added in the same order as in load_map_agent_data.
+    """
+    dates = [event_date(tournament, year) for tournament, _, _ in partitions.keys]
+    epoch = max(dates, default=datetime.date.today())
+    ref = DecayedMapRef(dict(zip(partitions.agents, partitions.roles)), epoch, half_life_days)
+    scales = np.array([ref.scale(date) for date in dates]) * partitions.select(tournaments, stages)
+    totals = np.tensordot(scales, partitions.sums, axes=1) if len(scales) else partitions.sums.sum(axis=0)
+    for index in np.argsort(partitions.first_rows, axis=None, kind='stable').tolist():
+        m, a = divmod(index, len(partitions.agents))
+        ref.add_map(partitions.maps[m])
+        if totals[m, a, 1] > 0:
+            ref.add_sums(partitions.maps[m], partitions.agents[a], totals[m, a].tolist())
+    return ref
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['datetime', 're', 'numpy', 'instrumentation', 'partitions'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
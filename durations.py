@@ -0,0 +1,189 @@
+"""Valorant Match Durations File
+
+This python module contains the analytics of the Duration (e.g. 59:11 or 1:16:34) and Team A/B Overtime Score
+columns of the maps_scores files, which read_game leaves out: the distribution of map lengths, how often each map goes
+to overtime in each year, and how the share of rounds won by the attacking side changes with the length of a map.
+
+The analytics read the columnar cache of the maps_scores files (see columnar.py), like the side bias intervals (see
+side_bias.py), so the two share one conversion of the files. The trees, the team ratings and the SQLite database still
+parse the csv files into their own structures. The durations are dictionary-encoded in the cache, so each distinct
+duration string is parsed once, in one vectorized pass, and the duration of every map is then looked up from its code.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Optional
+
+import numpy as np
+import plotly.graph_objects as go
+
+from columnar import ColumnarTable, MISSING
+from instrumentation import timed
+
+
+def parse_durations(values: np.ndarray) -> np.ndarray:
+    """
+    Return the given durations (in the format m:ss, mm:ss or h:mm:ss) in seconds, with nan for every value that is not
+    a duration (e.g. an empty string)
+
+    >>> parse_durations(np.array(['59:11', '1:16:34', '', '-']))
+    array([3551., 4594.,   nan,   nan])
+    """
+    values = np.char.strip(values.astype(str))
+    colons = np.char.count(values, ':')
+    valid = ((colons == 1) | (colons == 2)) & np.char.isdigit(np.char.replace(values, ':', ''))
+    padded = np.where(valid, np.where(colons == 1, np.char.add('0:', values), values), '0:0:0')
+    hours, _, rest = np.char.partition(padded, ':').T
+    minutes, _, seconds = np.char.partition(rest, ':').T
+    total = hours.astype(np.int64) * 3600 + minutes.astype(np.int64) * 60 + seconds.astype(np.int64)
+    return np.where(valid, total.astype(np.float64), np.nan)
+
+
+class MatchDurations:
+    """The duration, overtime and attacker rounds of every map played in the maps_scores files.
+
+    Instance Attributes:
+        - maps: the (lowercase) maps, in the order of their codes
+        - years: the years, in the order of their codes
+        - map_codes: the code of the map of each map played
+        - year_codes: the code of the year of each map played
+        - seconds: the duration of each map played in seconds, or nan if it is unknown
+        - overtime: whether each map played went to overtime
+        - attack: the number of rounds won by the attacking side in each map played (both teams)
+        - defend: the number of rounds won by the defending side in each map played (both teams)
+    """
+    maps: list[str]
+    years: list[str]
+    map_codes: np.ndarray
+    year_codes: np.ndarray
+    seconds: np.ndarray
+    overtime: np.ndarray
+    attack: np.ndarray
+    defend: np.ndarray
+
+    def __init__(self, table: ColumnarTable) -> None:
+        """Initialize the durations of the maps played in table, the columnar cache of the maps_scores files."""
+        columns = table.read(['year', 'map', 'duration', 'overtime_a', 'overtime_b', 'attack_a', 'attack_b',
+                              'defend_a', 'defend_b'], decode=False)
+        self.maps = table.dictionary('map')
+        self.years = table.dictionary('year')
+        self.map_codes = np.asarray(columns['map'])
+        self.year_codes = np.asarray(columns['year'])
+        self.seconds = parse_durations(np.array(table.dictionary('duration'), dtype=str))[columns['duration']]
+        self.overtime = (columns['overtime_a'] != MISSING) | (columns['overtime_b'] != MISSING)
+        self.attack = np.maximum(columns['attack_a'], 0) + np.maximum(columns['attack_b'], 0)
+        self.defend = np.maximum(columns['defend_a'], 0) + np.maximum(columns['defend_b'], 0)
+
+    def mask(self, map_played: Optional[str] = None, year: Optional[str] = None) -> np.ndarray:
+        """Return whether each map played is on map_played and in year (every map or year if it is None)."""
+        selected = np.ones(len(self.map_codes), dtype=bool)
+        if map_played is not None:
+            selected &= self.map_codes == (self.maps.index(map_played) if map_played in self.maps else -1)
+        if year is not None:
+            selected &= self.year_codes == (self.years.index(year) if year in self.years else -1)
+        return selected
+
+    def length_distribution(self, map_played: Optional[str] = None, year: Optional[str] = None,
+                            bin_minutes: int = 5) -> dict[str, list]:
+        """
+        Return the number of maps played on map_played in year whose duration falls in each bin of bin_minutes
+        minutes, in the format {'bin_start_minutes': [...], 'maps': [...]}, leaving out the bins with no maps and the
+        maps with no duration
+        """
+        minutes = self.seconds[self.mask(map_played, year)] / 60
+        bins = (minutes[~np.isnan(minutes)] // bin_minutes).astype(np.int64)
+        counts = np.bincount(bins) if len(bins) else np.empty(0, dtype=np.int64)
+        used = np.nonzero(counts)[0]
+        return {'bin_start_minutes': [int(b * bin_minutes) for b in used], 'maps': [int(c) for c in counts[used]]}
+
+    def overtime_rates(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """
+        Return how often each map went to overtime, in each year and over every year ('all'), in the format
+        {map: {year: {'maps': maps_played, 'overtime': maps_with_overtime, 'rate': rate}}}
+        """
+        shape = (len(self.maps), len(self.years))
+        played = np.zeros(shape, dtype=np.int64)
+        overtime = np.zeros(shape, dtype=np.int64)
+        np.add.at(played, (self.map_codes, self.year_codes), 1)
+        np.add.at(overtime, (self.map_codes, self.year_codes), self.overtime)
+        rates = {}
+        for i, m in enumerate(self.maps):
+            columns = [(year, played[i, j], overtime[i, j]) for j, year in enumerate(self.years)]
+            columns.append(('all', played[i].sum(), overtime[i].sum()))
+            rates[m] = {year: {'maps': int(n), 'overtime': int(k), 'rate': round(float(k / n), 4) if n else None}
+                        for year, n, k in columns}
+        return rates
+
+    def side_bias_by_duration(self, map_played: Optional[str] = None, groups: int = 4) -> dict[str, list]:
+        """
+        Return the share of the rounds won by the attacking side on map_played in each of groups groups of maps of
+        increasing duration (with about as many maps in each group), in the format
+        {'max_minutes': [...], 'maps': [...], 'attack_rate': [...], 'correlation': correlation}
+        where max_minutes is the longest duration of each group, and correlation is the correlation between the
+        duration and the attacker round share of each map (None if there are too few maps)
+        """
+        selected = self.mask(map_played) & ~np.isnan(self.seconds) & (self.attack + self.defend > 0)
+        seconds, attack, rounds = self.seconds[selected], self.attack[selected], (self.attack + self.defend)[selected]
+        order = np.argsort(seconds, kind='stable')
+        result = {'max_minutes': [], 'maps': [], 'attack_rate': [], 'correlation': None}
+        for part in np.array_split(order, groups) if len(order) >= groups else []:
+            result['max_minutes'].append(round(float(seconds[part[-1]]) / 60, 1))
+            result['maps'].append(len(part))
+            result['attack_rate'].append(round(float(attack[part].sum() / rounds[part].sum()), 4))
+        if len(seconds) > 2 and np.std(seconds) > 0 and np.std(attack / rounds) > 0:
+            result['correlation'] = round(float(np.corrcoef(seconds, attack / rounds)[0, 1]), 4)
+        return result
+
+
+def length_figure(durations: MatchDurations, map_played: Optional[str] = None, bin_minutes: int = 5) -> go.Figure:
+    """Return a bar chart of the distribution of the durations of the maps played on map_played, for each year."""
+    figure = go.Figure()
+    for year in durations.years:
+        distribution = durations.length_distribution(map_played, year, bin_minutes)
+        figure.add_trace(go.Bar(x=distribution['bin_start_minutes'], y=distribution['maps'], name=year))
+    figure.update_layout(title=f'Map length ({map_played or "all maps"})', barmode='group',
+                         xaxis_title=f'duration (minutes, bins of {bin_minutes})', yaxis_title='maps played')
+    return figure
+
+
+def overtime_figure(durations: MatchDurations) -> go.Figure:
+    """Return a bar chart of how often each map went to overtime, for each year."""
+    rates = durations.overtime_rates()
+    figure = go.Figure()
+    for year in durations.years:
+        figure.add_trace(go.Bar(x=list(rates), y=[rates[m][year]['rate'] for m in rates], name=year))
+    figure.update_layout(title='Overtime frequency', barmode='group', yaxis_title='share of maps with overtime',
+                         yaxis_tickformat='.0%')
+    return figure
+
+
+def side_bias_text(durations: MatchDurations, map_played: Optional[str] = None) -> str:
+    """Return a sentence describing how the attacker round share on map_played changes with the length of a map."""
+    bias = durations.side_bias_by_duration(map_played)
+    if not bias['maps']:
+        return 'No duration data available'
+    groups = ', '.join(f'{rate:.1%} up to {minutes:g} min' for rate, minutes in zip(bias['attack_rate'],
+                                                                                    bias['max_minutes']))
+    text = f'Attackers win {groups} on {map_played or "all maps"}'
+    if bias['correlation'] is not None:
+        text += f' (correlation between duration and attacker round share: {bias["correlation"]:.2f})'
+    return text
+
+
+@timed('build.match_durations')
+def load_match_durations(table: ColumnarTable) -> MatchDurations:
+    """Return the durations of the maps played in table, the columnar cache of the maps_scores files."""
+    return MatchDurations(table)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['numpy', 'plotly.graph_objects', 'columnar', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
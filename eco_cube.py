@@ -0,0 +1,206 @@
+"""Valorant Eco Cube File
+
+This python module contains an aggregation cube of the eco rounds: the number of rows of the eco_data files for
+every combination of Tournament, Stage, Map, Team, Type (buy type) and Outcome, kept in a dense NumPy array indexed by
+the code of each category. The cube is built in one pass over the files, and any slice or roll-up of it (e.g. the win
+rate of Semi-buy on Lotus in the playoffs of 2022) is answered by summing a small part of the array, without walking
+the eco tree.
+
+Every round has one row for each team, so counting the rows with Outcome 'Win' counts the rounds won.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Iterable, Optional, Union
+import csv
+
+import numpy as np
+
+from instrumentation import timed
+from tree import BUY_TYPES, buy_verdict
+
+DIMENSIONS = ('tournament', 'stage', 'map', 'team', 'type', 'outcome')
+# the columns of the eco_data files that each dimension is read from
+COLUMNS = {'tournament': 0, 'stage': 1, 'map': 4, 'team': 6, 'type': 9, 'outcome': 10}
+
+
+class EcoCube:
+    """A dense cube of the number of eco rows for every combination of categories.
+
+    Instance Attributes:
+        - categories: maps each dimension to its categories, in the order of their codes
+        - counts: the number of rows of each combination of categories, with one axis per dimension in the order of
+          DIMENSIONS
+        - tournament_years: the year of each tournament, in the order of the tournament codes
+
+    Representation Invariants:
+        - self.counts.shape == tuple(len(self.categories[d]) for d in DIMENSIONS)
+        - len(self.tournament_years) == len(self.categories['tournament'])
+    """
+    categories: dict[str, list[str]]
+    counts: np.ndarray
+    tournament_years: list[str]
+    # Private Instance Attributes:
+    #     - _codes: maps each dimension to a mapping from each of its lowercased categories to its code
+    _codes: dict[str, dict[str, int]]
+
+    def __init__(self, rows: Iterable[tuple[str, list[str]]]) -> None:
+        """Initialize a cube of the given eco rows, each given with the year of its file as (year, row).
+
+        >>> cube = EcoCube([('2021', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'A', '', '', 'Eco: 0-5k', 'Win']),
+        ...                 ('2021', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'B', '', '', 'Eco: 0-5k', 'Loss'])])
+        >>> cube.counts.shape
+        (1, 1, 1, 2, 4, 2)
+        >>> cube.count(map='lotus', outcome='win')
+        1
+        """
+        self.categories = {d: [] for d in DIMENSIONS}
+        self._codes = {d: {} for d in DIMENSIONS}
+        for buy_type in BUY_TYPES:  # so that every buy type has a code, even if it is never used
+            self._code('type', buy_type)
+        for outcome in ('Win', 'Loss'):
+            self._code('outcome', outcome)
+        self.tournament_years = []
+
+        codes = [[] for _ in DIMENSIONS]
+        for year, row in rows:
+            if len(row) <= COLUMNS['outcome'] or row[0] == '':
+                continue
+            for i, d in enumerate(DIMENSIONS):
+                codes[i].append(self._code(d, row[COLUMNS[d]]))
+            if len(self.tournament_years) < len(self.categories['tournament']):
+                self.tournament_years.append(year)
+
+        shape = tuple(len(self.categories[d]) for d in DIMENSIONS)
+        flat = np.ravel_multi_index(tuple(np.array(c, dtype=np.int64) for c in codes), shape) if codes[0] else []
+        self.counts = np.bincount(flat, minlength=int(np.prod(shape))).astype(np.int32).reshape(shape)
+
+    def _code(self, dimension: str, category: str) -> int:
+        """Return the code of category in dimension, giving it the next code if it does not have one yet."""
+        key = category.lower()
+        codes = self._codes[dimension]
+        if key not in codes:
+            codes[key] = len(codes)
+            self.categories[dimension].append(category)
+        return codes[key]
+
+    def _selection(self, dimension: str, value: Union[str, list[str], None],
+                   year: Union[str, list[str], None] = None) -> Optional[list[int]]:
+        """
+        Return the codes of the categories of dimension selected by value (one category or a list of categories,
+        compared case-insensitively), or None if every category is selected. For the tournament dimension, only the
+        tournaments of year (or of those years) are selected if year is not None.
+
+        Categories that are not in this cube select nothing.
+        """
+        codes = None
+        if value is not None:
+            values = [value] if isinstance(value, str) else value
+            codes = [self._codes[dimension][v.lower()] for v in values if v.lower() in self._codes[dimension]]
+        if dimension == 'tournament' and year is not None:
+            years = [year] if isinstance(year, str) else year
+            codes = [c for c in (range(len(self.tournament_years)) if codes is None else codes)
+                     if self.tournament_years[c] in years]
+        return codes
+
+    def slice(self, year: Union[str, list[str], None] = None, **filters: Union[str, list[str]]) -> np.ndarray:
+        """
+        Return the part of self.counts selected by filters, which map dimensions to a category or a list of categories,
+        and by year, which selects the tournaments of that year (or of those years). Every axis is kept.
+
+        Raise a KeyError if a filter is not a dimension.
+        """
+        for dimension in filters:
+            if dimension not in self._codes:
+                raise KeyError(dimension)
+        result = self.counts
+        for axis, dimension in enumerate(DIMENSIONS):
+            codes = self._selection(dimension, filters.get(dimension), year)
+            if codes is not None:
+                result = result.take(codes, axis=axis)
+        return result
+
+    def count(self, year: Union[str, list[str], None] = None, **filters: Union[str, list[str]]) -> int:
+        """Return the number of rows selected by year and filters (see EcoCube.slice)."""
+        return int(self.slice(year, **filters).sum())
+
+    def win_rate(self, year: Union[str, list[str], None] = None,
+                 **filters: Union[str, list[str]]) -> Optional[float]:
+        """
+        Return the share of the rows selected by year and filters (see EcoCube.slice) that were won, or None if no
+        row is selected
+
+        >>> cube = EcoCube([('2022', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'A', '', '', 'Semi-buy: 10-20k', 'Win']),
+        ...                 ('2022', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'B', '', '', 'Full buy: 20k+', 'Loss'])])
+        >>> cube.win_rate('2022', map='lotus', stage='playoffs', type='Semi-buy: 10-20k')
+        1.0
+        >>> cube.win_rate('2023', map='lotus') is None
+        True
+        """
+        selected = self.slice(year, **{d: v for d, v in filters.items() if d != 'outcome'})
+        total = int(selected.sum())
+        if total == 0:
+            return None
+        return int(selected.take([self._codes['outcome']['win']], axis=DIMENSIONS.index('outcome')).sum()) / total
+
+    def rollup(self, by: list[str], year: Union[str, list[str], None] = None,
+               **filters: Union[str, list[str]]) -> dict[tuple[str, ...], int]:
+        """
+        Return the number of rows selected by year and filters (see EcoCube.slice) for each combination of the
+        categories of the dimensions in by, leaving out the combinations with no rows
+
+        >>> cube = EcoCube([('2021', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'A', '', '', 'Eco: 0-5k', 'Win']),
+        ...                 ('2021', ['VCT', 'Playoffs', '', '', 'Lotus', '1', 'B', '', '', 'Eco: 0-5k', 'Loss'])])
+        >>> cube.rollup(['team', 'outcome'])
+        {('A', 'Win'): 1, ('B', 'Loss'): 1}
+        """
+        selected = self.slice(year, **filters)
+        axes = [DIMENSIONS.index(d) for d in by]
+        summed = selected.sum(axis=tuple(a for a in range(len(DIMENSIONS)) if a not in axes))
+        # the axes left after summing are in the order of DIMENSIONS, so put them in the order of by
+        summed = summed.transpose(np.argsort(np.argsort(axes)))
+        labels = []
+        for d in by:
+            codes = self._selection(d, filters.get(d), year)
+            labels.append([self.categories[d][c] for c in (range(len(self.categories[d])) if codes is None else codes)])
+        return {tuple(labels[i][j] for i, j in enumerate(index)): int(summed[index])
+                for index in zip(*np.nonzero(summed))}
+
+    def buy_wins_for_map(self, map_played: str) -> dict[str, int]:
+        """Return the number of rounds won with each buy type on map_played (see Tree.buy_wins_for_map)."""
+        wins = self.slice(map=map_played, outcome='Win').sum(axis=(0, 1, 2, 3, 5))
+        return {buy_type: int(wins[self._codes['type'][buy_type.lower()]]) for buy_type in BUY_TYPES}
+
+    @timed('query.cube_best_buy_for_map')
+    def best_buy_for_map(self, map_played: str) -> str:
+        """Return the same string as Tree.best_buy_for_map, computed from this cube."""
+        return buy_verdict(self.buy_wins_for_map(map_played))
+
+
+def _file_rows(paths_by_year: dict[str, str]) -> Iterable[tuple[str, list[str]]]:
+    """Yield every row of the eco_data file of each year in paths_by_year, as (year, row), skipping the headers."""
+    for year, path in paths_by_year.items():
+        with open(path, newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            for row in reader:
+                yield (year, row)
+
+
+@timed('build.eco_cube')
+def load_eco_cube(paths_by_year: dict[str, str]) -> EcoCube:
+    """Return the cube of the eco_data files in paths_by_year, in the format {year: path}."""
+    return EcoCube(_file_rows(paths_by_year))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['csv', 'numpy', 'instrumentation', 'tree'],
+        'allowed-io': ['_file_rows'],
+        'max-nested-blocks': 5
+    })
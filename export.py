@@ -0,0 +1,230 @@
+"""Valorant Batch Graph Export File
+
+This python module contains functions to export a static image of every role x map x agent-weight view of the
+map-agent weighted graph in one batch. The graphs and their layouts are built once, the images are rendered across
+a pool of processes (since kaleido renders one image at a time), and a manifest is written so that images whose
+inputs have not changed are skipped the next time the export is run. The graphs are built from the data files of
+every year found in the data directories (see registry.DataRegistry), and an image that fails to render is recorded
+in the manifest with its error instead of stopping the export.
+
+Run this file to export every view, e.g.
+    python export.py --out-dir graph_images --format png --workers 4
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from plotly.graph_objs import Figure
+
+from graph import graph_for_choice
+from registry import DataRegistry
+from visualization import setup_weighted_graph, weighted_graph_figure
+
+ROLES = ['duelists', 'controllers', 'initiators', 'sentinels', 'all']
+MAPS = ['ascent', 'pearl', 'split', 'lotus', 'icebox', 'fracture', 'bind', 'haven', 'all']
+MANIFEST_NAME = 'manifest.json'
+
+
+def all_views() -> list[tuple[str, str, bool]]:
+    """
+    Return every (role, map, view_agent_weights) combination that can be shown in the agents tab
+
+    >>> len(all_views())
+    90
+    >>> all_views()[0]
+    ('duelists', 'ascent', False)
+    """
+    return [(role, cur_map, view) for role in ROLES for cur_map in MAPS for view in (False, True)]
+
+
+def image_name(view: tuple[str, str, bool], image_format: str) -> str:
+    """
+    Return the file name of the image of the given view
+
+    >>> image_name(('duelists', 'all', True), 'png')
+    'duelists_all_agent_weights.png'
+    """
+    role, cur_map, view_agent_weights = view
+    suffix = 'agent_weights' if view_agent_weights else 'map_weights'
+    return f'{role}_{cur_map}_{suffix}.{image_format}'
+
+
+def input_key(version: str, view: tuple[str, str, bool], image_format: str, width: int, height: int) -> str:
+    """
+    Return a hash of everything that the image of the given view depends on
+
+    >>> view = ('all', 'all', False)
+    >>> input_key('v1', view, 'png', 1200, 900) == input_key('v1', view, 'png', 1200, 900)
+    True
+    >>> input_key('v1', view, 'png', 1200, 900) == input_key('v2', view, 'png', 1200, 900)
+    False
+    """
+    return hashlib.sha1(json.dumps([version, list(view), image_format, width, height]).encode()).hexdigest()
+
+
+def load_manifest(out_dir: str) -> dict[str, dict]:
+    """
+    Return the manifest of the last export to out_dir, in the format {image_name: entry}, or an empty dictionary if
+    there is no manifest in out_dir
+    """
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)['images']
+
+
+def write_manifest(out_dir: str, version: str, images: dict[str, dict]) -> None:
+    """
+    Write the manifest of an export to out_dir, replacing the previous manifest only once it is completely written
+    """
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'data_version': version, 'images': images}, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _render_image(figure: dict, output_file: str, width: int, height: int) -> float:
+    """
+    Render figure to output_file and return the number of seconds it took
+
+    This is run inside the worker processes, so figure is given as plain dicts and lists
+    """
+    start = time.perf_counter()
+    Figure(figure).write_image(output_file, width=width, height=height)
+    return time.perf_counter() - start
+
+
+def export_all(out_dir: str, image_format: str = 'png', workers: int = 0, force: bool = False,
+               width: int = 1200, height: int = 900, registry: Optional[DataRegistry] = None) -> dict[str, dict]:
+    """
+    Export an image of every view in all_views() to out_dir and return the manifest entries of the images, in the
+    format {image_name: entry}
+
+    Each view's graph and layout is built once, in this process, and the images are rendered in a pool of worker
+    processes. An image is skipped if the manifest already records it with the same inputs and the file still exists,
+    unless force is True. An image that fails to render gets a manifest entry with an 'error' key, and is rendered
+    again the next time.
+
+    Optional arguments:
+        - image_format: any format supported by plotly's write_image (e.g. 'png', 'svg', 'pdf')
+        - workers: the number of worker processes; 0 means one per CPU
+        - force: render every image even if its inputs have not changed
+        - width, height: the size of every image in pixels
+        - registry: the registry of the data to export (by default, the data in graph_data and tree_data)
+    """
+    if registry is None:
+        registry = DataRegistry()
+    os.makedirs(out_dir, exist_ok=True)
+    version = registry.data_version()
+    previous = load_manifest(out_dir)
+
+    todo = []
+    images = {}
+    for view in all_views():
+        name = image_name(view, image_format)
+        key = input_key(version, view, image_format, width, height)
+        entry = previous.get(name)
+        if not force and entry and entry['input_key'] == key and 'error' not in entry \
+                and os.path.exists(os.path.join(out_dir, name)):
+            images[name] = dict(entry, skipped=True)
+        else:
+            todo.append((view, name, key))
+
+    if todo:
+        map_agent_data = registry.map_ref()
+        agent_combinations = registry.agent_combos()
+
+        with ProcessPoolExecutor(max_workers=workers or None) as executor:
+            futures = {}
+            for view, name, key in todo:
+                start = time.perf_counter()
+                g = graph_for_choice(map_agent_data, agent_combinations, *view)
+                weight_positions, data = setup_weighted_graph(g)
+                figure = weighted_graph_figure(data, weight_positions).to_dict()
+                build_seconds = time.perf_counter() - start
+                futures[name] = (executor.submit(_render_image, figure, os.path.join(out_dir, name), width, height),
+                                 view, key, build_seconds)
+
+            for name, (future, view, key, build_seconds) in futures.items():
+                images[name] = {'role': view[0], 'map': view[1], 'view_agent_weights': view[2], 'input_key': key,
+                                'build_seconds': round(build_seconds, 4), 'skipped': False}
+                try:
+                    images[name]['render_seconds'] = round(future.result(), 4)
+                except (OSError, ValueError, RuntimeError) as error:
+                    images[name].update(render_seconds=0.0, error=repr(error))
+
+    write_manifest(out_dir, version, images)
+    return images
+
+
+def timing_report(images: dict[str, dict]) -> str:
+    """
+    Return a table of the build and render time of every exported image in images
+
+    >>> print(timing_report({'a.png': {'build_seconds': 0.5, 'render_seconds': 1.25, 'skipped': False},
+    ...                      'b.png': {'build_seconds': 0.5, 'render_seconds': 0.0, 'skipped': False,
+    ...                                'error': "ValueError('no kaleido')"}}))
+    image                                        build (s)  render (s)
+    a.png                                           0.5000      1.2500
+    b.png                                       failed: ValueError('no kaleido')
+    1 rendered, 0 skipped, 1 failed, 1.7500 s total
+    """
+    lines = [f'{"image":<44}{"build (s)":>10}{"render (s)":>12}']
+    total = 0.0
+    rendered = 0
+    failed = 0
+    for name in sorted(images):
+        entry = images[name]
+        if entry['skipped']:
+            lines.append(f'{name:<44}{"skipped":>10}{"":>12}')
+        elif 'error' in entry:
+            failed += 1
+            lines.append(f'{name:<44}failed: {entry["error"]}')
+        else:
+            rendered += 1
+            total += entry['build_seconds'] + entry['render_seconds']
+            lines.append(f'{name:<44}{entry["build_seconds"]:>10.4f}{entry["render_seconds"]:>12.4f}')
+    lines.append(f'{rendered} rendered, {len(images) - rendered - failed} skipped, {failed} failed, '
+                 f'{total:.4f} s total')
+    return '\n'.join(lines)
+
+
+def _parse_args() -> Any:
+    """Return the command line arguments of this module."""
+    parser = argparse.ArgumentParser(description='Export an image of every role x map x agent-weight graph view.')
+    parser.add_argument('--out-dir', default='graph_images', help='directory to write the images and manifest to')
+    parser.add_argument('--format', default='png', help='image format, e.g. png, svg or pdf')
+    parser.add_argument('--workers', type=int, default=0, help='number of worker processes (0 = one per CPU)')
+    parser.add_argument('--width', type=int, default=1200)
+    parser.add_argument('--height', type=int, default=900)
+    parser.add_argument('--force', action='store_true', help='render every image even if its inputs are unchanged')
+    parser.add_argument('--graph-dir', default='graph_data')
+    parser.add_argument('--tree-dir', default='tree_data')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    args = _parse_args()
+    print(timing_report(export_all(args.out_dir, args.format, args.workers, args.force, args.width, args.height,
+                                   DataRegistry(args.graph_dir, args.tree_dir))))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['concurrent.futures', 'argparse', 'hashlib', 'json', 'os', 'time', 'plotly.graph_objs',
+                          'graph', 'registry', 'visualization'],
+        'allowed-io': ['load_manifest', 'write_manifest'],
+        'max-nested-blocks': 5
+    })
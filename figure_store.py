@@ -0,0 +1,262 @@
+"""Valorant Figure Store File
+
+This python module contains a store of pre-serialized plotly figures, so that the Dash callbacks can return a
+figure that has already been laid out and serialized instead of rebuilding it every time a user switches tabs.
+
+Each figure is kept only as its serialized JSON. The callbacks return the small URL of a figure (see figure_url)
+into a dcc.Store, and a clientside callback (LOAD_FIGURE) fetches the stored bytes from figure_blueprint and gives
+them to the dcc.Graph, so answering a request for a figure that is already in the store does no serialization work.
+
+The store is bounded: once the stored figures take more than max_bytes, the least recently requested ones are removed
+(and built again if they are requested again). The figures of older data versions are removed with invalidate when a
+new data version is published.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import zlib
+
+from plotly.graph_objs import Figure
+
+from instrumentation import stage
+
+FIGURE_PREFIX = '/figures'
+MAX_BYTES = 64 * 2 ** 20  # the default largest total size of the stored (possibly compressed) figures
+# the clientside callback that loads the figure at the URL in a dcc.Store (see figure_url) into a dcc.Graph
+LOAD_FIGURE = """
+function(url) {
+    if (!url) {
+        return dash_clientside.no_update;
+    }
+    return fetch(url).then(response => response.json());
+}
+"""
+
+
+def data_version(paths: list[str]) -> str:
+    """
+    Return a short string identifying the current version of the data in the files referred to by paths.
+
+    The version is computed from the size and last modification time of every file, so it changes whenever one of
+    the files is replaced or edited. Files that do not exist are included as missing.
+
+    >>> data_version([]) == data_version([])
+    True
+    >>> len(data_version(['graph_data/agent_roles.csv']))
+    12
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+        except FileNotFoundError:
+            digest.update(f'{path}:missing;'.encode())
+    return digest.hexdigest()[:12]
+
+
+class FigureStore:
+    """A store of plotly figures that are built once and kept as serialized JSON.
+
+    Each figure is identified by the version of the data it was built from, a name, and the parameters that were
+    used to build it. A figure is only built (and serialized) the first time it is requested; every following
+    request with the same key is answered from the store.
+
+    Instance Attributes:
+        - compress: whether the serialized JSON is kept compressed with zlib
+        - max_bytes: the largest total size of the stored figures, above which the least recently requested ones are
+          removed (the most recent one is always kept)
+
+    Representation Invariants:
+        - all(self._ids[figure_id] in self._serialized for figure_id in self._ids)
+        - self._bytes == sum(len(data) for data in self._serialized.values())
+    """
+    compress: bool
+    max_bytes: int
+    # Private Instance Attributes:
+    #     - _serialized: maps each key to the serialized JSON of its figure (compressed if self.compress), from the
+    #       least to the most recently requested
+    #     - _ids: maps the id of each figure (see figure_id) to its key
+    #     - _bytes: the total size of the values of _serialized
+    #     - _lock: protects _serialized, _ids, _bytes and _build_locks
+    #     - _build_locks: one lock per key so that a figure is only built once when requested by several threads
+    _serialized: OrderedDict[tuple, bytes]
+    _ids: dict[str, tuple]
+    _bytes: int
+    _lock: threading.Lock
+    _build_locks: dict[tuple, threading.Lock]
+
+    def __init__(self, compress: bool = False, max_bytes: int = MAX_BYTES) -> None:
+        """Initialize an empty figure store."""
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self._serialized = OrderedDict()
+        self._ids = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def __len__(self) -> int:
+        """Return the number of figures in this store.
+
+        >>> store = FigureStore()
+        >>> len(store)
+        0
+        """
+        return len(self._serialized)
+
+    def figure_id(self, version: str, name: str, params: tuple, build: Callable[[], Figure]) -> str:
+        """
+        Return the id of the figure identified by version, name and params, building it first by calling build() if
+        it is not in this store yet.
+
+        >>> store = FigureStore()
+        >>> calls = []
+        >>> def build() -> Figure:
+        ...     calls.append(1)
+        ...     return Figure()
+        >>> store.figure_id('v1', 'empty', (), build) == store.figure_id('v1', 'empty', (), build)
+        True
+        >>> len(calls)
+        1
+        >>> small = FigureStore(max_bytes=1)
+        >>> first = small.figure_id('v1', 'first', (), Figure)
+        >>> second = small.figure_id('v1', 'second', (), Figure)
+        >>> len(small), small.stored(first) is None, small.stored(second) is None
+        (1, True, False)
+        """
+        return _key_id(self._ensure(version, name, params, build))
+
+    def stored(self, figure_id: str) -> Optional[bytes]:
+        """
+        Return the serialized JSON of the figure with the given id as it is stored (compressed if self.compress), or
+        None if there is no such figure in this store.
+
+        >>> store = FigureStore()
+        >>> store.stored(store.figure_id('v1', 'empty', (), Figure)).startswith(b'{')
+        True
+        >>> store.stored('unknown') is None
+        True
+        """
+        with self._lock:
+            key = self._ids.get(figure_id)
+            if key is None:
+                return None
+            self._serialized.move_to_end(key)
+            return self._serialized[key]
+
+    def invalidate(self, keep_version: str = '') -> None:
+        """
+        Remove every figure from this store that was not built from the data version keep_version.
+
+        If keep_version is empty, remove every figure.
+
+        >>> store = FigureStore()
+        >>> _ = store.figure_id('v1', 'empty', (), Figure), store.figure_id('v2', 'empty', (), Figure)
+        >>> store.invalidate('v2')
+        >>> len(store)
+        1
+        """
+        with self._lock:
+            for key in [k for k in self._serialized if k[0] != keep_version]:
+                self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        """Remove the figure with the given key from this store (with self._lock held)."""
+        self._bytes -= len(self._serialized.pop(key))
+        del self._ids[_key_id(key)]
+        self._build_locks.pop(key, None)
+
+    def _ensure(self, version: str, name: str, params: tuple, build: Callable[[], Figure]) -> tuple:
+        """Build and store the figure with the given key if it is not in this store yet, and return the key."""
+        key = (version, name, params)
+        with self._lock:
+            if key in self._serialized:
+                self._serialized.move_to_end(key)
+                return key
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            if key not in self._serialized:  # another thread may have built it while we were waiting
+                with stage('render.' + name):
+                    figure = build()
+                with stage('serialize.' + name):
+                    data = self._to_bytes(figure.to_json())
+                with self._lock:
+                    self._ids[_key_id(key)] = key
+                    self._serialized[key] = data
+                    self._bytes += len(data)
+                    while self._bytes > self.max_bytes and len(self._serialized) > 1:
+                        self._remove(next(iter(self._serialized)))
+        return key
+
+    def _to_bytes(self, text: str) -> bytes:
+        """Return text encoded (and compressed if self.compress) for storage."""
+        data = text.encode()
+        return zlib.compress(data) if self.compress else data
+
+
+def _key_id(key: tuple) -> str:
+    """Return the id of the figure with the given key, used in its URL."""
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+
+
+def figure_url(store: FigureStore, version: str, name: str, params: tuple,
+               build: Callable[..., Figure], *args: Any) -> str:
+    """
+    Return the URL the figure built by build(*args) is served at by figure_blueprint(store), building it only if it
+    is not already in the store.
+
+    Callbacks return this URL into a dcc.Store, which the LOAD_FIGURE clientside callback loads into a dcc.Graph.
+
+    >>> figure_url(FigureStore(), 'v1', 'empty', (), Figure).startswith(FIGURE_PREFIX + '/')
+    True
+    """
+    return FIGURE_PREFIX + '/' + store.figure_id(version, name, params, lambda: build(*args))
+
+
+def figure_blueprint(store: FigureStore) -> Any:
+    """
+    Return a Flask blueprint that serves the stored JSON of the figures of store at their URLs (see figure_url),
+    compressed with deflate when store.compress is True and the browser accepts it.
+    """
+    from flask import Blueprint, Response, request
+    blueprint = Blueprint('figures', __name__, url_prefix=FIGURE_PREFIX)
+
+    @blueprint.route('/<figure_id>')
+    def figure(figure_id: str) -> Response:
+        """Return the stored JSON of the figure with the given id."""
+        data = store.stored(figure_id)
+        if data is None:
+            return Response('{"error": "unknown figure"}', status=404, mimetype='application/json')
+        response = Response(data, mimetype='application/json')
+        if store.compress and 'deflate' in request.headers.get('Accept-Encoding', ''):
+            response.headers['Content-Encoding'] = 'deflate'
+        elif store.compress:
+            response.set_data(zlib.decompress(data))
+        if store.compress:
+            response.headers['Vary'] = 'Accept-Encoding'
+        # the id changes with the data version, so a figure at a URL never changes
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    return blueprint
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['collections', 'hashlib', 'os', 'threading', 'zlib', 'plotly.graph_objs',
+                          'instrumentation', 'flask'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
@@ -8,8 +8,13 @@ This file is Copyright (c) 2024 of Project Team
 from __future__ import annotations
 from typing import Any, Union
 import csv
+import os
+import threading
 import networkx as nx
+import numpy as np
 from plotly.graph_objs import Figure
+from scipy.sparse import csr_matrix
+from instrumentation import timed
 
 
 class _WeightedVertex:
@@ -17,6 +22,7 @@ class _WeightedVertex:
     type: str
     neighbours: dict[_WeightedVertex, float]
     role: str
+    __slots__: tuple[str, ...] = ('item', 'type', 'neighbours', 'role')
 
     def __init__(self, item: Any, neighbours: dict[_WeightedVertex, float], vertex_type: str, role: str = None) -> None:
         """Initialize a new vertex with the given item and type and neighbours.
@@ -99,8 +105,7 @@ class WeightedGraph:
         if not self.adjacent(item1, item2):
             return 0
         else:
-            v1 = self._vertices[item1]
-            return [v1.neighbours[v2] for v2 in v1.neighbours if v2.item == item2][0]
+            return self._vertices[item1].neighbours[self._vertices[item2]]
 
     def adjacent(self, item1: Any, item2: Any) -> bool:
         """Return whether item1 and item2 are adjacent vertices in this graph.
@@ -108,8 +113,7 @@ class WeightedGraph:
         Return False if item1 or item2 do not appear as vertices in this graph.
         """
         if item1 in self._vertices and item2 in self._vertices:
-            v1 = self._vertices[item1]
-            return any(v2.item == item2 for v2 in v1.neighbours)
+            return self._vertices[item2] in self._vertices[item1].neighbours
         else:
             # We didn't find an existing vertex for both items.
             return False
@@ -179,8 +183,37 @@ class WeightedGraph:
 
         return graph_nx
 
+    def to_csr(self) -> tuple[csr_matrix, dict[Any, int]]:
+        """
+        Return the weighted adjacency matrix of this graph as a SciPy CSR matrix, with the index of the row (and
+        column) of each item, in the format (matrix, {item: index})
+
+        The items are indexed in the order they were added to this graph.
+
+        >>> g = WeightedGraph()
+        >>> g.add_vertex('ascent', 'map')
+        >>> g.add_vertex('jett', 'agent', 'duelists')
+        >>> g.add_edge('ascent', 'jett', 9.5)
+        >>> matrix, index = g.to_csr()
+        >>> index
+        {'ascent': 0, 'jett': 1}
+        >>> matrix.toarray().tolist()
+        [[0.0, 9.5], [9.5, 0.0]]
+        """
+        index = {item: i for i, item in enumerate(self._vertices)}
+        vertices = list(self._vertices.values())
+        degrees = [len(v.neighbours) for v in vertices]
+        columns = np.fromiter((index[u.item] for v in vertices for u in v.neighbours), dtype=np.int64,
+                              count=sum(degrees))
+        weights = np.fromiter((w for v in vertices for w in v.neighbours.values()), dtype=float, count=sum(degrees))
+        pointers = np.concatenate([[0], np.cumsum(degrees, dtype=np.int64)])
+        matrix = csr_matrix((weights, columns, pointers), shape=(len(index), len(index)))
+        matrix.sort_indices()
+        return matrix, index
+
 
 # -------------------------------------------- DATA LOADING FUNCTIONS ----------------------------------------------- #
+@timed('load.load_agent_role_data')
 def load_agent_role_data(agent_role: str) -> dict[str: str]:
     """
     Return a dictionary where the keys are the agent names and the values are the type of role (e.g. duelists)
@@ -198,6 +231,7 @@ def load_agent_role_data(agent_role: str) -> dict[str: str]:
     return agent_roles
 
 
+@timed('load.load_agent_combo_data')
 def load_agent_combo_data(all_agents: str) -> list[set]:
     """
     Return a list of agent combinations, where an agent combination is a set of the agent names in combination
@@ -216,6 +250,7 @@ def load_agent_combo_data(all_agents: str) -> list[set]:
     return agent_combs
 
 
+@timed('load.load_map_agent_data')
 def load_map_agent_data(agent_pick_rates: str, teams_agent_file: str, agent_roles: dict) -> dict[str, dict[str, list]]:
     """
     Return a dictionary where the keys are all the maps in the csv files (referred to by the arguments)
@@ -259,6 +294,7 @@ def load_map_agent_data(agent_pick_rates: str, teams_agent_file: str, agent_role
 # ------------------------------------------------------------------------------------------------------------------- #
 
 
+@timed('build.generate_weighted_graph')
 def generate_weighted_graph(map_ref: dict[str, dict[str, list]], agent_combos: list[set], role: str = None,
                             cu_map: str = 'all', view_agent_weights: bool = False) -> WeightedGraph:
     """
@@ -355,11 +391,12 @@ def add_agent_combo(agent_combination: set, g: WeightedGraph) -> None:
                 if not g.adjacent(agent_combs[i], agent_combs[j]):
                     g.add_edge(agent_combs[i], agent_combs[j], 1)
                 else:
-                    v1.neighbours[[u2 for u2 in v1.neighbours if u2.item == agent_combs[j]][0]] += 1
-                    v2.neighbours[[u1 for u1 in v2.neighbours if u1.item == agent_combs[i]][0]] += 1
+                    v1.neighbours[v2] += 1
+                    v2.neighbours[v1] += 1
 
 
 # -------------------------------------------- DATA LOADING FUNCTIONS ----------------------------------------------- #
+@timed('load.clean_agents_pick_file')
 def clean_agents_pick_file(file_path: str) -> str:
     """
     Return the path of a new file that is of the following format:
@@ -374,7 +411,8 @@ def clean_agents_pick_file(file_path: str) -> str:
         - the CSV file being referred to has the following format:
             Tournament,Stage,Match Type,Map,Agent,Pick Rate
     """
-    with open('cleaned_agents_pick_rates.csv', 'w', newline="") as write_file:
+    temp_path = _temp_path('cleaned_agents_pick_rates.csv')
+    with open(temp_path, 'w', newline="") as write_file:
         writer = csv.writer(write_file)
         writer.writerow(['Map', 'Agent', 'Pick Rate'])
         with open(file_path, 'r') as read_file:
@@ -383,9 +421,11 @@ def clean_agents_pick_file(file_path: str) -> str:
             for row in reader:
                 if row[3] != 'All Maps':
                     writer.writerow([row[3].lower(), row[4], int(row[5][:-1]) / 100])
+    os.replace(temp_path, 'cleaned_agents_pick_rates.csv')  # atomic, so no process reads a partial file
     return 'cleaned_agents_pick_rates.csv'
 
 
+@timed('load.clean_teams_picked_agents_file')
 def clean_teams_picked_agents_file(file_path: str) -> str:
     """
     Return the path of a new file that is of the following format:
@@ -397,7 +437,8 @@ def clean_teams_picked_agents_file(file_path: str) -> str:
         - the CSV file being referred to has the following format:
             Tournament,Stage,Match Type,Map,Team,Agent Picked,Total Wins By Map,Total Loss By Map,Total Maps Played
     """
-    with open('cleaned_teams_picked_agents.csv', 'w', newline="") as write_file:
+    temp_path = _temp_path('cleaned_teams_picked_agents.csv')
+    with open(temp_path, 'w', newline="") as write_file:
         writer = csv.writer(write_file)
         writer.writerow(['Map', 'Agent Picked', 'Total Wins By Map', 'Total Maps Played'])
         with open(file_path, 'r') as read_file:
@@ -405,9 +446,11 @@ def clean_teams_picked_agents_file(file_path: str) -> str:
             reader = csv.reader(read_file)
             for row in reader:
                 writer.writerow([row[3].lower(), row[5], row[6], row[8]])
+    os.replace(temp_path, 'cleaned_teams_picked_agents.csv')  # atomic, so no process reads a partial file
     return 'cleaned_teams_picked_agents.csv'
 
 
+@timed('load.clean_all_agents_file')
 def clean_all_agents_file(file_path: str) -> str:
     """
     Return the path of a new file that is a cleaned file version of file_path (removing whitespaces)
@@ -417,7 +460,8 @@ def clean_all_agents_file(file_path: str) -> str:
         - Each row in the CSV file being referred to is a list of agent names separated by commas
           (and possibly whitespaces)
     """
-    with open('cleaned_all_agents.csv', 'w', newline='') as write_file:
+    temp_path = _temp_path('cleaned_all_agents.csv')
+    with open(temp_path, 'w', newline='') as write_file:
         writer = csv.writer(write_file)
         writer.writerow(['Agents'])
         with open(file_path, 'r') as read_file:
@@ -425,10 +469,20 @@ def clean_all_agents_file(file_path: str) -> str:
             reader = csv.reader(read_file)
             for row in reader:
                 writer.writerow([u.replace(' ', '') for u in row])
+    os.replace(temp_path, 'cleaned_all_agents.csv')  # atomic, so no process reads a partial file
     return 'cleaned_all_agents.csv'
 
 
+def _temp_path(file_path: str) -> str:
+    """
+    Return a temporary path next to file_path that is unique to the current process and thread, to write a cleaned
+    file to before moving it to file_path
+    """
+    return f'{file_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
 # ------------------------------------------ FUNCTIONS FOR VISUALIZATION -------------------------------------------- #
+@timed('query.best_agent_for_map')
 def best_agent_for_map(graph: WeightedGraph, map_played: str, teammates: list, role: str = '') -> dict[str: float]:
     """
     Returns a dictionary of agents and the score (that is between 0 and 15) of how good the agent is for that map
@@ -461,6 +515,7 @@ def best_agent_for_map(graph: WeightedGraph, map_played: str, teammates: list, r
     return sorted_agent_and_score
 
 
+@timed('query.compatible_agents')
 def compatible_agents(graph: WeightedGraph, agent: str) -> dict[str: float]:
     """
     Return a dictionary of compatible agents (the most played combination) with the chosen agent,
@@ -520,23 +575,27 @@ def return_graph(map_ref: dict, agent_comb: list[set], role: str, cur_map: str,
         - view_agent_weights: hide or show the weights of agent-agent edges
     """
     from visualization import return_weighted_graph
-    if not view_agent_weights:
-        if role == 'all' and cur_map == 'all':
-            g = generate_weighted_graph(map_ref, agent_comb)
-        elif role == 'all' and cur_map != 'all':
-            g = generate_weighted_graph(map_ref, agent_comb, cu_map=cur_map)
-        else:
-            g = generate_weighted_graph(map_ref, agent_comb, role, cur_map)
-    else:
-        if role == 'all' and cur_map == 'all':
-            g = generate_weighted_graph(map_ref, agent_comb, view_agent_weights=view_agent_weights)
-        elif role == 'all' and cur_map != 'all':
-            g = generate_weighted_graph(map_ref, agent_comb, cu_map=cur_map, view_agent_weights=view_agent_weights)
-        else:
-            g = generate_weighted_graph(map_ref, agent_comb, role, cur_map, view_agent_weights=view_agent_weights)
+    g = graph_for_choice(map_ref, agent_comb, role, cur_map, view_agent_weights)
     return return_weighted_graph(g)
 
 
+def graph_for_choice(map_ref: dict, agent_comb: list[set], role: str, cur_map: str,
+                     view_agent_weights: bool = False) -> WeightedGraph:
+    """
+    Return the weighted graph for the role and map chosen by the user, where either of them can be 'all'
+
+    This is a helper function for return_graph, and for anything else that needs the graph behind one of its figures
+
+    Preconditions:
+        - role in {'duelists', 'controllers', 'initiators', 'sentinels', 'all'}
+        - cur_map in {'ascent', 'pearl', 'split', 'lotus', 'icebox', 'fracture', 'bind', 'haven', 'all'}
+    """
+    if role == 'all':
+        return generate_weighted_graph(map_ref, agent_comb, cu_map=cur_map, view_agent_weights=view_agent_weights)
+    else:
+        return generate_weighted_graph(map_ref, agent_comb, role, cur_map, view_agent_weights=view_agent_weights)
+
+
 # --------------------------------------------------- MAIN ---------------------------------------------------------- #
 if __name__ == '__main__':
     cleaned_agf_file = clean_agents_pick_file('graph_data/agents_pick_rates2023.csv')
@@ -571,7 +630,8 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'max-line-length': 120,
-        'extra-imports': ['csv', 'networkx', 'plotly.graph_objs', 'visualization'],
+        'extra-imports': ['csv', 'os', 'threading', 'networkx', 'numpy', 'plotly.graph_objs', 'scipy.sparse',
+                          'visualization', 'instrumentation'],
         'allowed-io': ['clean_agents_pick_file', 'clean_teams_picked_agents_file', 'clean_all_agents_file',
                        'load_agent_role_data', 'load_agent_combo_data', 'load_map_agent_data'],
         'max-nested-blocks': 5
@@ -0,0 +1,280 @@
+"""Valorant Instrumentation File
+
+This python module contains lightweight timers for each stage of the app (load -> build -> query -> render): a
+context manager, stage(name), and a decorator, timed(name). Every timed stage records its number of calls, its
+latencies (reported as p50/p95/p99) and, when allocation tracking is on, the number of bytes it retained. The
+recorded metrics can be read with report(), served as JSON by the blueprint from metrics_blueprint(), or printed by
+running this file, which times the whole pipeline once.
+
+Environment flags:
+    - VALORANT_TRACE_ALLOCATIONS=1: track the bytes retained by every stage with tracemalloc (slower)
+    - VALORANT_PROFILE_ONCE=<stage name>: capture a cProfile profile and the top tracemalloc allocations of the next
+      call of that stage (e.g. callback.update_graph) into VALORANT_PROFILE_DIR (default: profiles)
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+import cProfile
+import functools
+import os
+import threading
+import time
+import tracemalloc
+
+MAX_SAMPLES = 10000
+TRACE_ALLOCATIONS = os.environ.get('VALORANT_TRACE_ALLOCATIONS', '0') == '1'
+
+
+class StageStats:
+    """The metrics recorded for one stage.
+
+    Instance Attributes:
+        - count: the number of times the stage ran
+        - total_seconds: the total time spent in the stage
+        - retained_bytes: the total net growth of the memory traced by tracemalloc over the runs of the stage, that
+          is, the bytes allocated in it that were still allocated when it ended (0 unless allocations are tracked)
+        - samples: the latencies of the most recent MAX_SAMPLES runs of the stage, in seconds
+
+    Representation Invariants:
+        - self.count >= len(self.samples)
+    """
+    count: int
+    total_seconds: float
+    retained_bytes: int
+    samples: deque[float]
+
+    def __init__(self) -> None:
+        """Initialize the metrics of a stage that has not run yet."""
+        self.count = 0
+        self.total_seconds = 0.0
+        self.retained_bytes = 0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def summary(self) -> dict[str, Any]:
+        """Return the metrics of this stage, with its latency percentiles in milliseconds.
+
+        >>> s = StageStats()
+        >>> for ms in range(1, 101):
+        ...     s.record(ms / 1000, 0)
+        >>> summary = s.summary()
+        >>> summary['count'], summary['p50_ms'], summary['p99_ms']
+        (100, 50.0, 99.0)
+        """
+        ordered = sorted(self.samples)
+        return {'count': self.count,
+                'total_ms': round(self.total_seconds * 1000, 3),
+                'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+                'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+                'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+                'retained_bytes': self.retained_bytes}
+
+    def record(self, seconds: float, retained: int) -> None:
+        """Record one run of this stage that took seconds and retained the given number of bytes."""
+        self.count += 1
+        self.total_seconds += seconds
+        self.retained_bytes += retained
+        self.samples.append(seconds)
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """
+    Return the p-th percentile of ordered (nearest-rank), or 0.0 if it is empty
+
+    Preconditions:
+        - ordered is sorted in non-decreasing order
+        - 0 < p <= 100
+
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50)
+    2.0
+    >>> percentile([], 95)
+    0.0
+    """
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * p // 100))  # ceil(len * p / 100)
+    return ordered[int(rank) - 1]
+
+
+_stats: dict[str, StageStats] = {}
+_lock = threading.Lock()
+_profile_target: Optional[str] = os.environ.get('VALORANT_PROFILE_ONCE') or None
+
+if TRACE_ALLOCATIONS and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time the code run inside this context manager as one run of the stage called name
+
+    >>> reset()
+    >>> with stage('example'):
+    ...     _ = sum(range(1000))
+    >>> report()['example']['count']
+    1
+    """
+    global _profile_target
+    if _profile_target == name:
+        with _lock:
+            capture, _profile_target = _profile_target == name, None
+        if capture:
+            with _profiled(name):
+                yield
+            return
+
+    traced_before = tracemalloc.get_traced_memory()[0] if TRACE_ALLOCATIONS else 0
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        retained = max(0, tracemalloc.get_traced_memory()[0] - traced_before) if TRACE_ALLOCATIONS else 0
+        with _lock:
+            if name not in _stats:
+                _stats[name] = StageStats()
+            _stats[name].record(seconds, retained)
+
+
+def timed(name: str = '') -> Callable[[Callable], Callable]:
+    """
+    Return a decorator that times every call of the decorated function as one run of the stage called name
+    (by default, the name of the function)
+
+    >>> reset()
+    >>> @timed()
+    ... def double(x: int) -> int:
+    ...     return 2 * x
+    >>> double(4)
+    8
+    >>> list(report())
+    ['double']
+    """
+    def decorator(func: Callable) -> Callable:
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _profiled(name: str) -> Iterator[None]:
+    """
+    Run the code inside this context manager under cProfile and tracemalloc, and write the profile and the top
+    allocations to VALORANT_PROFILE_DIR
+    """
+    out_dir = os.environ.get('VALORANT_PROFILE_DIR', 'profiles')
+    os.makedirs(out_dir, exist_ok=True)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        seconds = time.perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        if not was_tracing:
+            tracemalloc.stop()
+        profiler.dump_stats(os.path.join(out_dir, f'{name}.prof'))
+        with open(os.path.join(out_dir, f'{name}.alloc.txt'), 'w') as file:
+            file.write(f'{name}: {seconds * 1000:.3f} ms\n')
+            for stat in after.compare_to(before, 'lineno')[:25]:
+                file.write(f'{stat}\n')
+
+
+def report() -> dict[str, dict[str, Any]]:
+    """Return the metrics of every stage that has run so far, in the format {stage_name: metrics}."""
+    with _lock:
+        return {name: stats.summary() for name, stats in sorted(_stats.items())}
+
+
+def reset() -> None:
+    """Forget the metrics recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def format_report(metrics: dict[str, dict[str, Any]]) -> str:
+    """
+    Return the given metrics (in the format returned by report()) as a table
+
+    >>> print(format_report({'load': {'count': 1, 'total_ms': 2.0, 'p50_ms': 2.0, 'p95_ms': 2.0, 'p99_ms': 2.0,
+    ...                               'retained_bytes': 0}}))
+    stage                                 count    total ms     p50 ms     p95 ms     p99 ms  retained KiB
+    load                                      1       2.000      2.000      2.000      2.000           0.0
+    """
+    lines = [f'{"stage":<36}{"count":>7}{"total ms":>12}{"p50 ms":>11}{"p95 ms":>11}{"p99 ms":>11}{"retained KiB":>14}']
+    for name, m in metrics.items():
+        lines.append(f'{name:<36}{m["count"]:>7}{m["total_ms"]:>12.3f}{m["p50_ms"]:>11.3f}{m["p95_ms"]:>11.3f}'
+                     f'{m["p99_ms"]:>11.3f}{m["retained_bytes"] / 1024:>14.1f}')
+    return '\n'.join(lines)
+
+
+def metrics_blueprint() -> Any:
+    """Return a Flask blueprint that serves report() as JSON at /metrics."""
+    from flask import Blueprint, jsonify
+    blueprint = Blueprint('metrics', __name__)
+
+    @blueprint.route('/metrics')
+    def metrics() -> Any:
+        """Return the metrics of every stage."""
+        return jsonify({'allocations_tracked': TRACE_ALLOCATIONS, 'stages': report()})
+
+    return blueprint
+
+
+def run_pipeline() -> None:
+    """
+    Run every stage of the app once (load, build, query and render) on the data in graph_data and tree_data,
+    so that report() shows how long each of them takes
+    """
+    from registry import DataRegistry
+    from graph import return_graph, best_agent_for_map, compatible_agents
+    from tree import visualize_tree_eco, visualize_tree_game
+
+    registry = DataRegistry()
+    best_agent_for_map(registry.map_agent_graph(), 'ascent', [], 'duelists')
+    compatible_agents(registry.map_agent_graph(), 'omen')
+    registry.best_side_for_map('ascent')
+    registry.best_buy_for_map('ascent')
+    figure = return_graph(registry.map_ref(), registry.agent_combos(), 'all', 'all', True)
+    with stage('serialize.agent_graph'):
+        figure.to_json()
+    figure = visualize_tree_game(*[registry.game_sample(year) for year in registry.years[-3:]], registry.years[-3:])
+    with stage('serialize.tree_game'):
+        figure.to_json()
+    figure = visualize_tree_eco(*[registry.eco_sample(year) for year in registry.years[-3:]], registry.years[-3:])
+    with stage('serialize.tree_eco'):
+        figure.to_json()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    # the other modules record into the imported module, not into this __main__ copy of it
+    import instrumentation
+    instrumentation.run_pipeline()
+    print(format_report(instrumentation.report()))
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['collections', 'contextlib', 'cProfile', 'functools', 'os', 'threading', 'time',
+                          'tracemalloc', 'flask', 'registry', 'graph', 'tree'],
+        'allowed-io': ['_profiled'],
+        'max-nested-blocks': 5
+    })
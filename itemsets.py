@@ -0,0 +1,188 @@
+"""Valorant Agent Sets File
+
+This python module contains an Apriori-style miner of the frequent agent sets (pairs, trios, quads and full
+five-agent compositions) of the agent combinations from load_agent_combo_data, with their support and lift, and an
+index of the mined sets that answers "given these picks, what are the best completions" queries.
+
+Every agent set is encoded as an integer bitmask (bit i is set if the set contains the i-th agent). Identical
+compositions are counted once with a weight, so the sets are only enumerated for each distinct composition, and all
+the queries are vectorized over NumPy arrays of bitmasks.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from itertools import combinations
+from typing import Optional
+
+import numpy as np
+
+from instrumentation import timed
+
+MAX_SET_SIZE = 5
+
+
+def encode(combos: list[set], agents: list[str]) -> np.ndarray:
+    """
+    Return the bitmask of each agent combination in combos, where bit i stands for agents[i]
+
+    Agents that are not in agents are ignored.
+
+    >>> encode([{'jett', 'omen'}, {'sova'}], ['jett', 'omen', 'sova'])
+    array([3, 4], dtype=uint64)
+    """
+    bits = {agent: 1 << i for i, agent in enumerate(agents)}
+    return np.array([sum(bits[a] for a in combo if a in bits) for combo in combos], dtype=np.uint64)
+
+
+def _bits(mask: int) -> list[int]:
+    """
+    Return the positions of the bits set in mask, in increasing order
+
+    >>> _bits(0b1011)
+    [0, 1, 3]
+    """
+    return [i for i in range(mask.bit_length()) if mask >> i & 1]
+
+
+class AgentSets:
+    """The frequent agent sets of a list of agent combinations.
+
+    Instance Attributes:
+        - agents: the agents, in the order of their bits
+        - n_combos: the number of combinations the sets were mined from
+        - masks: the bitmasks of the distinct combinations
+        - weights: the number of times each distinct combination appears
+        - frequent: maps each set size to (bitmasks, counts) of the frequent sets of that size, in descending order
+          of count
+
+    Representation Invariants:
+        - len(self.masks) == len(self.weights)
+        - int(self.weights.sum()) == self.n_combos
+    """
+    agents: list[str]
+    n_combos: int
+    masks: np.ndarray
+    weights: np.ndarray
+    frequent: dict[int, tuple[np.ndarray, np.ndarray]]
+    # Private Instance Attributes:
+    #     - _single_counts: the number of combinations that contain each agent, in the order of self.agents
+    _single_counts: np.ndarray
+
+    def __init__(self, combos: list[set], min_count: int = 2, max_size: int = MAX_SET_SIZE) -> None:
+        """Initialize the agent sets of combos that appear in at least min_count combinations, up to max_size agents.
+
+        >>> sets = AgentSets([{'jett', 'omen', 'sova'}, {'jett', 'omen', 'sova'}, {'jett', 'omen'}])
+        >>> sets.most_frequent(3)
+        [{'agents': ['jett', 'omen', 'sova'], 'count': 2, 'support': 0.6667, 'lift': 1.0}]
+        """
+        self.agents = sorted({agent for combo in combos for agent in combo if agent})
+        self.n_combos = len(combos)
+        self.masks, self.weights = np.unique(encode(combos, self.agents), return_counts=True)
+        self.frequent = {}
+
+        bits = np.array([1 << i for i in range(len(self.agents))], dtype=np.uint64)
+        self._single_counts = self.count(bits)
+        keep = self._single_counts >= min_count
+        self.frequent[1] = _ranked(bits[keep], self._single_counts[keep])
+        for size in range(2, max_size + 1):
+            counts = self._count_subsets(size)
+            if not counts:
+                break
+            masks = np.array(list(counts), dtype=np.uint64)
+            totals = np.array(list(counts.values()), dtype=np.int64)
+            keep = totals >= min_count
+            self.frequent[size] = _ranked(masks[keep], totals[keep])
+
+    def _count_subsets(self, size: int) -> dict[int, int]:
+        """
+        Return the number of combinations that contain each set of the given size whose subsets with one agent less
+        are all frequent (Apriori: no other set of that size can be frequent), in the format {bitmask: count}
+
+        The sets are enumerated from the distinct combinations, so sets that no combination contains are left out.
+        """
+        previous = {int(m) for m in self.frequent[size - 1][0]}
+        singles = {int(m).bit_length() - 1 for m in self.frequent[1][0]}
+        counts = {}
+        for mask, weight in zip(self.masks.tolist(), self.weights.tolist()):
+            bits = [b for b in _bits(mask) if b in singles]
+            for chosen in combinations(bits, size):
+                subset = sum(1 << b for b in chosen)
+                if subset in counts:
+                    counts[subset] += weight
+                elif all(subset & ~(1 << b) in previous for b in chosen):
+                    counts[subset] = weight
+        return counts
+
+    def count(self, sets: np.ndarray) -> np.ndarray:
+        """Return the number of combinations that contain each of the sets given as bitmasks."""
+        if len(sets) == 0:
+            return np.empty(0, dtype=np.int64)
+        contains = (self.masks[None, :] & sets[:, None]) == sets[:, None]
+        return contains.astype(np.int64) @ self.weights
+
+    def _describe(self, mask: int, count: int) -> dict:
+        """Return the agents, count, support and lift of the set with the given bitmask and count."""
+        bits = _bits(mask)
+        support = count / self.n_combos
+        single = self._single_counts[bits] / self.n_combos
+        return {'agents': [self.agents[b] for b in bits], 'count': count, 'support': round(support, 4),
+                'lift': round(support / float(np.prod(single)), 4)}
+
+    def most_frequent(self, size: int, k: int = 10) -> list[dict]:
+        """
+        Return the k most frequent sets of the given number of agents, in descending order of count, in the format
+        [{'agents': [...], 'count': count, 'support': support, 'lift': lift}, ...]
+
+        The support of a set is the share of the combinations that contain it, and its lift is its support divided by
+        the product of the supports of its agents (above 1 if the agents are played together more often than if they
+        were picked independently).
+        """
+        masks, counts = self.frequent.get(size, (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)))
+        return [self._describe(int(m), int(c)) for m, c in zip(masks[:k], counts[:k])]
+
+    def completions(self, picks: list[str], size: Optional[int] = None, k: int = 5) -> list[dict]:
+        """
+        Return the k most frequent sets that contain every agent in picks and have the given number of agents (by
+        default, one more than picks), in descending order of count, in the same format as AgentSets.most_frequent
+
+        Raise a KeyError if an agent in picks is unknown.
+
+        >>> sets = AgentSets([{'jett', 'omen', 'sova'}, {'jett', 'omen', 'sova'}, {'jett', 'omen', 'kayo'},
+        ...                   {'jett', 'omen', 'kayo'}, {'jett', 'omen', 'sova'}])
+        >>> [c['agents'] for c in sets.completions(['jett', 'omen'])]
+        [['jett', 'omen', 'sova'], ['jett', 'kayo', 'omen']]
+        """
+        picked = 0
+        for agent in picks:
+            if agent not in self.agents:
+                raise KeyError(agent)
+            picked |= 1 << self.agents.index(agent)
+        size = len(picks) + 1 if size is None else size
+        masks, counts = self.frequent.get(size, (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)))
+        matching = np.nonzero((masks & np.uint64(picked)) == np.uint64(picked))[0][:k]
+        return [self._describe(int(masks[i]), int(counts[i])) for i in matching]
+
+
+def _ranked(masks: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return masks and counts in descending order of count, breaking ties by mask."""
+    order = np.lexsort((masks, -counts))
+    return masks[order], counts[order]
+
+
+@timed('build.agent_sets')
+def mine_agent_sets(combos: list[set], min_count: int = 2, max_size: int = MAX_SET_SIZE) -> AgentSets:
+    """Return the frequent agent sets of combos (see AgentSets)."""
+    return AgentSets(combos, min_count, max_size)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['itertools', 'numpy', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
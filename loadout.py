@@ -0,0 +1,173 @@
+"""Valorant Loadout File
+
+This python module contains functions to parse the Loadout Value and Remaining Credits columns of the eco_data files
+(e.g. 3.9k) into NumPy arrays, and to compute the probability of winning a round as a function of the difference
+between the loadout values of the two teams, per map and year. Every step works on whole columns at once, so the
+curves stay fast on the full eco_data files and on much larger synthetic ones.
+
+Each round has one row for each team, so every round is counted once from the point of view of each team: the
+probability of winning with a loadout difference of d is one minus the probability of winning with -d.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import csv
+
+import numpy as np
+
+from instrumentation import timed
+
+# the columns of the eco_data files that are kept
+MATCH, MAP, ROUND, TEAM, LOADOUT, REMAINING, OUTCOME = 3, 4, 5, 6, 7, 8, 10
+
+
+def parse_credits(values: np.ndarray) -> np.ndarray:
+    """
+    Return the given credit values of the eco_data files (e.g. '3.9k') as a float array of credits
+
+    >>> parse_credits(np.array(['3.9k', '0.4k', '21.5k', '800']))
+    array([ 3900.,   400., 21500.,   800.])
+    """
+    values = np.char.strip(values.astype(str))
+    thousands = np.char.endswith(values, 'k')
+    numbers = np.char.rstrip(values, 'k').astype(np.float64)
+    return np.where(thousands, numbers * 1000, numbers)
+
+
+class Loadouts:
+    """The loadout of every team in every round of the eco_data files, as parallel arrays with one element per row.
+
+    Only the rounds with exactly one row for each of two teams are kept, and the two rows of each round are next to
+    each other.
+
+    Instance Attributes:
+        - maps: the (capitalized) maps, in the order of their codes
+        - years: the years, in the order of their codes
+        - map_codes: the code of the map of each row
+        - year_codes: the code of the year of each row
+        - loadout: the loadout value of each row, in credits
+        - remaining: the remaining credits of each row
+        - won: whether the team of each row won the round
+        - difference: the loadout value of each row minus the loadout value of the other team in the same round
+
+    Representation Invariants:
+        - len(self.loadout) % 2 == 0
+        - np.all(self.won[0::2] != self.won[1::2])
+    """
+    maps: list[str]
+    years: list[str]
+    map_codes: np.ndarray
+    year_codes: np.ndarray
+    loadout: np.ndarray
+    remaining: np.ndarray
+    won: np.ndarray
+    difference: np.ndarray
+
+    def __init__(self, rows_by_year: dict[str, list[list[str]]]) -> None:
+        """Initialize the loadouts of the given eco_data rows (without headers), in the format {year: rows}.
+
+        >>> rows = [['VCT', '', '', 'A vs B', 'Lotus', '1', 'A', '3.9k', '0.4k', 'Eco: 0-5k', 'Win'],
+        ...         ['VCT', '', '', 'A vs B', 'Lotus', '1', 'B', '4.1k', '0.1k', 'Eco: 0-5k', 'Loss']]
+        >>> data = Loadouts({'2022': rows})
+        >>> data.difference
+        array([-200.,  200.])
+        """
+        self.years = list(rows_by_year)
+        kept = (MATCH, MAP, ROUND, LOADOUT, REMAINING, OUTCOME)
+        parts, year_parts = [], []
+        for code, year in enumerate(self.years):
+            rows = [row for row in rows_by_year[year] if len(row) > OUTCOME and row[0] != '']
+            if rows:
+                transposed = list(zip(*rows))
+                parts.append(np.array([transposed[c] for c in kept], dtype=str))
+                year_parts.append(np.full(len(rows), code, dtype=np.int64))
+        columns = np.concatenate(parts, axis=1).T if parts else np.empty((0, len(kept)), dtype=str)
+        year_codes = np.concatenate(year_parts) if year_parts else np.empty(0, dtype=np.int64)
+
+        # group the rows by year, match, map and round, and keep the rounds with exactly two rows (one per team)
+        keys = year_codes
+        for column in range(3):
+            values, codes = np.unique(columns[:, column], return_inverse=True)
+            keys = keys * len(values) + codes.reshape(-1)
+        _, groups, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        groups = groups.reshape(-1)
+        order = np.argsort(groups, kind='stable')
+        order = order[sizes[groups[order]] == 2]
+
+        map_names, map_codes = np.unique(np.char.lower(columns[order, 1]), return_inverse=True)
+        self.maps = [m.capitalize() for m in map_names]
+        self.map_codes = map_codes.reshape(-1)
+        self.year_codes = year_codes[order]
+        self.loadout = parse_credits(columns[order, 3])
+        self.remaining = parse_credits(columns[order, 4])
+        self.won = columns[order, 5] == 'Win'
+        partner = np.arange(len(order)) ^ 1  # the other row of the same round
+        self.difference = self.loadout - self.loadout[partner]
+
+    def __len__(self) -> int:
+        """Return the number of rows in these loadouts."""
+        return len(self.loadout)
+
+    def mask(self, map_played: Optional[str] = None, year: Optional[str] = None) -> np.ndarray:
+        """Return whether each row is on map_played and in year (every map or year if it is None)."""
+        selected = np.ones(len(self), dtype=bool)
+        if map_played is not None:
+            code = [i for i, m in enumerate(self.maps) if m.lower() == map_played.lower()]
+            selected &= self.map_codes == (code[0] if code else -1)
+        if year is not None:
+            selected &= self.year_codes == (self.years.index(year) if year in self.years else -1)
+        return selected
+
+    def win_probability_curve(self, map_played: Optional[str] = None, year: Optional[str] = None,
+                              bin_width: int = 1000, limit: int = 30000) -> dict[str, list[Any]]:
+        """
+        Return the probability of winning a round for each bin of loadout difference (own loadout minus the other
+        team's loadout) on map_played in year, in the format
+        {'bin_start': [...], 'rounds': [...], 'win_probability': [...]}
+
+        Differences are clipped to [-limit, limit], and bins with no rounds are left out.
+
+        >>> rows = [['VCT', '', '', 'A vs B', 'Lotus', '1', 'A', '3.9k', '0.4k', 'Eco: 0-5k', 'Win'],
+        ...         ['VCT', '', '', 'A vs B', 'Lotus', '1', 'B', '4.1k', '0.1k', 'Eco: 0-5k', 'Loss']]
+        >>> data = Loadouts({'2022': rows})
+        >>> data.win_probability_curve('lotus', '2022', bin_width=500)
+        {'bin_start': [-500, 0], 'rounds': [1, 1], 'win_probability': [1.0, 0.0]}
+        """
+        selected = self.mask(map_played, year)
+        difference = np.clip(self.difference[selected], -limit, limit - 1)
+        bins = np.floor_divide(difference + limit, bin_width).astype(np.int64)
+        n_bins = -(-2 * limit // bin_width)
+        rounds = np.bincount(bins, minlength=n_bins)
+        wins = np.bincount(bins, weights=self.won[selected], minlength=n_bins)
+        used = np.nonzero(rounds)[0]
+        return {'bin_start': [int(b * bin_width - limit) for b in used],
+                'rounds': [int(r) for r in rounds[used]],
+                'win_probability': [round(float(w), 4) for w in wins[used] / rounds[used]]}
+
+
+def _read_rows(path: str) -> list[list[str]]:
+    """Return the rows of the csv file at path, without its header."""
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        return list(reader)
+
+
+@timed('load.loadouts')
+def load_loadouts(paths_by_year: dict[str, str]) -> Loadouts:
+    """Return the loadouts of the eco_data files in paths_by_year, in the format {year: path}."""
+    return Loadouts({year: _read_rows(path) for year, path in paths_by_year.items()})
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['csv', 'numpy', 'instrumentation'],
+        'allowed-io': ['_read_rows'],
+        'max-nested-blocks': 5
+    })
@@ -1,83 +1,127 @@
-from dash import Dash, dcc, html, Input, Output, callback, State, ctx
+import os
 
-from graph import (clean_agents_pick_file, clean_teams_picked_agents_file, load_agent_role_data, load_map_agent_data,
-                   generate_weighted_graph, return_graph, clean_all_agents_file, load_agent_combo_data,
-                   compatible_agents, best_agent_for_map)
+from dash import Dash, dcc, html, Input, Output, callback, clientside_callback, State, ctx
+from dash.exceptions import PreventUpdate
 
-from tree import visualize_tree_game, read_game, read_buy_type, generate_tree, Tree, visualize_tree_eco
+from graph import return_graph, best_agent_for_map
 
+from tree import visualize_tree_game, visualize_tree_eco
 
-# INITIALIZE DATA FOR GRAPH #
-cleaned_agf_file = clean_agents_pick_file('graph_data/agents_pick_rates2023.csv')
-cleaned_tpa_file = clean_teams_picked_agents_file('graph_data/teams_picked_agents2023.csv')
-cleaned_aa_file = clean_all_agents_file('graph_data/all_agents.csv')
-agent_role_data = load_agent_role_data('graph_data/agent_roles.csv')
-agent_combinations = load_agent_combo_data(cleaned_aa_file)
-map_agent_data = load_map_agent_data(cleaned_agf_file, cleaned_tpa_file, agent_role_data)
-map_agent_graph = generate_weighted_graph(map_agent_data, agent_combinations, view_agent_weights=True)
+from durations import length_figure, overtime_figure, side_bias_text
+from sampling import STRATEGIES, GAME_SAMPLE_SIZE, ECO_SAMPLE_SIZE, GAME_SAMPLE_RANGE, ECO_SAMPLE_RANGE, sample_size
 
+from figure_store import FigureStore, LOAD_FIGURE, figure_blueprint, figure_url
+from registry import DataRegistry
+from snapshot import ensure_snapshot
+from database import ensure_database
+from api import api_blueprint, recommendation_index
+from instrumentation import timed, metrics_blueprint
+from watcher import DataWatcher
 
-# INITIALIZE DATA FOR TREE #
-game_file_2021_vis = open('tree_data/maps_scores_2021_visual.csv')
-game_file_2022_vis = open('tree_data/maps_scores_2022_visual.csv')
-game_file_2023_vis = open('tree_data/maps_scores_2023_visual.csv')
 
-eco_file_2021_vis = open('tree_data/eco_data_2021_visual.csv')
-eco_file_2022_vis = open('tree_data/eco_data_2022_visual.csv')
-eco_file_2023_vis = open('tree_data/eco_data_2023_visual.csv')
+# INITIALIZE DATA REGISTRY AND FIGURE STORE #
+# Nothing is loaded here: every dataset is loaded by the registry the first time a callback needs it
+registry = DataRegistry()
+figure_store = FigureStore(compress=True)
 
-game_data_2021_vis = read_game(game_file_2021_vis)
-game_data_2022_vis = read_game(game_file_2022_vis)
-game_data_2023_vis = read_game(game_file_2023_vis)
-
-eco_data_2021_vis = read_buy_type(eco_file_2021_vis)
-eco_data_2022_vis = read_buy_type(eco_file_2022_vis)
-eco_data_2023_vis = read_buy_type(eco_file_2023_vis)
-
-game_file_2021 = open('tree_data/maps_scores_2021.csv')
-game_file_2022 = open('tree_data/maps_scores_2022.csv')
-game_file_2023 = open('tree_data/maps_scores_2023.csv')
-
-eco_file_2021 = open('tree_data/eco_data_2021.csv')
-eco_file_2022 = open('tree_data/eco_data_2022.csv')
-eco_file_2023 = open('tree_data/eco_data_2023.csv')
-
-game_data_2021 = read_game(game_file_2021)
-game_data_2022 = read_game(game_file_2022)
-game_data_2023 = read_game(game_file_2023)
-
-eco_data_2021 = read_buy_type(eco_file_2021)
-eco_data_2022 = read_buy_type(eco_file_2022)
-eco_data_2023 = read_buy_type(eco_file_2023)
-
-game_tree_2021 = generate_tree(game_data_2021)
-game_tree_2022 = generate_tree(game_data_2022)
-game_tree_2023 = generate_tree(game_data_2023)
-
-eco_tree_2021 = generate_tree(eco_data_2021)
-eco_tree_2022 = generate_tree(eco_data_2022)
-eco_tree_2023 = generate_tree(eco_data_2023)
-
-vct_tree = Tree('VCT', [])
-vct_tree.combine_all([game_tree_2021, game_tree_2022, game_tree_2023])
-eco_tree = Tree('VCT buy types', [])
-eco_tree.combine_all([eco_tree_2021, eco_tree_2022, eco_tree_2023])
+# When running several server workers, set VALORANT_SNAPSHOT_DIR so that the first worker writes the derived
+# datasets once into a memory-mapped snapshot and every other worker maps it read-only (see snapshot.py)
+if os.environ.get('VALORANT_SNAPSHOT_DIR'):
+    registry.use_snapshot(ensure_snapshot(registry, os.environ['VALORANT_SNAPSHOT_DIR']))
+# Alternatively, set VALORANT_DATABASE to ingest the datasets into a SQLite database file and answer the map queries
+# with indexed SQL (see database.py)
+elif os.environ.get('VALORANT_DATABASE'):
+    registry.use_snapshot(ensure_database(registry, os.environ['VALORANT_DATABASE']))
 
 app = Dash(__name__)
-
-app.layout = html.Div([
-    html.H1('Valorant Analysis App'),
-    dcc.Tabs(id="tabs", value='tab-1', children=[
-        dcc.Tab(label='Which Agents to play', value='tab-1'),
-        dcc.Tab(label='Most effective buy', value='tab-2'),
-        dcc.Tab(label='Attacker or Defender-sided', value='tab-3')
-    ]),
-    html.Div(id='tabs-content')
-])
+server = app.server  # for WSGI servers, e.g. gunicorn --workers 4 main:server
+server.register_blueprint(api_blueprint(registry))  # batch JSON recommendations, see api.py
+server.register_blueprint(metrics_blueprint())  # per-stage timings at /metrics, see instrumentation.py
+server.register_blueprint(figure_blueprint(figure_store))  # the stored figures, see figure_store.py
+
+MAPS = ['ascent', 'pearl', 'split', 'lotus', 'icebox', 'fracture', 'bind', 'haven']
+ROLES = ['duelists', 'controllers', 'initiators', 'sentinels', 'all']
+
+
+def best_agents_text(map_played: str, role: str, teammates: list, tournaments: tuple = (), stages: tuple = (),
+                     decayed: bool = False) -> str:
+    """
+    Return the answer shown under the agents graph for the given map, role and teammates' agents, using the picks of
+    the given tournaments and stages only (every one of them if empty), weighted towards recent events if decayed
+    """
+    if tournaments or stages or decayed:
+        agents = list(best_agent_for_map(registry.partition_graph(tournaments, stages, decayed), map_played,
+                                         teammates, '' if role == 'all' else role))
+    else:
+        # answered from the recommendation index, which reads a snapshot without building the graph
+        agents = [agent['agent'] for agent in recommendation_index(registry).best_agents(
+            map_played, teammates, '' if role == 'all' else role)]
+    return ('The best agent to play on ' + map_played + ' are ' + str(agents)
+            + '. This is ordered in descending suitable score of agents on this map')
+
+
+def eco_year_label(year: str) -> str:
+    """Return the label of year in the eco tree, marking the years shown from a sample file or without eco data."""
+    if year in registry.eco_years:
+        return year
+    elif os.path.exists(registry.eco_sample_path(year)):
+        return year + ' (sample file)'
+    return year + ' (no eco data)'
+
+
+def side_text(map_played: str) -> str:
+    """Return the answer shown under the game tree for map_played, with the confidence interval of its side bias."""
+    text = map_played + ' ' + registry.best_side_for_map(map_played)
+    result = registry.side_intervals().get(map_played, {}).get('all')
+    if result is None or result['attack_rate'] is None:
+        return text
+    return (f"{text}. Attackers win {result['attack_rate']:.1%} of the rounds (95% CI {result['low']:.1%} to "
+            f"{result['high']:.1%}, {result['matches']} matches), so statistically it {result['verdict']}.")
+
+
+def text_answer_table() -> dict:
+    """
+    Return every answer that depends only on a map and a role, in the format
+    {'agents': {map: {role: text}}, 'eco': {map: text}, 'side': {map: text}}
+
+    The table is sent to the browser once, so that the clientside callbacks below can answer these without a
+    round-trip to the server.
+    """
+    agents = {m: {r: best_agents_text(m, r, []) for r in ROLES} for m in MAPS}
+    agents['all'] = {r: 'Please pick a specific map' for r in ROLES}
+    try:
+        eco = {m: registry.best_buy_for_map(m) + ' on ' + m for m in MAPS}
+    except OSError:
+        eco = {m: 'No buy type data available' for m in MAPS}
+    try:
+        side = {m: side_text(m) for m in MAPS}
+    except OSError:
+        side = {m: 'No attacker/defender data available' for m in MAPS}
+    return {'agents': agents, 'eco': eco, 'side': side}
+
+
+def serve_layout() -> html.Div:
+    """Return the layout of the app, including the table of precomputed text answers."""
+    return html.Div([
+        html.H1('Valorant Analysis App'),
+        dcc.Tabs(id="tabs", value='tab-1', children=[
+            dcc.Tab(label='Which Agents to play', value='tab-1'),
+            dcc.Tab(label='Most effective buy', value='tab-2'),
+            dcc.Tab(label='Attacker or Defender-sided', value='tab-3'),
+            dcc.Tab(label='Match length and overtime', value='tab-4')
+        ]),
+        html.Div(id='tabs-content'),
+        dcc.Store(id='text-answers', data=registry.cached('text_answer_table', text_answer_table)),
+        dcc.Store(id='agent-query')
+    ])
+
+
+app.layout = serve_layout
 
 
 @callback(Output('tabs-content', 'children'),
           Input('tabs', 'value'))
+@timed('callback.render_content')
 def render_content(tab):
     if tab == 'tab-1':
         return html.Div([
@@ -100,7 +144,13 @@ def render_content(tab):
                  'fracture',
                  'bind',
                  'haven', 'all'], 'ascent', inline=True, id='choice2_1'),
+            dcc.Dropdown(registry.agent_partitions().values('tournament'), multi=True, id='tournament_1',
+                         placeholder='All tournaments'),
+            dcc.Dropdown(registry.agent_partitions().values('stage'), multi=True, id='stage_1',
+                         placeholder='All stages'),
+            dcc.RadioItems(['all_picks', 'recent_meta'], 'all_picks', inline=True, id='decay_1'),
             dcc.Graph(figure={}, id='visual_graph_1'),
+            dcc.Store(id='visual_graph_1_url'),
             html.Hr(),
             html.Div(dcc.Input(id='input_user_1', type='text')),
             html.Button('Submit', id='button_1'),
@@ -111,7 +161,14 @@ def render_content(tab):
             html.Div(dcc.Input(id='input_agent_1', type='text')),
             html.Button('Submit', id='button2_1'),
             html.Div(id='output-container-button2_1',
-                     children="Enter an agent you're playing and press submit")
+                     children="Enter an agent you're playing and press submit"),
+            html.Hr(),
+            html.Div(dcc.Input(id='input_comp_1', type='text')),
+            dcc.Checklist(ROLES[:-1], [], inline=True, id='roles_1'),
+            html.Button('Submit', id='button3_1'),
+            html.Div(id='output-container-button3_1',
+                     children="Enter the agents already locked in, in the form: (Agent1),(Agent2),... or leave it "
+                              "blank, tick the roles the team needs at least one of, and press submit")
         ])
     elif tab == 'tab-2':
         return html.Div([
@@ -126,9 +183,12 @@ def render_content(tab):
                  'fracture',
                  'bind',
                  'haven'], 'ascent', inline=True, id='choice2_2'),
-            dcc.Graph(figure=visualize_tree_eco(eco_data_2021_vis[1], eco_data_2022_vis[1], eco_data_2023_vis[1])),
+            dcc.RadioItems(list(STRATEGIES), 'first', inline=True, id='sample_2'),
+            dcc.Slider(*ECO_SAMPLE_RANGE, 1, value=ECO_SAMPLE_SIZE, id='size_2'),
+            dcc.Graph(id='tree_graph_2'),
+            dcc.Store(id='tree_graph_2_url'),
             html.Div(id='text_eco',
-                     children=eco_tree.best_buy_for_map('ascent') + ' on ascent'),
+                     children=registry.best_buy_for_map('ascent') + ' on ascent'),
         ])
     elif tab == 'tab-3':
         return html.Div([
@@ -143,9 +203,24 @@ def render_content(tab):
                  'fracture',
                  'bind',
                  'haven'], 'ascent', inline=True, id='choice2_3'),
-            dcc.Graph(figure=visualize_tree_game(game_data_2021_vis[1], game_data_2022_vis[1], game_data_2023_vis[1])),
+            dcc.RadioItems(list(STRATEGIES), 'first', inline=True, id='sample_3'),
+            dcc.Slider(*GAME_SAMPLE_RANGE, 5, value=GAME_SAMPLE_SIZE, id='size_3'),
+            dcc.Graph(id='tree_graph_3'),
+            dcc.Store(id='tree_graph_3_url'),
             html.Div(id='text_ct',
-                     children='ascent ' + vct_tree.best_side_for_map('ascent')),
+                     children=registry.cached('text_answer_table', text_answer_table)['side']['ascent']),
+        ])
+    elif tab == 'tab-4':
+        return html.Div([
+            html.H3('Match length and overtime'),
+            html.Hr(),
+            dcc.RadioItems(MAPS + ['all'], 'all', inline=True, id='choice2_4'),
+            dcc.Graph(id='duration_graph'),
+            dcc.Store(id='duration_graph_url'),
+            html.Div(id='text_duration'),
+            dcc.Graph(id='overtime_graph'),
+            dcc.Store(id='overtime_graph_url', data=figure_url(figure_store, registry.data_version(), 'overtime', (),
+                                                               overtime_figure, registry.match_durations())),
         ])
 
     html.Div(id='tabs-content')
@@ -154,43 +229,75 @@ def render_content(tab):
 # --------------------------------------------- which agent to play ------------------------------------------------- #
 
 @callback(
-    Output(component_id='visual_graph_1', component_property='figure'),
+    Output('visual_graph_1_url', 'data'),
     [Input('choice0_1', 'value'),
      Input(component_id='choice1_1', component_property='value'),
-     Input(component_id='choice2_1', component_property='value')]
+     Input(component_id='choice2_1', component_property='value'),
+     Input('tournament_1', 'value'),
+     Input('stage_1', 'value'),
+     Input('decay_1', 'value')]
 )
-def update_graph(choice0, choice1, choice2):
-    if choice0 == 'hide_agent_weight':
-        fig = return_graph(map_agent_data, agent_combinations, choice1, choice2)
-    else:
-        fig = return_graph(map_agent_data, agent_combinations, choice1, choice2, view_agent_weights=True)
-    return fig
-
-
-@callback(
-    Output('output-container-button_1', 'children'),
+@timed('callback.update_graph')
+def update_graph(choice0, choice1, choice2, tournaments, stages, decay):
+    # the inputs are part of the key of the stored figure, so only the values offered by the layout are accepted
+    if choice1 not in ROLES or choice2 not in MAPS + ['all']:
+        raise PreventUpdate
+    view_agent_weights = choice0 != 'hide_agent_weight'
+    partitions = registry.agent_partitions()
+    tournaments = tuple(sorted(set(tournaments or []) & set(partitions.values('tournament'))))
+    stages = tuple(sorted(set(stages or []) & set(partitions.values('stage'))))
+    decayed = decay == 'recent_meta'
+    if tournaments or stages or decayed:
+        map_ref = registry.partition_map_ref(tournaments, stages, decayed)
+        return figure_url(figure_store, registry.data_version(), 'agent_graph',
+                          (choice1, choice2, view_agent_weights, tournaments, stages, decayed), return_graph,
+                          map_ref, registry.agent_combos(), choice1, choice2, view_agent_weights)
+    return figure_url(figure_store, registry.data_version(), 'agent_graph', (choice1, choice2, view_agent_weights),
+                      return_graph, registry.map_ref(), registry.agent_combos(), choice1, choice2, view_agent_weights)
+
+
+# Answer from the precomputed table in the browser when there are no teammates' agents, no selected tournaments or
+# stages and no time decay, and otherwise pass the query on to the server through the agent-query store
+clientside_callback(
+    """
+    function(choice1, choice2, button, input, tournaments, stages, decay, answers) {
+        const triggered = dash_clientside.callback_context.triggered.map(t => t.prop_id);
+        if (!triggered.includes('button_1.n_clicks')) {
+            return ["Please input the agents your teammates are playing. Answer in the form: " +
+                    "(Agent1),(Agent2),...,(Agent4)\n. Don't type anything if you can choose any character.",
+                    dash_clientside.no_update];
+        }
+        const filtered = (tournaments && tournaments.length) || (stages && stages.length) || decay === 'recent_meta';
+        if ((!input && !filtered) || choice2 === 'all') {
+            return [answers['agents'][choice2][choice1], dash_clientside.no_update];
+        }
+        return [dash_clientside.no_update, {'map': choice2, 'role': choice1, 'teammates': input || '',
+                                            'tournaments': tournaments || [], 'stages': stages || [],
+                                            'decayed': decay === 'recent_meta', 'clicks': button}];
+    }
+    """,
+    [Output('output-container-button_1', 'children'),
+     Output('agent-query', 'data')],
     [Input('choice1_1', 'value'),
      Input('choice2_1', 'value'),
      Input('button_1', 'n_clicks')],
-    State('input_user_1', 'value'),
+    [State('input_user_1', 'value'),
+     State('tournament_1', 'value'),
+     State('stage_1', 'value'),
+     State('decay_1', 'value'),
+     State('text-answers', 'data')],
     prevent_initial_call=True)
-def update_output(choice1, choice2, button, input):
-    button_clicked = ctx.triggered_id
-    if button_clicked == 'button_1':
-        agents_so_far = 'The best agent to play on ' + choice2 + ' are '
-        if choice1 == 'all':
-            choice1 = ''
-        if input is None:
-            agents_so_far += str(
-                list(best_agent_for_map(map_agent_graph, choice2, [], choice1).keys()))
-        else:
-            teammate_agents = input.split(',')
-            agents_so_far += str(
-                list(best_agent_for_map(map_agent_graph, choice2, teammate_agents, choice1).keys()))
-        return agents_so_far + '. This is ordered in descending suitable score of agents on this map'
-    else:
-        return ("Please input the agents your teammates are playing. Answer in the form: (Agent1),(Agent2),...,(Agent4)"
-                "\n. Don't type anything if you can choose any character.")
+
+
+@callback(
+    Output('output-container-button_1', 'children', allow_duplicate=True),
+    Input('agent-query', 'data'),
+    prevent_initial_call=True)
+@timed('callback.update_agents_with_teammates')
+def update_output(query):
+    teammates = query['teammates'].split(',') if query['teammates'] else []
+    return best_agents_text(query['map'], query['role'], teammates, tuple(sorted(query.get('tournaments', []))),
+                            tuple(sorted(query.get('stages', []))), query.get('decayed', False))
 
 
 @callback(
@@ -199,6 +306,7 @@ def update_output(choice1, choice2, button, input):
      Input('button2_1', 'n_clicks')],
     State('input_agent_1', 'value'),
     prevent_initial_call=True)
+@timed('callback.update_compatible_agents')
 def update_output(choice2, button, input):
     button_clicked = ctx.triggered_id
     if button_clicked == 'button2_1':
@@ -207,33 +315,128 @@ def update_output(choice2, button, input):
         if input is None:
             return "Please input an agent name."
         else:
-            agent_score = map_agent_graph.get_weight(input, choice2)
-            list_of_agents = compatible_agents(map_agent_graph, input)
+            index = recommendation_index(registry)
+            agent_score = {a['agent']: a['score'] for a in index.best_agents(choice2, [])}[input]
+            list_of_agents = [a['agent'] for a in index.compatible_agents(input)]
             return ('The agent ' + str(input) + ' has a suitability score of ' + str(agent_score) + ' on the map '
                     + str(choice2) + '. And the most played agents with ' + str(input) + ' includes: '
-                    + str(list(list_of_agents.keys())) + ' which is in order of descending compatibility')
+                    + str(list_of_agents) + ' which is in order of descending compatibility')
     else:
         return "Enter an agent you're playing and press submit."
 
 
 @callback(
+    Output('output-container-button3_1', 'children'),
+    Input('button3_1', 'n_clicks'),
+    [State('choice2_1', 'value'),
+     State('input_comp_1', 'value'),
+     State('roles_1', 'value')],
+    prevent_initial_call=True)
+@timed('callback.update_best_comp')
+def update_best_comp(button, choice2, input, roles):
+    if choice2 == 'all':
+        return "Please pick a specific map"
+    locked = [agent.strip().lower() for agent in (input or '').split(',') if agent.strip()]
+    try:
+        comps = registry.comp_optimizer().best_comps(choice2, locked, {role: 1 for role in roles or []})
+    except KeyError as error:
+        return 'Unknown agent: ' + str(error.args[0])
+    except ValueError as error:
+        return str(error)
+    if not comps:
+        return 'No team composition meets these constraints'
+    return ('The best team composition on ' + choice2 + ' is ' + str(comps[0]['agents']) + ' with a score of '
+            + str(comps[0]['score']) + ' (' + str(comps[0]['map_score']) + ' from the map and '
+            + str(comps[0]['pair_score']) + ' from how often the agents are played together)')
+
+
+clientside_callback(
+    """
+    function(choice2, answers) {
+        return answers['eco'][choice2];
+    }
+    """,
     Output('text_eco', 'children'),
     Input('choice2_2', 'value'),
+    State('text-answers', 'data'),
     prevent_initial_call=True)
-def update_output(choice2):
-    return eco_tree.best_buy_for_map(choice2) + ' on ' + choice2
 
 
 @callback(
+    Output('tree_graph_2_url', 'data'),
+    [Input('sample_2', 'value'),
+     Input('size_2', 'value')])
+@timed('callback.update_eco_tree')
+def update_eco_tree(strategy, size):
+    strategy = strategy if strategy in STRATEGIES else 'first'
+    size = sample_size(size, ECO_SAMPLE_RANGE, ECO_SAMPLE_SIZE)
+    years = registry.years[-3:]  # the tree visualizations show three years
+    labels = tuple(eco_year_label(year) for year in years)
+    return figure_url(figure_store, registry.data_version(), 'tree_eco', (strategy, size), visualize_tree_eco,
+                      *[registry.eco_sample(year, size, strategy) for year in years], labels)
+
+
+clientside_callback(
+    """
+    function(choice2, answers) {
+        return answers['side'][choice2];
+    }
+    """,
     Output('text_ct', 'children'),
     Input('choice2_3', 'value'),
+    State('text-answers', 'data'),
     prevent_initial_call=True)
-def update_output(choice2):
-    return choice2 + ' ' + vct_tree.best_side_for_map(choice2)
 
 
+@callback(
+    Output('tree_graph_3_url', 'data'),
+    [Input('sample_3', 'value'),
+     Input('size_3', 'value')])
+@timed('callback.update_game_tree')
+def update_game_tree(strategy, size):
+    strategy = strategy if strategy in STRATEGIES else 'first'
+    size = sample_size(size, GAME_SAMPLE_RANGE, GAME_SAMPLE_SIZE)
+    years = registry.years[-3:]  # the tree visualizations show three years
+    return figure_url(figure_store, registry.data_version(), 'tree_game', (strategy, size), visualize_tree_game,
+                      *[registry.game_sample(year, size, strategy) for year in years], years)
+
+
+@callback(
+    [Output('duration_graph_url', 'data'),
+     Output('text_duration', 'children')],
+    Input('choice2_4', 'value'))
+@timed('callback.update_durations')
+def update_durations(choice2):
+    if choice2 not in MAPS + ['all']:
+        raise PreventUpdate
+    map_played = None if choice2 == 'all' else choice2
+    durations = registry.match_durations()
+    return (figure_url(figure_store, registry.data_version(), 'durations', (choice2,), length_figure, durations,
+                       map_played),
+            side_bias_text(durations, map_played))
+
+
+# Every figure is returned as the URL of its stored JSON (see figure_store.py), loaded into its graph by the browser
+for graph_id in ['visual_graph_1', 'tree_graph_2', 'tree_graph_3', 'duration_graph', 'overtime_graph']:
+    clientside_callback(LOAD_FIGURE, Output(graph_id, 'figure'), Input(graph_id + '_url', 'data'))
+
+# After a new data version is published, drop the figures of the older ones and compute the text answers of the new one
+PUBLISH_HOOKS = [lambda: figure_store.invalidate(registry.data_version()),
+                 lambda: registry.cached('text_answer_table', text_answer_table)]
+
+# When serving from a snapshot (e.g. in every worker of a WSGI server), each worker watches the csv files: the first
+# one to see a change writes the new snapshot, and every worker then maps it and switches to it (see watcher.py)
+if os.environ.get('VALORANT_SNAPSHOT_DIR') and os.environ.get('VALORANT_WATCH', '1') != '0':
+    DataWatcher(registry, on_publish=PUBLISH_HOOKS, snapshot_root=os.environ['VALORANT_SNAPSHOT_DIR']).start()
+
 # ---------------------------------------------- which agent to play ------------------------------------------------ #
 
 
 if __name__ == '__main__':
+    # warm up the registry in the background so that the server starts serving immediately
+    if os.environ.get('VALORANT_PREFETCH', '1') != '0':
+        registry.prefetch(extra=[lambda: registry.cached('text_answer_table', text_answer_table)])
+    # ingest new or changed csv files in the background while serving (see watcher.py)
+    if os.environ.get('VALORANT_WATCH', '1') != '0' and registry.snapshot is None:
+        DataWatcher(registry, on_publish=PUBLISH_HOOKS).start()
     app.run(debug=False, port=8052)
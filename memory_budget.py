@@ -0,0 +1,173 @@
+"""Valorant Memory Budget File
+
+This python module contains a harness that measures how much memory each in-memory structure of the app keeps
+alive (the nested dicts returned by read_game and read_buy_type, the game and eco trees, the agent combinations, the
+map-agent data and the weighted graph), using tracemalloc, on the real data and on synthetic data (see synthetic.py).
+
+Each structure has a budget of bytes per csv row it was loaded from. The doctest of measure_synthetic fails when a
+structure goes over its budget, and running this file prints the measurements of both datasets and exits with an
+error status if any of them is over budget.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Callable
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from benchmark import working_directory
+from registry import DataRegistry
+from synthetic import generate_dataset
+
+# the maximum number of bytes kept alive per csv row, for each structure
+BUDGETS = {
+    'game_data': 800,
+    'eco_data': 150,
+    'vct_tree': 700,
+    'eco_tree': 150,
+    'agent_combos': 700,
+    'map_ref': 25,
+    'map_agent_graph': 25
+}
+
+
+def retained_bytes(build: Callable[[], Any]) -> int:
+    """Return the number of bytes allocated by build() that are still allocated after it returns.
+
+    Preconditions:
+        - tracemalloc.is_tracing()
+
+    >>> tracemalloc.start()
+    >>> kept = []
+    >>> retained_bytes(lambda: kept.append(bytes(10000))) >= 10000
+    True
+    >>> tracemalloc.stop()
+    """
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    build()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def _rows(paths: list[str]) -> int:
+    """Return the number of rows (not counting the headers) of the csv files at paths."""
+    total = 0
+    for path in paths:
+        with open(path) as file:
+            total += sum(1 for line in file if line.strip()) - 1
+    return total
+
+
+def measure_registry(registry: DataRegistry) -> dict[str, dict[str, float]]:
+    """
+    Return the bytes kept alive by each structure of registry and the number of csv rows it was loaded from, in the
+    format {structure: {'bytes': bytes, 'rows': rows, 'bytes_per_row': bytes_per_row}}
+
+    Every structure is loaded into registry, in an order where each one only counts the memory it adds to the ones
+    it is built from. The columnar caches that map_ref is read from are written and opened before measuring, since
+    they are memory-mapped files rather than memory kept alive by a structure.
+    """
+    game_rows = _rows([registry.game_path(year) for year in registry.years])
+    eco_rows = _rows([registry.eco_path(year) for year in registry.eco_years])
+    combo_rows = _rows([registry.graph_path('all_agents.csv')])
+    map_rows = _rows([path for dataset in ('agents_pick_rates', 'teams_picked_agents')
+                      for _, path in registry.columnar_sources(dataset)])
+    structures = [
+        ('game_data', game_rows, lambda: [registry.game_data(year) for year in registry.years]),
+        ('eco_data', eco_rows, lambda: [registry.eco_data(year) for year in registry.eco_years]),
+        ('vct_tree', game_rows, registry.vct_tree),
+        ('eco_tree', eco_rows, registry.eco_tree),
+        ('agent_combos', combo_rows, registry.agent_combos),
+        ('map_ref', map_rows, registry.map_ref),
+        ('map_agent_graph', map_rows, registry.map_agent_graph)
+    ]
+
+    for dataset in ('agents_pick_rates', 'teams_picked_agents'):
+        registry.columnar(dataset)
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        results = {}
+        for name, rows, build in structures:
+            size = retained_bytes(build)
+            results[name] = {'bytes': size, 'rows': rows, 'bytes_per_row': round(size / max(rows, 1), 1)}
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return results
+
+
+def measure_real(graph_dir: str = 'graph_data', tree_dir: str = 'tree_data') -> dict[str, dict[str, float]]:
+    """Return the measurements of measure_registry on the real data, for the years with both csv files."""
+    registry = DataRegistry(graph_dir, tree_dir)
+    return measure_registry(DataRegistry(graph_dir, tree_dir, registry.eco_years))
+
+
+def measure_synthetic(scale: float = 1.0, seed: int = 0) -> dict[str, dict[str, float]]:
+    """
+    Return the measurements of measure_registry on a synthetic dataset of the given scale
+
+    >>> over_budget(measure_synthetic(0.1))
+    []
+    """
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_dataset(data_dir, scale, seed)
+        with working_directory(data_dir):  # the cleaned agent files are written to the working directory
+            return measure_registry(DataRegistry(os.path.join(data_dir, 'graph_data'),
+                                                 os.path.join(data_dir, 'tree_data')))
+
+
+def over_budget(results: dict[str, dict[str, float]], budgets: dict[str, int] = None) -> list[str]:
+    """
+    Return a message for each structure in results that keeps more bytes per row alive than its budget
+
+    >>> over_budget({'vct_tree': {'bytes': 5000, 'rows': 2, 'bytes_per_row': 2500.0}})
+    ['vct_tree: 2500.0 bytes per row (budget 700)']
+    """
+    budgets = BUDGETS if budgets is None else budgets
+    return [f'{name}: {m["bytes_per_row"]} bytes per row (budget {budgets[name]})'
+            for name, m in results.items() if name in budgets and m['bytes_per_row'] > budgets[name]]
+
+
+def format_results(title: str, results: dict[str, dict[str, float]]) -> str:
+    """Return the measurements in results as a table."""
+    lines = [title, f'{"structure":<18}{"rows":>10}{"KiB":>12}{"bytes/row":>12}{"budget":>10}']
+    for name, m in results.items():
+        lines.append(f'{name:<18}{m["rows"]:>10}{m["bytes"] / 1024:>12.1f}{m["bytes_per_row"]:>12.1f}'
+                     f'{BUDGETS.get(name, 0):>10}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    parser = argparse.ArgumentParser(description='Measure the memory kept alive by each in-memory structure.')
+    parser.add_argument('--scale', type=float, default=1.0, help='scale of the synthetic dataset')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failures = []
+    for dataset, measurements in (('real data', measure_real()),
+                                  (f'synthetic data (scale {args.scale})', measure_synthetic(args.scale, args.seed))):
+        print(format_results(dataset, measurements) + '\n')
+        failures.extend(f'{dataset}: {message}' for message in over_budget(measurements))
+    print('\n'.join(failures) or 'every structure is within its budget')
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['argparse', 'gc', 'os', 'sys', 'tempfile', 'tracemalloc', 'benchmark', 'registry',
+                          'synthetic'],
+        'allowed-io': ['_rows'],
+        'max-nested-blocks': 5
+    })
+    sys.exit(1 if failures else 0)
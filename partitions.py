@@ -0,0 +1,169 @@
+"""Valorant Agent Partitions File
+
+This python module contains a pre-indexed version of the map-agent data of load_map_agent_data that keeps the
+Tournament, Stage and Match Type columns of the agent pick files as partition keys. The sums behind each map-agent
+weight (sum and count of the pick rates, total wins and total maps played) are stored once per partition, as one
+NumPy array with one row per partition, so the map-agent data of any selection of tournaments, stages and match types
+is computed by adding up the rows of the selected partitions instead of rescanning the pick files.
+
+The partitions are read from the columnar caches of the agents_pick_rates and teams_picked_agents datasets (see
+columnar.py), which already keep these columns.
+
+Next to the rows of each stage and match type, the pick files have aggregate rows of each tournament (with the stage
+AGGREGATE_STAGE and the match type AGGREGATE_MATCH_TYPE) that repeat the totals of the other rows. They are left out
+of the partitions, so that selecting a tournament does not count its maps twice, unless the tournament has no other
+rows in that file, in which case they stand in for them.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+
+from columnar import ColumnarTable
+from instrumentation import timed
+
+# the partition keys, in the order of the elements of AgentPartitions.keys
+PARTITION_COLUMNS = ('tournament', 'stage', 'match_type')
+# the partial sums stored for each partition, map and agent, in the order of the last axis of AgentPartitions.sums
+SUMS = ('sum_pick_rate', 'count_pick_rate', 'total_wins', 'total_played')
+# the stage and match type of the aggregate rows of each tournament
+AGGREGATE_STAGE = 'All Stages'
+AGGREGATE_MATCH_TYPE = 'All Match Types'
+
+
+def detail_rows(tournament: np.ndarray, stage: np.ndarray, match_type: np.ndarray) -> np.ndarray:
+    """
+    Return whether each row with the given tournament, stage and match type is kept in the partitions: every row that
+    is not an aggregate row, and the aggregate rows of the tournaments that have no other rows
+
+    >>> detail_rows(np.array(['A', 'A', 'A', 'B']), np.array(['All Stages', 'Playoffs', 'Groups', 'All Stages']),
+    ...             np.array(['All Match Types', 'Final', 'Opening', 'All Match Types'])).tolist()
+    [False, True, True, True]
+    """
+    aggregate = (stage == AGGREGATE_STAGE) | (match_type == AGGREGATE_MATCH_TYPE)
+    detailed = np.isin(tournament, np.unique(tournament[~aggregate]))
+    return ~aggregate | ~detailed
+
+
+class AgentPartitions:
+    """The partial sums of the map-agent data for each (tournament, stage, match type) partition.
+
+    Instance Attributes:
+        - keys: the (tournament, stage, match_type) of each partition, in the order of the rows of self.sums
+        - maps: the maps, in the order of the second axis of self.sums
+        - agents: the agents, in the order of the third axis of self.sums
+        - roles: the role of each agent, in the same order
+        - sums: the partial sums of each partition, map and agent (see SUMS), with shape
+          (len(self.keys), len(self.maps), len(self.agents), len(SUMS))
+        - first_rows: the first row of the pick rates file where each map and agent appear, used to list the maps
+          and agents in the same order as load_map_agent_data
+
+    Representation Invariants:
+        - self.sums.shape == (len(self.keys), len(self.maps), len(self.agents), len(SUMS))
+
+    >>> from registry import DataRegistry
+    >>> partitions = DataRegistry().agent_partitions()
+    >>> def played(ref: dict) -> int:
+    ...     return sum(agent_ref[3] for agents in ref.values() for agent_ref in agents.values())
+    >>> tokyo = ['Champions Tour 2023: Masters Tokyo']
+    >>> played(partitions.map_ref(tokyo)) == sum(played(partitions.map_ref(tokyo, [stage]))
+    ...                                         for stage in partitions.values('stage'))
+    True
+    >>> AGGREGATE_STAGE in partitions.values('stage')
+    False
+    """
+    keys: list[tuple[str, str, str]]
+    maps: list[str]
+    agents: list[str]
+    roles: list[str]
+    sums: np.ndarray
+    first_rows: np.ndarray
+
+    def __init__(self, picks: ColumnarTable, teams: ColumnarTable, agent_roles: dict) -> None:
+        """Initialize the partitions of the agents_pick_rates (picks) and teams_picked_agents (teams) caches."""
+        pick = picks.read(list(PARTITION_COLUMNS) + ['map', 'agent', 'pick_rate', 'row'])
+        pick_kept = (pick['map'] != 'all maps') & detail_rows(*[pick[c] for c in PARTITION_COLUMNS])
+        team = teams.read(list(PARTITION_COLUMNS) + ['map', 'agent', 'wins', 'played'])
+        team_kept = detail_rows(*[team[c] for c in PARTITION_COLUMNS])
+        team = {c: column[team_kept] for c, column in team.items()}
+
+        self.maps = sorted(set(pick['map'][pick_kept].tolist()))
+        self.agents = sorted(set(pick['agent'][pick_kept].tolist()))
+        self.roles = [agent_roles[a] for a in self.agents]
+        self.keys = sorted(set(zip(*[pick[c][pick_kept].tolist() for c in PARTITION_COLUMNS]))
+                           | set(zip(*[team[c].tolist() for c in PARTITION_COLUMNS])))
+        self.sums = np.zeros((len(self.keys), len(self.maps), len(self.agents), len(SUMS)))
+        self.first_rows = np.full((len(self.maps), len(self.agents)), np.iinfo(np.int64).max)
+
+        p, m, a = self._indexes({c: pick[c][pick_kept] for c in pick})
+        np.add.at(self.sums, (p, m, a, 0), pick['pick_rate'][pick_kept])
+        np.add.at(self.sums, (p, m, a, 1), 1)
+        np.minimum.at(self.first_rows, (m, a), pick['row'][pick_kept])
+
+        p, m, a = self._indexes(team)
+        matched = (m >= 0) & (a >= 0)
+        np.add.at(self.sums, (p[matched], m[matched], a[matched], 2), team['wins'][matched])
+        np.add.at(self.sums, (p[matched], m[matched], a[matched], 3), team['played'][matched])
+
+    def _indexes(self, columns: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the partition, map and agent index of each row of columns (-1 for unknown maps and agents)."""
+        key_ids = {key: i for i, key in enumerate(self.keys)}
+        map_ids = {m: i for i, m in enumerate(self.maps)}
+        agent_ids = {a: i for i, a in enumerate(self.agents)}
+        partitions = [key_ids[key] for key in zip(*[columns[c].tolist() for c in PARTITION_COLUMNS])]
+        return (np.array(partitions, dtype=np.int64),
+                np.array([map_ids.get(m, -1) for m in columns['map'].tolist()], dtype=np.int64),
+                np.array([agent_ids.get(a, -1) for a in columns['agent'].tolist()], dtype=np.int64))
+
+    def values(self, column: str) -> list[str]:
+        """Return the distinct values of the partition key column (see PARTITION_COLUMNS), in sorted order."""
+        position = PARTITION_COLUMNS.index(column)
+        return sorted({key[position] for key in self.keys})
+
+    def select(self, tournaments: Optional[list[str]] = None, stages: Optional[list[str]] = None,
+               match_types: Optional[list[str]] = None) -> np.ndarray:
+        """Return whether each partition is in the given tournaments, stages and match types (all if None or empty)."""
+        selected = np.ones(len(self.keys), dtype=bool)
+        for position, values in enumerate((tournaments, stages, match_types)):
+            if values:
+                selected &= np.array([key[position] in values for key in self.keys], dtype=bool)
+        return selected
+
+    def map_ref(self, tournaments: Optional[list[str]] = None, stages: Optional[list[str]] = None,
+                match_types: Optional[list[str]] = None) -> dict[str, dict[str, list]]:
+        """
+        Return the map-agent data of the given tournaments, stages and match types (every one of them if None or
+        empty), in the same format as graph.load_map_agent_data: {map_name: agent_ref}
+
+        Every map is a key, so a map with no picks in the selection has an empty agent_ref.
+        """
+        totals = self.sums[self.select(tournaments, stages, match_types)].sum(axis=0)
+        map_ref = {}
+        for index in np.argsort(self.first_rows, axis=None, kind='stable').tolist():
+            m, a = divmod(index, len(self.agents))
+            agent_ref = map_ref.setdefault(self.maps[m], {})
+            if totals[m, a, 1] > 0:
+                sum_rate, count, wins, played = totals[m, a].tolist()
+                agent_ref[self.agents[a]] = [sum_rate, int(count), int(wins), int(played), self.roles[a]]
+        return map_ref
+
+
+@timed('build.agent_partitions')
+def build_agent_partitions(picks: ColumnarTable, teams: ColumnarTable, agent_roles: dict) -> AgentPartitions:
+    """Return the partitions of the map-agent data (see AgentPartitions)."""
+    return AgentPartitions(picks, teams, agent_roles)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['numpy', 'columnar', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
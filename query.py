@@ -0,0 +1,175 @@
+"""Valorant Batch Query File
+
+This python module contains a command line tool that answers recommendation queries without the Dash app, for
+scripted analysis. The data is loaded once into a DataRegistry, then the queries are read from a file or stdin, one
+JSON object per line in the same format as the queries of the recommendation API (see api.py), e.g.
+    {"type": "best_side", "map": "ascent"}
+    {"type": "best_buy", "map": "ascent"}
+    {"type": "best_agents", "map": "lotus", "role": "duelists", "teammates": ["raze", "jett"]}
+    {"type": "compatible_agents", "agent": "omen", "limit": 3}
+
+The answers are written as they are computed, one JSON object per line in the order of the queries, so the output
+can be piped into another program while the queries are still being read. Empty lines are skipped, and a line that is
+not valid JSON or cannot be answered (e.g. because a data file is missing) gets an answer with an "error" key instead
+of stopping the batch.
+
+The answers come from the in-memory recommendation index of the registry (see api.RecommendationIndex), and the
+encoded answer of each distinct query line is kept, so a query that is repeated in a batch is only parsed, answered
+and encoded once. Run this file to answer a batch, e.g.
+    python query.py queries.jsonl > answers.jsonl
+    generate_queries | python query.py --flush | process_answers
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, Optional, TextIO
+import argparse
+import json
+import sys
+import time
+
+from api import RecommendationIndex, answer_query, recommendation_index
+from database import ensure_database
+from registry import DataRegistry
+from snapshot import ensure_snapshot
+
+CACHE_SIZE = 100000
+
+
+def answer_lines(index: Optional[RecommendationIndex], lines: Iterable[str],
+                 cache_size: int = CACHE_SIZE) -> Iterator[str]:
+    """
+    Return an iterator over the encoded answers (see api.answer_query) to the queries in lines, one JSON object per
+    line, skipping the empty lines
+
+    The answers of the first cache_size distinct lines are kept, and reused when the same line appears again.
+
+    >>> list(answer_lines(None, ['[1]', '', 'best_side ascent']))
+    ['{"error":"each query must be an object"}', '{"error":"invalid JSON"}']
+    >>> list(answer_lines(None, ['{"type": "best_agents", "map": "lotus", "teammates": 5}']))
+    ['{"type":"best_agents","error":"teammates must be a list of strings"}']
+
+    A query that raises a TypeError, ValueError or KeyError while it is answered gets an error, and the batch goes on:
+
+    >>> class OneMap:
+    ...     def best_side(self, map_played: str) -> dict:
+    ...         if map_played != 'lotus':
+    ...             raise ValueError('no rounds')
+    ...         return {'attack_rounds': 7}
+    >>> lines = ['{"type": "best_side", "map": "ascent"}', '{"type": "best_side", "map": "lotus"}']
+    >>> for answer in answer_lines(OneMap(), lines):
+    ...     print(answer)
+    {"type":"best_side","error":"invalid query: ValueError('no rounds')"}
+    {"type":"best_side","map":"lotus","attack_rounds":7}
+    """
+    answers = {}
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        answer = answers.get(line)
+        if answer is None:
+            try:
+                query = json.loads(line)
+            except ValueError:
+                answer = encoder.encode({'error': 'invalid JSON'})
+            else:
+                try:
+                    answer = encoder.encode(answer_query(index, query))
+                except OSError as error:
+                    answer = encoder.encode({'type': query.get('type'), 'error': f'missing data file {error.filename}'})
+                except (TypeError, ValueError, KeyError) as error:
+                    answer = encoder.encode({'type': query.get('type'), 'error': f'invalid query: {error!r}'})
+            if len(answers) < cache_size:
+                answers[line] = answer
+        yield answer
+
+
+def run_batch(registry: DataRegistry, queries: TextIO, output: TextIO, flush: bool = False) -> int:
+    """
+    Write the answers to the queries read from queries to output, one per line, flushing output after each answer
+    if flush is True, and return the number of answers written
+    """
+    count = 0
+    write = output.write
+    for answer in answer_lines(recommendation_index(registry), queries):
+        write(answer + '\n')
+        if flush:
+            output.flush()
+        count += 1
+    output.flush()
+    return count
+
+
+def load_registry(graph_dir: str, tree_dir: str, snapshot_dir: str = '', database: str = '') -> DataRegistry:
+    """
+    Return a registry of the data in graph_dir and tree_dir, answering from the snapshot in snapshot_dir (see
+    snapshot.py) or the SQLite database file database (see database.py) if one of them is not empty
+    """
+    registry = DataRegistry(graph_dir, tree_dir)
+    if snapshot_dir:
+        registry.use_snapshot(ensure_snapshot(registry, snapshot_dir))
+    elif database:
+        registry.use_snapshot(ensure_database(registry, database))
+    return registry
+
+
+def prepare_index(registry: DataRegistry) -> RecommendationIndex:
+    """
+    Return the recommendation index of registry, with the side and buy type totals of every map already computed, so
+    that the time taken to build them is not spent while the queries are being answered
+    """
+    index = recommendation_index(registry)
+    for map_played in index.maps():
+        try:
+            index.best_side(map_played)
+            index.best_buy(map_played)
+        except (OSError, KeyError):
+            pass  # the queries that need the missing file or map are answered with an error
+    return index
+
+
+def _parse_args() -> Any:
+    """Return the command line arguments of this module."""
+    parser = argparse.ArgumentParser(description='Answer recommendation queries (one JSON object per line) as JSON '
+                                                 'lines, without the Dash app.')
+    parser.add_argument('queries', nargs='?', default='-', help='file of queries (default: stdin)')
+    parser.add_argument('--output', default='-', help='file to write the answers to (default: stdout)')
+    parser.add_argument('--graph-dir', default='graph_data')
+    parser.add_argument('--tree-dir', default='tree_data')
+    parser.add_argument('--snapshot-dir', default='', help='answer from the snapshot in this directory')
+    parser.add_argument('--database', default='', help='answer from this SQLite database file')
+    parser.add_argument('--flush', action='store_true', help='flush the output after every answer')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    args = _parse_args()
+    start = time.perf_counter()
+    batch_registry = load_registry(args.graph_dir, args.tree_dir, args.snapshot_dir, args.database)
+    prepare_index(batch_registry)
+    loaded = time.perf_counter()
+    in_file = sys.stdin if args.queries == '-' else open(args.queries, encoding='utf-8')
+    out_file = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        answered = run_batch(batch_registry, in_file, out_file, args.flush)
+    finally:
+        for file in (in_file, out_file):
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+    elapsed = time.perf_counter() - loaded
+    print(f'loaded the data in {loaded - start:.2f}s, answered {answered} queries in {elapsed:.2f}s '
+          f'({answered / elapsed if elapsed else 0:.0f} per second)', file=sys.stderr)
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['argparse', 'json', 'sys', 'time', 'api', 'database', 'registry', 'snapshot'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,241 @@
+"""Valorant Team Ratings File
+
+This python module contains an Elo rating engine over the map results of the maps_scores files. The results are
+processed as a stream in the order they were played, and the ratings are kept in NumPy arrays indexed by team id: one
+overall rating per team and one rating per team and map. New rows appended to a maps_scores file are processed
+incrementally, without replaying the rows that were already processed.
+
+The maps_scores files have no dates. They list the tournaments of a year from the most recent to the oldest, and the
+maps of each tournament in the order they were played, so the results of a file are processed tournament by
+tournament from the last one to the first (see chronological), and rows appended later are processed as the newest
+results. A snapshot of the ratings is stored at the end of every tournament and of every year, so that the
+rating of a team "as of" a tournament or a year can be answered after the whole history has been processed.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Iterable, Optional
+import csv
+
+import numpy as np
+
+from instrumentation import timed
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+# the columns of the maps_scores files that are used
+TOURNAMENT, MAP, TEAM_A, SCORE_A, TEAM_B, SCORE_B = 0, 4, 5, 6, 10, 11
+
+
+class RatingEngine:
+    """An Elo rating engine over a stream of map results.
+
+    Instance Attributes:
+        - teams: the teams, in the order of their ids
+        - maps: the maps (lowercased), in the order of their ids
+        - ratings: the overall rating of each team
+        - map_ratings: the rating of each team on each map, with one row per team and one column per map
+        - snapshots: the labels of the stored snapshots (a year, or a year and a tournament as 'year/tournament'),
+          in the order they were stored
+        - processed: the number of rows of each file that have been processed, in the format {path: rows}
+
+    Representation Invariants:
+        - len(self.ratings) >= len(self.teams)
+        - self.map_ratings.shape[0] == len(self.ratings)
+    """
+    teams: list[str]
+    maps: list[str]
+    ratings: np.ndarray
+    map_ratings: np.ndarray
+    snapshots: list[str]
+    processed: dict[str, int]
+    # Private Instance Attributes:
+    #     - _team_ids: maps each (lowercased) team to its id
+    #     - _map_ids: maps each (lowercased) map to its id
+    #     - _saved: maps each snapshot label to a copy of (ratings, map_ratings) when it was stored
+    #     - _current: the (year, tournament) of the last processed result
+    _team_ids: dict[str, int]
+    _map_ids: dict[str, int]
+    _saved: dict[str, tuple[np.ndarray, np.ndarray]]
+    _current: tuple[str, str]
+
+    def __init__(self, capacity: int = 64) -> None:
+        """Initialize an engine with no results, with room for capacity teams before its arrays are grown."""
+        self.teams = []
+        self.maps = []
+        self.ratings = np.full(capacity, INITIAL_RATING)
+        self.map_ratings = np.full((capacity, 16), INITIAL_RATING)
+        self.snapshots = []
+        self.processed = {}
+        self._team_ids = {}
+        self._map_ids = {}
+        self._saved = {}
+        self._current = ('', '')
+
+    def _team_id(self, team: str) -> int:
+        """Return the id of team, giving it the next id (and growing the arrays if needed) if it has none yet."""
+        key = team.lower()
+        if key not in self._team_ids:
+            if len(self.teams) == len(self.ratings):
+                self.ratings = np.concatenate([self.ratings, np.full(len(self.ratings), INITIAL_RATING)])
+                self.map_ratings = np.vstack([self.map_ratings, np.full(self.map_ratings.shape, INITIAL_RATING)])
+            self._team_ids[key] = len(self.teams)
+            self.teams.append(team)
+        return self._team_ids[key]
+
+    def _map_id(self, map_played: str) -> int:
+        """Return the id of map_played, giving it the next id (and growing the arrays if needed) if it has none yet."""
+        key = map_played.lower()
+        if key not in self._map_ids:
+            if len(self.maps) == self.map_ratings.shape[1]:
+                self.map_ratings = np.hstack([self.map_ratings, np.full(self.map_ratings.shape, INITIAL_RATING)])
+            self._map_ids[key] = len(self.maps)
+            self.maps.append(key)
+        return self._map_ids[key]
+
+    def process(self, year: str, rows: Iterable[list[str]]) -> int:
+        """
+        Update the ratings with the map result of each of the given maps_scores rows (without headers) of year, in
+        order, and return the number of results processed. Rows without two scores are skipped.
+
+        >>> engine = RatingEngine()
+        >>> engine.process('2021', [['VCT', '', '', 'A vs B', 'Haven', 'A', '13', '', '', '', 'B', '5']])
+        1
+        >>> engine.rating('A'), engine.rating('B'), engine.rating('A', 'haven')
+        (1516.0, 1484.0, 1516.0)
+        """
+        count = 0
+        for row in rows:
+            if len(row) <= SCORE_B or not row[SCORE_A].isdigit() or not row[SCORE_B].isdigit():
+                continue
+            if (year, row[TOURNAMENT]) != self._current:
+                self._finish_tournament(year)
+                self._current = (year, row[TOURNAMENT])
+            a, b, m = self._team_id(row[TEAM_A]), self._team_id(row[TEAM_B]), self._map_id(row[MAP])
+            score = 1.0 if int(row[SCORE_A]) > int(row[SCORE_B]) else 0.0 if row[SCORE_A] != row[SCORE_B] else 0.5
+            _update(self.ratings, a, b, score)
+            _update(self.map_ratings[:, m], a, b, score)
+            count += 1
+        return count
+
+    def _finish_tournament(self, next_year: str) -> None:
+        """Store the snapshots of the tournament (and of the year, if next_year is another year) just processed."""
+        year, tournament = self._current
+        if tournament:
+            self._save(f'{year}/{tournament}')
+            if next_year != year:
+                self._save(year)
+
+    def _save(self, label: str) -> None:
+        """Store a copy of the current ratings as the snapshot called label."""
+        if label not in self._saved:
+            self.snapshots.append(label)
+        self._saved[label] = (self.ratings[:len(self.teams)].copy(), self.map_ratings[:len(self.teams)].copy())
+
+    def finish(self) -> None:
+        """Store the snapshots of the last tournament and year processed, so that they can be asked for."""
+        year, tournament = self._current
+        if tournament:
+            self._save(f'{year}/{tournament}')
+            self._save(year)
+
+    def update_from_file(self, path: str, year: str) -> int:
+        """
+        Process the rows of the maps_scores file at path (of the given year) that have not been processed yet, and
+        return the number of results processed
+        """
+        with open(path, newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            rows = list(reader)
+        start = self.processed.get(path, 0)
+        self.processed[path] = len(rows)
+        count = self.process(year, chronological(rows) if start == 0 else rows[start:])
+        self.finish()
+        return count
+
+    def rating(self, team: str, map_played: Optional[str] = None, as_of: Optional[str] = None) -> float:
+        """
+        Return the rating of team (on map_played, if it is not None) as of the snapshot as_of (a year, or a year
+        and a tournament as 'year/tournament'), or as of the last result processed if as_of is None
+
+        Teams and maps are compared case-insensitively. Raise a KeyError if the team, the map or the snapshot is
+        unknown.
+        A team that had not played yet as of the snapshot has the initial rating.
+        """
+        team_id = self._team_ids[team.lower()]
+        if as_of is None:
+            ratings, map_ratings = self.ratings, self.map_ratings
+        else:
+            ratings, map_ratings = self._saved[as_of]
+            if team_id >= len(ratings):
+                return INITIAL_RATING
+        if map_played is None:
+            return round(float(ratings[team_id]), 2)
+        return round(float(map_ratings[team_id, self._map_ids[map_played.lower()]]), 2)
+
+    def top(self, n: int = 10, map_played: Optional[str] = None,
+            as_of: Optional[str] = None) -> list[tuple[str, float]]:
+        """
+        Return the n teams with the highest rating (on map_played, if it is not None) as of the snapshot as_of, in
+        descending order of rating, as (team, rating) tuples (see RatingEngine.rating)
+        """
+        ratings, map_ratings = (self.ratings[:len(self.teams)], self.map_ratings[:len(self.teams)]) \
+            if as_of is None else self._saved[as_of]
+        values = ratings if map_played is None else map_ratings[:, self._map_ids[map_played.lower()]]
+        best = np.argsort(-values, kind='stable')[:n]
+        return [(self.teams[i], round(float(values[i]), 2)) for i in best]
+
+
+def chronological(rows: list[list[str]]) -> list[list[str]]:
+    """
+    Return the rows of a maps_scores file (without its header) in the order they were played: the blocks of rows of
+    each tournament in reverse order, keeping the order of the rows of each tournament
+
+    >>> [r[0] + r[1] for r in chronological([['B', '1'], ['B', '2'], ['A', '1'], ['A', '2']])]
+    ['A1', 'A2', 'B1', 'B2']
+    """
+    blocks = []
+    for row in (r for r in rows if r):
+        if not blocks or blocks[-1][0][TOURNAMENT] != row[TOURNAMENT]:
+            blocks.append([])
+        blocks[-1].append(row)
+    return [row for block in reversed(blocks) for row in block]
+
+
+def _update(ratings: np.ndarray, a: int, b: int, score: float) -> None:
+    """
+    Update the ratings of a and b in place after a result where a scored score (1 for a win, 0.5 for a draw and 0
+    for a loss) against b
+
+    >>> r = np.array([1500.0, 1500.0])
+    >>> _update(r, 0, 1, 1.0)
+    >>> r
+    array([1516., 1484.])
+    """
+    expected = 1.0 / (1.0 + 10.0 ** ((ratings[b] - ratings[a]) / 400.0))
+    change = K_FACTOR * (score - expected)
+    ratings[a] += change
+    ratings[b] -= change
+
+
+@timed('build.ratings')
+def load_ratings(paths_by_year: dict[str, str]) -> RatingEngine:
+    """Return a rating engine that has processed the maps_scores files in paths_by_year, in the format {year: path}."""
+    engine = RatingEngine()
+    for year, path in paths_by_year.items():
+        engine.update_from_file(path, year)
+    return engine
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['csv', 'numpy', 'instrumentation'],
+        'allowed-io': ['RatingEngine.update_from_file'],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,526 @@
+"""Valorant Data Registry File
+
+This python module contains a registry of every dataset and derived structure (trees and graphs) used by the app.
+Nothing is read when this module is imported or when a registry is created: each dataset is loaded the first time
+it is asked for, exactly once even if several threads ask for it at the same time, and then kept in memory.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, TYPE_CHECKING
+import logging
+import os
+import re
+import threading
+
+from graph import (WeightedGraph, clean_all_agents_file, load_agent_role_data, load_agent_combo_data,
+                   generate_weighted_graph)
+from tree import Tree, read_game, read_buy_type, generate_tree
+from figure_store import data_version
+from eco_cube import EcoCube, load_eco_cube
+from loadout import Loadouts, load_loadouts
+from ratings import RatingEngine, load_ratings
+from itemsets import AgentSets, mine_agent_sets
+from similarity import AgentSimilarity, build_agent_similarity
+from side_bias import columnar_side_rounds, side_intervals
+from columnar import ColumnarTable, ensure_dataset, load_map_agent_data
+from durations import MatchDurations, load_match_durations
+from partitions import AgentPartitions, build_agent_partitions
+from decay import DecayedMapRef, load_decayed_map_ref
+from composition import CompOptimizer, build_comp_optimizer
+from analytics import GraphAnalytics, build_graph_analytics
+from sampling import GAME_SAMPLE_SIZE, ECO_SAMPLE_SIZE, sample_matches
+
+if TYPE_CHECKING:
+    from snapshot import Snapshot
+    from database import Database
+
+# the number of tournament and stage selections whose graph and time-decayed data are kept (see RecentCache)
+RECENT_SELECTIONS = 16
+LOGGER = logging.getLogger(__name__)
+
+
+def discover_years(directory: str, pattern: str) -> tuple[str, ...]:
+    """
+    Return the years of the files in directory whose name matches pattern (a regular expression whose first group
+    is the year), in increasing order, or an empty tuple if directory does not exist
+
+    >>> discover_years('tree_data', r'maps_scores_(\\d{4})\\.csv')
+    ('2021', '2022', '2023')
+    """
+    if not os.path.isdir(directory):
+        return ()
+    return tuple(sorted({match.group(1) for match in map(re.compile(pattern).fullmatch, os.listdir(directory))
+                         if match}))
+
+
+class RecentCache:
+    """A thread-safe cache of the values of the most recently used keys, for values that depend on user input.
+
+    Instance Attributes:
+        - size: the largest number of values kept
+
+    Representation Invariants:
+        - len(self._values) <= self.size
+    """
+    size: int
+    # Private Instance Attributes:
+    #     - _values: maps each key kept to its value, from the least to the most recently used
+    #     - _lock: protects _values
+    _values: OrderedDict[Hashable, Any]
+    _lock: threading.Lock
+
+    def __init__(self, size: int = RECENT_SELECTIONS) -> None:
+        """Initialize an empty cache of at most size values."""
+        self.size = size
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """
+        Return the value of key, calling build() to compute it if it is not kept, and dropping the least recently used
+        value if there are more than self.size
+
+        >>> cache = RecentCache(2)
+        >>> [cache.get(key, lambda k=key: k * 10) for key in (1, 2, 1, 3)]
+        [10, 20, 10, 30]
+        >>> list(cache._values)
+        [1, 3]
+        """
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+        value = build()
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.size:
+                self._values.popitem(last=False)
+        return value
+
+
+class DataRegistry:
+    """A registry of lazily loaded datasets and derived structures.
+
+    Instance Attributes:
+        - graph_dir: the directory containing the agent csv files
+        - tree_dir: the directory containing the maps_scores and eco_data csv files
+        - years: the years of tournament data in tree_dir
+        - eco_years: the years in years with an eco_data file in tree_dir (the other years only have a sample of
+          their eco data, see eco_sample)
+        - pick_years: the years of agent pick data in graph_dir
+        - columnar_dir: the directory that the columnar caches of the csv datasets are written to (see columnar.py)
+        - snapshot: the memory-mapped snapshot (see snapshot.py) or SQLite database (see database.py) that the derived
+          datasets are read from instead of the csv files, or None if they are read from the csv files
+
+    Representation Invariants:
+        - all(name in self._locks for name in self._values)
+    """
+    graph_dir: str
+    tree_dir: str
+    years: tuple[str, ...]
+    eco_years: tuple[str, ...]
+    pick_years: tuple[str, ...]
+    columnar_dir: str
+    snapshot: Optional[Snapshot | Database]
+    # Private Instance Attributes:
+    #     - _values: maps the name of each dataset that has been loaded so far to its value
+    #     - _locks: one lock per dataset name, held while that dataset is being loaded
+    #     - _locks_lock: protects _locks
+    #     - _version: the data version of the files in this registry, or None if it has not been computed yet
+    _values: dict[str, Any]
+    _locks: dict[str, threading.Lock]
+    _locks_lock: threading.Lock
+    _version: Optional[str]
+
+    def __init__(self, graph_dir: str = 'graph_data', tree_dir: str = 'tree_data',
+                 years: Optional[tuple[str, ...]] = None, columnar_dir: str = 'columnar_cache') -> None:
+        """Initialize a registry of the data in graph_dir and tree_dir, without loading anything.
+
+        If years is None, the years are those of the maps_scores files in tree_dir. The years of agent pick data are
+        those with both an agents_pick_rates and a teams_picked_agents file in graph_dir.
+
+        Only the years of eco_years are in the eco datasets (eco_tree, eco_cube, loadouts and the answers built from
+        them): an eco_data_<year>_sample.csv file holds only a few matches, so it is only shown in the eco tree.
+
+        >>> r = DataRegistry()
+        >>> r.loaded()
+        []
+        """
+        self.graph_dir = graph_dir
+        self.tree_dir = tree_dir
+        self.years = discover_years(tree_dir, r'maps_scores_(\d{4})\.csv') if years is None else years
+        self.eco_years = tuple(year for year in self.years if os.path.exists(self.eco_path(year)))
+        picks = discover_years(graph_dir, r'agents_pick_rates(\d{4})\.csv')
+        self.pick_years = tuple(year for year in picks
+                                if os.path.exists(self.graph_path(f'teams_picked_agents{year}.csv')))
+        self.columnar_dir = columnar_dir
+        self.snapshot = None
+        self._values = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._version = None
+
+    def loaded(self) -> list[str]:
+        """Return the names of the datasets that have been loaded so far, in the order they were loaded."""
+        return list(self._values)
+
+    def _get(self, name: str, build: Callable[[], Any]) -> Any:
+        """Return the dataset called name, calling build() to load it if it has not been loaded yet."""
+        if name in self._values:
+            return self._values[name]
+
+        with self._locks_lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+
+        with lock:
+            if name not in self._values:  # another thread may have loaded it while we were waiting
+                self._values[name] = build()
+        return self._values[name]
+
+    def cached(self, name: str, build: Callable[[], Any]) -> Any:
+        """
+        Return the derived structure called name, calling build() to compute it the first time it is asked for
+
+        This lets other modules keep structures computed from the datasets of this registry (e.g. indexes) for as long
+        as the data does not change: they are dropped together with the datasets when a new snapshot is used.
+        """
+        return self._get(name, build)
+
+    # ---------------------------------------------- FILE PATHS ---------------------------------------------------- #
+    def graph_path(self, file_name: str) -> str:
+        """Return the path of file_name in self.graph_dir."""
+        return os.path.join(self.graph_dir, file_name)
+
+    def game_path(self, year: str) -> str:
+        """Return the path of the maps_scores file of the given year.
+
+        >>> DataRegistry().game_path('2021')
+        'tree_data/maps_scores_2021.csv'
+        """
+        return os.path.join(self.tree_dir, f'maps_scores_{year}.csv')
+
+    def eco_path(self, year: str) -> str:
+        """Return the path of the eco_data file of the given year.
+
+        >>> DataRegistry().eco_path('2023')
+        'tree_data/eco_data_2023.csv'
+        """
+        return os.path.join(self.tree_dir, f'eco_data_{year}.csv')
+
+    def eco_sample_path(self, year: str) -> str:
+        """Return the path of the file with a sample of the eco data of the given year, for a year not in eco_years.
+
+        >>> DataRegistry().eco_sample_path('2023')
+        'tree_data/eco_data_2023_sample.csv'
+        """
+        return os.path.join(self.tree_dir, f'eco_data_{year}_sample.csv')
+
+    def source_paths(self) -> list[str]:
+        """Return the paths of every file that the datasets in this registry are loaded from."""
+        paths = [self.graph_path(name) for name in ('all_agents.csv', 'agent_roles.csv')]
+        for dataset in ('agents_pick_rates', 'teams_picked_agents'):
+            paths.extend(path for _, path in self.columnar_sources(dataset))
+        for year in self.years:
+            paths.extend([self.game_path(year), self.eco_path(year) if year in self.eco_years
+                          else self.eco_sample_path(year)])
+        return paths
+
+    def data_version(self) -> str:
+        """Return the data version of the files in this registry (see figure_store.data_version)."""
+        if self._version is None:
+            self._version = data_version(self.source_paths())
+        return self._version
+
+    def columnar_sources(self, dataset: str) -> list[tuple[str, str]]:
+        """Return the csv files of the given columnar dataset (see columnar.DATASETS), in the format [(year, path)]."""
+        if dataset == 'maps_scores':
+            return [(year, self.game_path(year)) for year in self.years]
+        elif dataset == 'eco_data':
+            return [(year, self.eco_path(year)) for year in self.eco_years]
+        return [(year, self.graph_path(f'{dataset}{year}.csv')) for year in self.pick_years]
+
+    def columnar(self, dataset: str) -> ColumnarTable:
+        """Return the memory-mapped columnar cache of dataset, writing it first if needed (see columnar.py)."""
+        return self._get(f'columnar_{dataset}', lambda: ensure_dataset(dataset, self.columnar_sources(dataset),
+                                                                       self.columnar_dir, self.data_version()))
+
+    def use_snapshot(self, snapshot: Snapshot | Database) -> None:
+        """
+        Read the derived datasets of this registry from snapshot from now on, dropping every dataset loaded so far
+
+        Callers that are still using a dataset loaded before this call keep a consistent (old) copy of it.
+        """
+        self.snapshot = snapshot
+        self._values = {}
+        self._version = snapshot.version  # assigned last, see DataRegistry.publish
+
+    def publish(self, other: DataRegistry) -> None:
+        """
+        Make this registry serve the files, years and datasets of other from now on, replacing the datasets loaded so
+        far (see watcher.py)
+
+        The datasets of other are swapped in with one assignment, so a caller sees either every dataset of the old
+        data version or every dataset of the new one. Callers that are still using a dataset loaded before this call
+        keep a consistent (old) copy of it.
+
+        The data version is assigned last: a caller that reads the old version may still get a dataset of the new one
+        (and cache a result under the old version, which is never asked for again), but a caller that reads the new
+        version always gets the datasets of the new one.
+        """
+        version = other.data_version()
+        self.snapshot = other.snapshot
+        self._values = other._values
+        self.years, self.eco_years, self.pick_years = other.years, other.eco_years, other.pick_years
+        self._version = version
+
+    def reuse(self, other: DataRegistry, names: list[str]) -> None:
+        """Reuse the datasets called names that are loaded in other (read from the same files) in this registry."""
+        if other.snapshot is None:
+            loaded = dict(other._values)
+            self._values.update((name, loaded[name]) for name in names if name in loaded)
+
+    # ------------------------------------------- GRAPH DATASETS --------------------------------------------------- #
+    def agent_roles(self) -> dict[str, str]:
+        """Return the agent roles in the format {agent_name: role} (see graph.load_agent_role_data)."""
+        return self._get('agent_roles', lambda: load_agent_role_data(self.graph_path('agent_roles.csv')))
+
+    def agent_combos(self) -> list[set]:
+        """Return the list of agent combinations (see graph.load_agent_combo_data)."""
+        if self.snapshot is not None:
+            return self._get('agent_combos', self.snapshot.agent_combos)
+        return self._get('agent_combos', lambda: load_agent_combo_data(
+            clean_all_agents_file(self.graph_path('all_agents.csv'))))
+
+    def map_ref(self) -> dict[str, dict[str, list]]:
+        """Return the map-agent data in the format {map_name: agent_ref} (see graph.load_map_agent_data)."""
+        if self.snapshot is not None:
+            return self._get('map_ref', self.snapshot.map_ref)
+        return self._get('map_ref', lambda: load_map_agent_data(
+            self.columnar('agents_pick_rates'), self.columnar('teams_picked_agents'), self.agent_roles()))
+
+    def agent_partitions(self) -> AgentPartitions:
+        """Return the map-agent data partitioned by tournament, stage and match type (see partitions.py)."""
+        return self._get('agent_partitions', lambda: build_agent_partitions(
+            self.columnar('agents_pick_rates'), self.columnar('teams_picked_agents'), self.agent_roles()))
+
+    def decayed_map_ref(self, tournaments: tuple[str, ...] = (), stages: tuple[str, ...] = ()) -> DecayedMapRef:
+        """
+        Return the time-decayed map-agent data of the given tournaments and stages (every one of them if empty), see
+        decay.py
+
+        Only the data of the RECENT_SELECTIONS most recently asked for selections are kept.
+        """
+        recent = self._get('recent_decayed_map_refs', RecentCache)
+        return recent.get((tournaments, stages), lambda: load_decayed_map_ref(
+            self.agent_partitions(), self.pick_years[-1] if self.pick_years else None, tournaments=list(tournaments),
+            stages=list(stages)))
+
+    def partition_map_ref(self, tournaments: tuple[str, ...] = (), stages: tuple[str, ...] = (),
+                          decayed: bool = False) -> dict[str, dict[str, list]]:
+        """
+        Return the map-agent data (see DataRegistry.map_ref) of the given tournaments and stages only (every one of
+        them if empty), with time-decayed sums if decayed is True
+        """
+        if decayed:
+            return self.decayed_map_ref(tournaments, stages).map_ref()
+        elif not tournaments and not stages:
+            return self.map_ref()
+        return self.agent_partitions().map_ref(list(tournaments), list(stages))
+
+    def partition_graph(self, tournaments: tuple[str, ...] = (), stages: tuple[str, ...] = (),
+                        decayed: bool = False) -> WeightedGraph:
+        """
+        Return the weighted graph of every map and agent (see DataRegistry.map_agent_graph) with the map-agent weights
+        of the given tournaments and stages only (every one of them if empty), time-decayed if decayed is True
+
+        Only the graphs of the RECENT_SELECTIONS most recently asked for selections are kept.
+        """
+        if not tournaments and not stages and not decayed:
+            return self.map_agent_graph()
+        recent = self._get('recent_partition_graphs', RecentCache)
+        return recent.get((tournaments, stages, decayed), lambda: generate_weighted_graph(
+            self.partition_map_ref(tournaments, stages, decayed), self.agent_combos(), view_agent_weights=True))
+
+    def agent_sets(self) -> AgentSets:
+        """Return the frequent agent sets of the agent combinations (see itemsets.py)."""
+        return self._get('agent_sets', lambda: mine_agent_sets(self.agent_combos()))
+
+    def agent_similarity(self) -> AgentSimilarity:
+        """Return the similarity of every pair of agents in the map-agent graph (see similarity.py)."""
+        return self._get('agent_similarity', lambda: build_agent_similarity(self.map_agent_graph(),
+                                                                            list(self.map_ref())))
+
+    def comp_optimizer(self) -> CompOptimizer:
+        """Return the five-agent composition solver over the map-agent graph (see composition.py)."""
+        return self._get('comp_optimizer', lambda: build_comp_optimizer(self.map_agent_graph(), list(self.map_ref())))
+
+    def graph_analytics(self) -> GraphAnalytics:
+        """Return the PageRank, communities and per-map centrality of the agents of the map-agent graph."""
+        return self._get('graph_analytics', lambda: build_graph_analytics(self.map_agent_graph(), list(self.map_ref())))
+
+    def map_agent_graph(self) -> WeightedGraph:
+        """Return the weighted graph of every map and agent, including the agent-agent edges."""
+        return self._get('map_agent_graph', lambda: generate_weighted_graph(
+            self.map_ref(), self.agent_combos(), view_agent_weights=True))
+
+    # -------------------------------------------- TREE DATASETS --------------------------------------------------- #
+    def game_data(self, year: str) -> tuple[str, list[dict]]:
+        """Return the attacker/defender scores of the given year (see tree.read_game)."""
+        return self._get(f'game_data_{year}', lambda: _read_file(self.game_path(year), read_game))
+
+    def eco_data(self, year: str) -> tuple[str, list[dict]]:
+        """Return the buy types of the given year (see tree.read_buy_type).
+
+        Preconditions:
+            - year in self.eco_years
+        """
+        return self._get(f'eco_data_{year}', lambda: _read_file(self.eco_path(year), read_buy_type))
+
+    def eco_sample_data(self, year: str) -> tuple[str, list[dict]]:
+        """Return the buy types in the eco sample file of the given year (see eco_sample_path)."""
+        return self._get(f'eco_sample_data_{year}', lambda: _read_file(self.eco_sample_path(year), read_buy_type))
+
+    def game_sample(self, year: str, size: int = GAME_SAMPLE_SIZE, strategy: str = 'first') -> list[dict]:
+        """Return a sample of the matches of game_data(year) to show in the game tree (see sampling.py)."""
+        return sample_matches(self.game_data(year)[1], size, strategy)
+
+    def eco_sample(self, year: str, size: int = ECO_SAMPLE_SIZE, strategy: str = 'first') -> list[dict]:
+        """Return a sample of the matches of eco_data(year) to show in the eco tree (see sampling.py).
+
+        A year that is not in self.eco_years is sampled from the matches of its eco sample file instead, and a year
+        without either file has no matches to show.
+        """
+        if year not in self.eco_years and not os.path.exists(self.eco_sample_path(year)):
+            return []
+        elif year not in self.eco_years:
+            return sample_matches(self.eco_sample_data(year)[1], size, strategy)
+        return sample_matches(self.eco_data(year)[1], size, strategy)
+
+    def vct_tree(self) -> Tree:
+        """Return the tree of attacker/defender scores of every year."""
+        def build() -> Tree:
+            t = Tree('VCT', [])
+            t.combine_all([generate_tree(self.game_data(year)) for year in self.years])
+            return t
+        return self._get('vct_tree', build)
+
+    def eco_tree(self) -> Tree:
+        """Return the tree of buy types of every year in self.eco_years."""
+        def build() -> Tree:
+            t = Tree('VCT buy types', [])
+            t.combine_all([generate_tree(self.eco_data(year)) for year in self.eco_years])
+            return t
+        return self._get('eco_tree', build)
+
+    def eco_cube(self) -> EcoCube:
+        """Return the aggregation cube of the eco rounds of every year in self.eco_years (see eco_cube.py)."""
+        return self._get('eco_cube', lambda: load_eco_cube({year: self.eco_path(year) for year in self.eco_years}))
+
+    def loadouts(self) -> Loadouts:
+        """Return the loadout values of every round of every year in self.eco_years (see loadout.py)."""
+        return self._get('loadouts', lambda: load_loadouts({year: self.eco_path(year) for year in self.eco_years}))
+
+    def ratings(self) -> RatingEngine:
+        """Return the team rating engine after processing the map results of every year (see ratings.py)."""
+        return self._get('ratings', lambda: load_ratings({year: self.game_path(year) for year in self.years}))
+
+    def match_durations(self) -> MatchDurations:
+        """Return the duration and overtime of every map played in every year (see durations.py)."""
+        return self._get('match_durations', lambda: load_match_durations(self.columnar('maps_scores')))
+
+    def side_intervals(self) -> dict[str, dict[str, dict[str, Any]]]:
+        """
+        Return the bootstrap confidence interval of the attacker round win rate of every map, per year and over every
+        year (see side_bias.side_intervals)
+
+        The resamples are computed in this process, or spread over a shared pool of VALORANT_BOOTSTRAP_WORKERS worker
+        processes if it is set to more than 1 (0 for one per CPU).
+        """
+        workers = int(os.environ.get('VALORANT_BOOTSTRAP_WORKERS', '1'))
+        return self._get('side_intervals', lambda: side_intervals(columnar_side_rounds(self.columnar('maps_scores')),
+                                                                  workers))
+
+    def side_totals_for_map(self, map_played: str) -> tuple[int, int]:
+        """Return the total Attacker and Defender rounds won on map_played (see Tree.side_totals_for_map)."""
+        if self.snapshot is not None:
+            return self.snapshot.side_totals_for_map(map_played)
+        return self.vct_tree().side_totals_for_map(map_played)
+
+    def buy_wins_for_map(self, map_played: str) -> dict[str, int]:
+        """Return the number of rounds won with each buy type on map_played (see Tree.buy_wins_for_map)."""
+        if self.snapshot is not None:
+            return self.snapshot.buy_wins_for_map(map_played)
+        return self.eco_cube().buy_wins_for_map(map_played)
+
+    def best_side_for_map(self, map_played: str) -> str:
+        """Return whether map_played is Attacker or Defender sided (see Tree.best_side_for_map)."""
+        if self.snapshot is not None:
+            return self.snapshot.best_side_for_map(map_played)
+        return self.vct_tree().best_side_for_map(map_played)
+
+    def best_buy_for_map(self, map_played: str) -> str:
+        """Return which buy type is most effective on map_played (see Tree.best_buy_for_map)."""
+        if self.snapshot is not None:
+            return self.snapshot.best_buy_for_map(map_played)
+        return self.eco_cube().best_buy_for_map(map_played)
+
+    # ---------------------------------------------- PREFETCHING --------------------------------------------------- #
+    def prefetch(self, accessors: Optional[list[Callable[[], Any]]] = None,
+                 extra: tuple[Callable[[], Any], ...] | list[Callable[[], Any]] = ()) -> threading.Thread:
+        """
+        Start and return a background thread that loads every dataset in this registry (or only the ones returned by
+        the given accessors), followed by the ones returned by the accessors in extra, so that they are already in
+        memory when they are first asked for.
+
+        A dataset that cannot be loaded (because a file is missing or malformed) is logged and skipped; the error is
+        raised again when it is asked for.
+        """
+        if accessors is None and self.snapshot is not None:
+            # the snapshot holds the map-agent data, the agent rankings and the tree totals, so this worker only parses
+            # the years shown in the tree visualizations to sample their matches (the graph is built on first use)
+            accessors = [lambda y=year: self.game_data(y) for year in self.years[-3:]]
+            accessors.extend(lambda y=year: self.eco_sample(y) for year in self.years[-3:])
+        elif accessors is None:
+            accessors = [self.map_agent_graph, self.vct_tree, self.eco_cube]
+            accessors.extend(lambda y=year: self.game_data(y) for year in self.years)
+            accessors.extend(lambda y=year: self.eco_data(y) for year in self.eco_years)
+            accessors.extend(lambda y=year: self.eco_sample(y) for year in self.years[-3:])
+
+        accessors = list(accessors) + list(extra)
+
+        def run() -> None:
+            for accessor in accessors:
+                try:
+                    accessor()
+                except (OSError, ValueError, KeyError, IndexError):  # raised again when the dataset is asked for
+                    LOGGER.warning('could not prefetch a dataset from %s and %s', self.graph_dir, self.tree_dir,
+                                   exc_info=True)
+
+        thread = threading.Thread(target=run, name='registry-prefetch', daemon=True)
+        thread.start()
+        return thread
+
+
+def _read_file(path: str, reader: Callable[[Any], Any]) -> Any:
+    """Return the result of calling reader on the file at path, closing the file afterwards."""
+    with open(path) as file:
+        return reader(file)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['collections', 'logging', 'os', 're', 'threading', 'graph', 'tree', 'figure_store',
+                          'eco_cube', 'loadout', 'ratings', 'itemsets', 'similarity', 'side_bias', 'columnar',
+                          'durations', 'partitions', 'sampling', 'composition',
+                          'analytics', 'decay'],
+        'allowed-io': ['_read_file'],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,144 @@
+"""Valorant Sampling File
+
+This python module contains the sampling layer that picks the matches shown in the tree visualizations straight from
+the full data of a year (as returned by tree.read_game and tree.read_buy_type), instead of reading them from separate
+_visual csv files. The whole data of a year is far too large to lay out as a tree, so only a sample of its matches is
+shown, and the size and strategy of the sample are chosen when the figure is asked for:
+    - 'first': the first matches of the year, in the order of the file
+    - 'by_map': matches picked in turn for each map (in the order the maps first appear), so that every map is shown
+    - 'top': the matches with the highest score (by default, the number of maps played, so the longest series)
+
+Whatever the strategy, the sampled matches are returned in the order of the file.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+
+STRATEGIES = ('first', 'by_map', 'top')
+# the default number of matches shown in the game tree and in the eco tree of each year
+GAME_SAMPLE_SIZE = 20
+ECO_SAMPLE_SIZE = 3
+# the smallest and largest number of matches that can be shown in the game tree and in the eco tree of each year
+GAME_SAMPLE_RANGE = (5, 60)
+ECO_SAMPLE_RANGE = (1, 10)
+
+
+def sample_size(size: Any, bounds: tuple[int, int], default: int) -> int:
+    """
+    Return size limited to bounds, or default if size is not an integer (e.g. a value sent by a client instead of
+    one of the slider values)
+
+    >>> sample_size(10 ** 9, GAME_SAMPLE_RANGE, GAME_SAMPLE_SIZE), sample_size(0, GAME_SAMPLE_RANGE, GAME_SAMPLE_SIZE)
+    (60, 5)
+    >>> sample_size('7', GAME_SAMPLE_RANGE, GAME_SAMPLE_SIZE)
+    20
+    """
+    if not isinstance(size, int) or isinstance(size, bool):
+        return default
+    return min(max(size, bounds[0]), bounds[1])
+
+
+def match_maps(game: dict) -> list[str]:
+    """
+    Return the maps played in game, one match of the data of a year, in the order they were played
+
+    >>> match_maps({'A vs B': {'Haven': {}, 'Bind': {}}})
+    ['Haven', 'Bind']
+    """
+    return [m for maps in game.values() for m in maps]
+
+
+def maps_played(game: dict) -> int:
+    """
+    Return the number of maps played in game, the default score of the 'top' strategy
+
+    >>> maps_played({'A vs B': {'Haven': {}, 'Bind': {}}})
+    2
+    """
+    return len(match_maps(game))
+
+
+def first_matches(data: list[dict], size: int) -> list[dict]:
+    """
+    Return the first size matches of data
+
+    >>> first_matches([{'a': {}}, {'b': {}}, {'c': {}}], 2)
+    [{'a': {}}, {'b': {}}]
+    """
+    return data[:max(size, 0)]
+
+
+def matches_by_map(data: list[dict], size: int) -> list[dict]:
+    """
+    Return size matches of data, taking in turn the next match played on each map (in the order the maps first appear
+    in data) until size matches are taken, in the order of data
+
+    >>> data = [{'1': {'Haven': {}}}, {'2': {'Haven': {}}}, {'3': {'Bind': {}}}, {'4': {'Split': {}}}]
+    >>> [list(game)[0] for game in matches_by_map(data, 3)]
+    ['1', '3', '4']
+    """
+    queues = {}
+    for i, game in enumerate(data):
+        for m in match_maps(game):
+            queues.setdefault(m, []).append(i)
+    positions = dict.fromkeys(queues, 0)
+    taken = set()
+    while len(taken) < min(size, len(data)):
+        for m, queue in queues.items():
+            while positions[m] < len(queue) and queue[positions[m]] in taken:
+                positions[m] += 1
+            if positions[m] < len(queue) and len(taken) < size:
+                taken.add(queue[positions[m]])
+        if all(positions[m] >= len(queue) for m, queue in queues.items()):
+            break
+    return [data[i] for i in sorted(taken)]
+
+
+def top_matches(data: list[dict], size: int, score: Callable[[dict], float] = maps_played) -> list[dict]:
+    """
+    Return the size matches of data with the highest score (the earliest ones first when scores are equal), in the
+    order of data
+
+    >>> data = [{'1': {'Haven': {}}}, {'2': {'Haven': {}, 'Bind': {}}}, {'3': {'Bind': {}}}]
+    >>> [list(game)[0] for game in top_matches(data, 2)]
+    ['1', '2']
+    """
+    ranked = sorted(range(len(data)), key=lambda i: (-score(data[i]), i))
+    return [data[i] for i in sorted(ranked[:max(size, 0)])]
+
+
+def sample_matches(data: list[dict], size: int, strategy: str = 'first',
+                   score: Optional[Callable[[dict], float]] = None) -> list[dict]:
+    """
+    Return a sample of size matches of data with the given strategy (see STRATEGIES), using score for the 'top'
+    strategy (maps_played if it is None)
+
+    Raise a ValueError if strategy is not one of STRATEGIES.
+
+    >>> sample_matches([{'a': {}}, {'b': {}}], 1)
+    [{'a': {}}]
+    >>> sample_matches([{'a': {}}], 1, 'random')
+    Traceback (most recent call last):
+    ValueError: unknown sampling strategy 'random'
+    """
+    if strategy == 'first':
+        return first_matches(data, size)
+    elif strategy == 'by_map':
+        return matches_by_map(data, size)
+    elif strategy == 'top':
+        return top_matches(data, size, score or maps_played)
+    raise ValueError(f'unknown sampling strategy {strategy!r}')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': [],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
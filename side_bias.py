@@ -0,0 +1,182 @@
+"""Valorant Side Bias File
+
+This python module contains functions to estimate how Attacker or Defender sided each map is, with a confidence
+interval instead of a single comparison. The share of the (regulation) rounds won by the attacking side is computed for
+every map, both per year and over every year, and its confidence interval is estimated by bootstrapping: the matches
+are resampled with replacement many times, all at once with NumPy, and the interval is read from the percentiles of the
+resampled shares.
+
+The rounds of each match are read from the columnar cache of the maps_scores files (see columnar.py), which the match
+durations (see durations.py) are read from as well, so the files are not parsed again for these statistics.
+
+The maps and years are independent, so they can be spread over a pool of worker processes, created the first time
+it is needed and then shared by every call. By default they are computed in the calling process instead: on the
+bundled data this takes under a second, less than starting the workers, and the spawned workers would re-import the
+__main__ module (e.g. the Dash app). Each one is resampled with its own seed derived from the map and year, so the
+intervals do not depend on the number of workers.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+import multiprocessing
+import threading
+import zlib
+
+import numpy as np
+
+from columnar import ColumnarTable, MISSING
+from instrumentation import timed
+
+N_RESAMPLES = 2000
+CONFIDENCE = 0.95
+
+# the worker pools shared by every call of side_intervals, by number of workers (see _shared_pool)
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def bootstrap_interval(attack: np.ndarray, defend: np.ndarray, seed: int, n_resamples: int = N_RESAMPLES,
+                       confidence: float = CONFIDENCE) -> dict[str, Any]:
+    """
+    Return the share of rounds won by the attacking side over the matches whose attacker and defender rounds won are
+    attack and defend, with its bootstrap confidence interval, in the format
+    {'matches': matches, 'attack_rounds': rounds, 'defend_rounds': rounds, 'attack_rate': rate, 'low': low,
+    'high': high}
+
+    The rates are None if there are no rounds.
+
+    >>> result = bootstrap_interval(np.array([7, 6, 8, 5]), np.array([5, 6, 4, 7]), seed=0)
+    >>> result['attack_rate'], result['low'] <= result['attack_rate'] <= result['high']
+    (0.5417, True)
+    """
+    result = {'matches': len(attack), 'attack_rounds': int(attack.sum()), 'defend_rounds': int(defend.sum()),
+              'attack_rate': None, 'low': None, 'high': None}
+    total = attack + defend
+    if total.sum() == 0:
+        return result
+    rng = np.random.default_rng(seed)
+    samples = rng.integers(0, len(attack), size=(n_resamples, len(attack)))
+    sample_totals = total[samples].sum(axis=1)
+    rates = attack[samples].sum(axis=1) / np.where(sample_totals > 0, sample_totals, 1)
+    low, high = np.percentile(rates, [50 * (1 - confidence), 50 * (1 + confidence)])
+    result.update({'attack_rate': round(float(attack.sum() / total.sum()), 4),
+                   'low': round(float(low), 4), 'high': round(float(high), 4)})
+    return result
+
+
+def interval_verdict(result: dict[str, Any]) -> str:
+    """
+    Return whether the map of result (from bootstrap_interval) is Attacker or Defender sided, only if its whole
+    confidence interval is on one side of 50%
+
+    >>> interval_verdict({'attack_rate': 0.53, 'low': 0.51, 'high': 0.55})
+    'is Attacker sided'
+    >>> interval_verdict({'attack_rate': 0.51, 'low': 0.49, 'high': 0.53})
+    'is not significantly sided'
+    """
+    if result['attack_rate'] is None:
+        return 'has no rounds'
+    elif result['low'] > 0.5:
+        return 'is Attacker sided'
+    elif result['high'] < 0.5:
+        return 'is Defender sided'
+    else:
+        return 'is not significantly sided'
+
+
+def columnar_side_rounds(table: ColumnarTable) -> dict[str, dict[str, tuple[np.ndarray, np.ndarray]]]:
+    """
+    Return the attacker and defender rounds won in each match of table, the columnar cache of the maps_scores files,
+    for each year and map, in the format {year: {map: (attack, defend)}} where map is lowercased and attack[i] and
+    defend[i] are the rounds won by the attacking and defending sides in the i-th match played on that map (in the
+    order the matches first appear in the maps_scores file of that year)
+
+    The rows without the four attacker and defender scores are left out.
+    """
+    columns = table.read(['year', 'map', 'tournament', 'match', 'attack_a', 'defend_a', 'attack_b', 'defend_b', 'row'],
+                         decode=False)
+    valid = np.all([columns[c] != MISSING for c in ('attack_a', 'defend_a', 'attack_b', 'defend_b')], axis=0)
+    order = np.argsort(columns['row'][valid], kind='stable')
+    keys = np.stack([columns[c][valid][order] for c in ('year', 'map', 'tournament', 'match')], axis=1)
+    attack = (columns['attack_a'] + columns['attack_b'])[valid][order]
+    defend = (columns['defend_a'] + columns['defend_b'])[valid][order]
+
+    matches, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    attack_sums = np.bincount(inverse, weights=attack, minlength=len(matches)).astype(np.int64)
+    defend_sums = np.bincount(inverse, weights=defend, minlength=len(matches)).astype(np.int64)
+
+    years, maps = table.dictionary('year'), table.dictionary('map')
+    grouped = {}
+    for i in np.argsort(first, kind='stable').tolist():
+        grouped.setdefault((years[matches[i, 0]], maps[matches[i, 1]]), []).append(i)
+    rounds = {}
+    for (year, m), indices in grouped.items():
+        rounds.setdefault(year, {})[m] = (attack_sums[indices], defend_sums[indices])
+    return rounds
+
+
+def _interval_task(task: tuple[str, str, np.ndarray, np.ndarray, int, int]) -> tuple[str, str, dict[str, Any]]:
+    """Return the map and year of task with their bootstrap interval (run in a worker process)."""
+    map_played, year, attack, defend, seed, n_resamples = task
+    result = bootstrap_interval(attack, defend, seed, n_resamples)
+    result['verdict'] = interval_verdict(result)
+    return (map_played, year, result)
+
+
+def _shared_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared pool of the given number of worker processes (one per CPU if 0), creating it if needed."""
+    with _pools_lock:
+        if workers not in _pools:
+            # spawn fresh workers: forking a process that runs server threads is not safe
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers or None,
+                                                  mp_context=multiprocessing.get_context('spawn'))
+        return _pools[workers]
+
+
+@timed('build.side_intervals')
+def side_intervals(by_year: dict[str, dict[str, tuple[np.ndarray, np.ndarray]]], workers: int = 1, seed: int = 0,
+                   n_resamples: int = N_RESAMPLES) -> dict[str, dict[str, dict[str, Any]]]:
+    """
+    Return the bootstrap interval of the attacker round win rate of every map in by_year, the rounds won in each match
+    in the format of columnar_side_rounds, for each year and over every year ('all'), in the format
+    {map: {year: result}} where each result is in the format of bootstrap_interval, with a 'verdict'
+
+    Optional arguments:
+        - workers: the number of worker processes of the shared pool (see _shared_pool); 0 means one per CPU, and 1
+          computes every interval in this process
+        - seed: the seed that the seed of each map and year is derived from
+        - n_resamples: the number of bootstrap resamples of each interval
+    """
+    tasks = []
+    for m in sorted({m for rounds in by_year.values() for m in rounds}):
+        parts = {year: rounds[m] for year, rounds in by_year.items() if m in rounds}
+        parts['all'] = (np.concatenate([p[0] for p in parts.values()]), np.concatenate([p[1] for p in parts.values()]))
+        for year, (attack, defend) in parts.items():
+            tasks.append((m, year, attack, defend, zlib.crc32(f'{seed}/{m}/{year}'.encode()), n_resamples))
+
+    if workers == 1:
+        results = [_interval_task(task) for task in tasks]
+    else:
+        results = list(_shared_pool(workers).map(_interval_task, tasks))
+
+    intervals = {}
+    for m, year, result in results:
+        intervals.setdefault(m, {})[year] = result
+    return intervals
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['concurrent.futures', 'multiprocessing', 'threading', 'zlib', 'numpy', 'columnar',
+                          'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,138 @@
+"""Valorant Agent Similarity File
+
+This python module contains a similarity engine over the agents of the weighted map-agent graph. Each agent is
+described by its profile: the weights of its edges to every map (see graph.calc_map_agent_weight) and the weights of
+its edges to every other agent (how often they are played together). The profiles are stacked into a matrix, and the
+cosine similarity of every pair of agents is computed at once with one matrix multiplication.
+
+The engine answers "which agents are most similar to X" and "what can I play instead of X" (e.g. when a teammate has
+already taken your pick) queries. It is kept in the registry, so it is computed once per data version.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+
+import numpy as np
+
+from graph import WeightedGraph
+from instrumentation import timed
+
+# how much the map profile counts compared to the co-play profile, from 0 (only co-play) to 1 (only maps)
+MAP_SHARE = 0.5
+
+
+def _normalized_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Return matrix with every non-zero row divided by its Euclidean norm
+
+    >>> _normalized_rows(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    array([[0.6, 0.8],
+           [0. , 0. ]])
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+class AgentSimilarity:
+    """The cosine similarity of every pair of agents, based on their map and co-play profiles.
+
+    Instance Attributes:
+        - agents: the agents, in the order of the rows and columns of self.similarity
+        - roles: the role of each agent, in the same order
+        - maps: the maps of the map profiles, in the order of their columns in self.profiles
+        - profiles: the profile of each agent: its map weights followed by its co-play weights, each part scaled so
+          that its squared norm is map_share and 1 - map_share respectively
+        - similarity: the cosine similarity of the profiles of every pair of agents
+
+    Representation Invariants:
+        - self.similarity.shape == (len(self.agents), len(self.agents))
+        - np.allclose(self.similarity, self.similarity.T)
+    """
+    agents: list[str]
+    roles: list[str]
+    maps: list[str]
+    profiles: np.ndarray
+    similarity: np.ndarray
+
+    def __init__(self, graph: WeightedGraph, maps: list[str], map_share: float = MAP_SHARE) -> None:
+        """Initialize the similarity of the agents adjacent to maps in graph, including their agent-agent edges."""
+        self.maps = list(maps)
+        self.agents = sorted({a for m in self.maps for a in graph.get_neighbours(m)
+                              if graph.get_vertex(a).type == 'agent'})
+        self.roles = [graph.get_vertex(a).role for a in self.agents]
+
+        map_weights = np.array([[graph.get_weight(a, m) for m in self.maps] for a in self.agents], dtype=float)
+        co_play = np.array([[graph.get_weight(a, b) if a != b else 0 for b in self.agents] for a in self.agents],
+                           dtype=float)
+        self.profiles = np.hstack([np.sqrt(map_share) * _normalized_rows(map_weights),
+                                   np.sqrt(1 - map_share) * _normalized_rows(co_play)])
+        normalized = _normalized_rows(self.profiles)
+        self.similarity = normalized @ normalized.T
+
+    def similar(self, agent: str, k: int = 5, role: str = '', exclude: Optional[list[str]] = None) -> list[dict]:
+        """
+        Return the k agents most similar to agent (other than agent itself and the agents in exclude), of the given
+        role if it is not empty, in descending order of similarity, in the format
+        [{'agent': agent_name, 'similarity': similarity, 'role': role}, ...]
+        Return an empty list if k is less than 1.
+
+        Raise a KeyError if agent is unknown.
+
+        >>> g = WeightedGraph()
+        >>> g.add_vertex('ascent', 'map')
+        >>> for agent, weight in [('jett', 9), ('raze', 8), ('omen', 2)]:
+        ...     g.add_vertex(agent, 'agent', 'duelists')
+        ...     g.add_edge('ascent', agent, weight)
+        >>> len(AgentSimilarity(g, ['ascent']).similar('jett', 2))
+        2
+        >>> AgentSimilarity(g, ['ascent']).similar('jett', 0)
+        []
+        """
+        if agent not in self.agents:
+            raise KeyError(agent)
+        if k < 1:
+            return []
+        row = self.similarity[self.agents.index(agent)]
+        excluded = set(exclude or []) | {agent}
+        result = []
+        for i in np.argsort(-row, kind='stable'):
+            if self.agents[i] not in excluded and (not role or self.roles[i] == role):
+                result.append({'agent': self.agents[i], 'similarity': round(float(row[i]), 4), 'role': self.roles[i]})
+                if len(result) == k:
+                    break
+        return result
+
+    def substitutes(self, agent: str, teammates: list[str], k: int = 3) -> list[dict]:
+        """
+        Return the k agents to play instead of agent when it has been taken, in the same format as
+        AgentSimilarity.similar: the agents of the same role that are most similar to agent and not already played by
+        a teammate, followed by the most similar agents of the other roles if there are not enough of them
+
+        Raise a KeyError if agent is unknown.
+        """
+        if agent not in self.agents:
+            raise KeyError(agent)
+        result = self.similar(agent, k, self.roles[self.agents.index(agent)], teammates)
+        if len(result) < k:
+            result += self.similar(agent, k - len(result), '', teammates + [r['agent'] for r in result])
+        return result
+
+
+@timed('build.agent_similarity')
+def build_agent_similarity(graph: WeightedGraph, maps: list[str]) -> AgentSimilarity:
+    """Return the similarity engine of the agents of graph (see AgentSimilarity)."""
+    return AgentSimilarity(graph, maps)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['numpy', 'graph', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })
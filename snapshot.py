@@ -0,0 +1,352 @@
+"""Valorant Data Snapshot File
+
+This python module contains functions to write the derived datasets of a DataRegistry (the map-agent data, the agent
+combinations, the ranked agents of each map and partners of each agent, and the attacker/defender and buy type data
+behind the trees) once into a directory of NumPy arrays, and to map that directory read-only into any number of server
+worker processes.
+
+Since the arrays are memory-mapped, every worker shares the same physical pages for them, so the memory they take
+does not grow with the number of workers. The recommendation queries (best agents, compatible agents, best side and
+best buy, see api.RecommendationIndex) are answered straight from the mapped arrays. The views that draw or filter the
+agent graph (the agent graph figure, the tournament and stage filters, compositions, analytics and similarity) still
+decode the map-agent data and build a weighted graph in the worker that first uses them, and each worker parses the
+matches of the years shown in the tree visualizations to sample them.
+
+A snapshot directory is never modified after it is written: refreshing the data writes a new directory and then
+atomically replaces the CURRENT file that points to it. A DataWatcher given the snapshot root (see watcher.py) writes
+the snapshot of the new files (or maps the one already written by another worker) and publishes it to its registry.
+
+Layout of a snapshot root directory:
+    CURRENT           the name of the current snapshot directory
+    .lock             held while a snapshot is being written, so that only one worker writes it
+    <version>/        one directory per data version, containing strings.json and one .npy file per array
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Optional
+import json
+import os
+import shutil
+
+import numpy as np
+
+from tree import BUY_TYPES, side_verdict, buy_verdict
+from registry import DataRegistry
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where only one worker should write the snapshot
+    fcntl = None
+
+CURRENT_NAME = 'CURRENT'
+LOCK_NAME = '.lock'
+
+
+class Snapshot:
+    """A read-only, memory-mapped snapshot of the derived datasets of a DataRegistry.
+
+    Instance Attributes:
+        - path: the directory containing this snapshot
+        - version: the data version of the files this snapshot was written from
+        - maps: the map names of the map-agent data (lowercase), indexed by map id
+        - agents: the agent names, indexed by agent id
+        - roles: the agent roles, indexed by role id
+        - tree_maps: the map names of the attacker/defender and buy type data (lowercase), indexed by map id
+        - arrays: the memory-mapped arrays of this snapshot, by name
+
+    Representation Invariants:
+        - len(self.arrays['game_map']) == len(self.arrays['game_sides'])
+        - len(self.arrays['eco_map']) == len(self.arrays['eco_type'])
+        - len(self.arrays['rank_offsets']) == len(self.maps) + 1
+        - len(self.arrays['partner_offsets']) == len(self.agents) + 1
+    """
+    path: str
+    version: str
+    maps: list[str]
+    agents: list[str]
+    roles: list[str]
+    tree_maps: list[str]
+    arrays: dict[str, np.ndarray]
+    # Private Instance Attributes:
+    #     - _map_ids: maps each map name of self.maps to its id
+    #     - _agent_ids: maps each agent name of self.agents to its id
+    _map_ids: dict[str, int]
+    _agent_ids: dict[str, int]
+
+    def __init__(self, path: str) -> None:
+        """Open the snapshot in the directory path, mapping every array read-only."""
+        self.path = path
+        with open(os.path.join(path, 'strings.json'), 'r') as file:
+            strings = json.load(file)
+        self.version = strings['version']
+        self.maps = strings['maps']
+        self.agents = strings['agents']
+        self.roles = strings['roles']
+        self.tree_maps = strings['tree_maps']
+        self.arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r')
+                       for name in os.listdir(path) if name.endswith('.npy')}
+        self._map_ids = {m: i for i, m in enumerate(self.maps)}
+        self._agent_ids = {a: i for i, a in enumerate(self.agents)}
+
+    def ranked_agents(self, map_played: str) -> list[tuple[str, float, str]]:
+        """
+        Return the agents played on map_played in descending order of score, as (agent, score, role) tuples (see
+        api.RecommendationIndex.map_agents)
+
+        Raise a KeyError if map_played is not in this snapshot.
+        """
+        map_id = self._map_ids[map_played]
+        start, stop = self.arrays['rank_offsets'][map_id:map_id + 2].tolist()
+        agent_role = self.arrays['agent_role']
+        return [(self.agents[a], score, self.roles[agent_role[a]])
+                for a, score in zip(self.arrays['rank_agent'][start:stop].tolist(),
+                                    self.arrays['rank_score'][start:stop].tolist())]
+
+    def ranked_partners(self, agent: str) -> list[tuple[str, float]]:
+        """
+        Return the agents most played with agent in descending order of score, as (agent, score) tuples (see
+        api.RecommendationIndex.partners)
+
+        Raise a KeyError if agent is not in this snapshot.
+        """
+        agent_id = self._agent_ids[agent]
+        start, stop = self.arrays['partner_offsets'][agent_id:agent_id + 2].tolist()
+        return [(self.agents[a], score) for a, score in zip(self.arrays['partner_agent'][start:stop].tolist(),
+                                                            self.arrays['partner_score'][start:stop].tolist())]
+
+    def map_ref(self) -> dict[str, dict[str, list]]:
+        """
+        Return the map-agent data in the format {map_name: agent_ref} (see graph.load_map_agent_data)
+
+        This decodes the mapped arrays into a dictionary owned by the calling worker: it is only needed by the views
+        that draw or filter the agent graph.
+        """
+        map_ref = {}
+        values = self.arrays['mr_values']
+        agent_role = self.arrays['agent_role']
+        for i, (map_id, agent_id) in enumerate(zip(self.arrays['mr_map'].tolist(), self.arrays['mr_agent'].tolist())):
+            agent = self.agents[agent_id]
+            map_ref.setdefault(self.maps[map_id], {})[agent] = [
+                float(values[i, 0]), int(values[i, 1]), int(values[i, 2]), int(values[i, 3]),
+                self.roles[agent_role[agent_id]]]
+        return map_ref
+
+    def agent_combos(self) -> list[set]:
+        """Return the list of agent combinations (see graph.load_agent_combo_data)."""
+        offsets = self.arrays['combo_offsets'].tolist()
+        combo_agents = self.arrays['combo_agents'].tolist()
+        return [{self.agents[a] for a in combo_agents[offsets[i]:offsets[i + 1]]} for i in range(len(offsets) - 1)]
+
+    def side_totals_for_map(self, map_played: str) -> tuple[int, int]:
+        """Return the total Attacker and Defender rounds won on map_played (see Tree.side_totals_for_map)."""
+        if map_played not in self.tree_maps:
+            return (0, 0)
+        mask = self.arrays['game_map'] == self.tree_maps.index(map_played)
+        attack, defend = self.arrays['game_sides'][mask].sum(axis=0).tolist()
+        return (attack, defend)
+
+    def buy_wins_for_map(self, map_played: str) -> dict[str, int]:
+        """Return the number of rounds won with each buy type on map_played (see Tree.buy_wins_for_map)."""
+        if map_played not in self.tree_maps:
+            return {buy_type: 0 for buy_type in BUY_TYPES}
+        mask = self.arrays['eco_map'] == self.tree_maps.index(map_played)
+        counts = np.bincount(self.arrays['eco_type'][mask], minlength=len(BUY_TYPES)).tolist()
+        return dict(zip(BUY_TYPES, counts))
+
+    def best_side_for_map(self, map_played: str) -> str:
+        """Return the same string as Tree.best_side_for_map, computed from this snapshot."""
+        return side_verdict(*self.side_totals_for_map(map_played))
+
+    def best_buy_for_map(self, map_played: str) -> str:
+        """Return the same string as Tree.best_buy_for_map, computed from this snapshot."""
+        return buy_verdict(self.buy_wins_for_map(map_played))
+
+
+def snapshot_arrays(registry: DataRegistry) -> tuple[dict[str, list], dict[str, np.ndarray]]:
+    """
+    Return the string tables and arrays of a snapshot of the datasets in registry
+
+    Each string column is stored as integer ids into one of the returned string tables. Every row of the attacker/
+    defender and buy type data is kept, so the totals computed from a snapshot can be slightly higher than the ones
+    computed from the trees, which merge matches that share a name within a year.
+    """
+    map_ref = registry.map_ref()
+    agent_roles = registry.agent_roles()
+    combos = registry.agent_combos()
+    maps = sorted(map_ref)
+    agents = sorted(set(agent_roles) | {a for agent_ref in map_ref.values() for a in agent_ref}
+                    | {a for combo in combos for a in combo})
+    roles = sorted(set(agent_roles.values()) | {r[4] for agent_ref in map_ref.values() for r in agent_ref.values()})
+    agent_ids = {agent: i for i, agent in enumerate(agents)}
+
+    rows = [(maps.index(m), agent_ids[a], v) for m in maps for a, v in map_ref[m].items()]
+    agent_role = [roles.index(agent_roles[a]) if a in agent_roles else -1 for a in agents]
+    for _, agent_id, v in rows:
+        agent_role[agent_id] = roles.index(v[4])
+
+    offsets = [0]
+    combo_agents = []
+    for combo in combos:
+        combo_agents.extend(sorted(agent_ids[a] for a in combo))
+        offsets.append(len(combo_agents))
+
+    graph = registry.map_agent_graph()
+    rank_offsets, rank_agents = [0], []
+    for m in maps:
+        rank_agents.extend(_ranked([(a, graph.get_weight(a, m)) for a in graph.get_neighbours(m)]))
+        rank_offsets.append(len(rank_agents))
+    partner_offsets, partners = [0], []
+    for a in agents:
+        if graph.check_exists(a):
+            partners.extend(_ranked([(u, graph.get_weight(u, a)) for u in graph.get_neighbours(a)
+                                     if u != a and graph.get_vertex(u).type == 'agent']))
+        partner_offsets.append(len(partners))
+
+    tree_maps = []
+    game_map, game_sides = [], []
+    eco_map, eco_type = [], []
+    for year in registry.years:
+        for game in registry.game_data(year)[1]:
+            for matches in game.values():
+                for m_map, teams in matches.items():
+                    for sides in teams.values():
+                        game_map.append(_index(tree_maps, m_map.lower()))
+                        game_sides.append(sides)
+    for year in registry.eco_years:
+        for game in registry.eco_data(year)[1]:
+            for matches in game.values():
+                for m_map, rounds in matches.items():
+                    for _, buy_type in rounds.values():
+                        eco_map.append(_index(tree_maps, m_map.lower()))
+                        eco_type.append(BUY_TYPES.index(buy_type))
+
+    strings = {'version': registry.data_version(), 'maps': maps, 'agents': agents, 'roles': roles,
+               'tree_maps': tree_maps}
+    arrays = {
+        'mr_map': np.array([r[0] for r in rows], dtype=np.int16),
+        'mr_agent': np.array([r[1] for r in rows], dtype=np.int16),
+        'mr_values': np.array([r[2][:4] for r in rows], dtype=np.float64).reshape(-1, 4),
+        'agent_role': np.array(agent_role, dtype=np.int8),
+        'combo_offsets': np.array(offsets, dtype=np.int32),
+        'combo_agents': np.array(combo_agents, dtype=np.int16),
+        'rank_offsets': np.array(rank_offsets, dtype=np.int32),
+        'rank_agent': np.array([agent_ids[a] for a, _ in rank_agents], dtype=np.int16),
+        'rank_score': np.array([score for _, score in rank_agents], dtype=np.float64),
+        'partner_offsets': np.array(partner_offsets, dtype=np.int32),
+        'partner_agent': np.array([agent_ids[a] for a, _ in partners], dtype=np.int16),
+        'partner_score': np.array([score for _, score in partners], dtype=np.float64),
+        'game_map': np.array(game_map, dtype=np.int16),
+        'game_sides': np.array(game_sides, dtype=np.int32).reshape(-1, 2),
+        'eco_map': np.array(eco_map, dtype=np.int16),
+        'eco_type': np.array(eco_type, dtype=np.int8),
+    }
+    return strings, arrays
+
+
+def _ranked(items: list[tuple[str, float]]) -> list[tuple[str, float]]:
+    """
+    Return items sorted in descending order of score, breaking ties by name, like api.RecommendationIndex
+
+    >>> _ranked([('b', 1.0), ('a', 1.0), ('c', 2.0)])
+    [('c', 2.0), ('a', 1.0), ('b', 1.0)]
+    """
+    return sorted(items, key=lambda item: (-item[1], item[0]))
+
+
+def _index(table: list[str], value: str) -> int:
+    """
+    Return the index of value in table, appending it to table first if it is not there
+
+    >>> t = ['haven']
+    >>> _index(t, 'bind'), _index(t, 'haven'), t
+    (1, 0, ['haven', 'bind'])
+    """
+    if value not in table:
+        table.append(value)
+    return table.index(value)
+
+
+def write_snapshot(registry: DataRegistry, root: str) -> Snapshot:
+    """
+    Write a snapshot of the datasets in registry into a new directory in root, make it the current snapshot of root,
+    and return it
+
+    The snapshot is written into a temporary directory that is renamed once it is complete, and then the CURRENT
+    file is atomically replaced, so a worker opening root always sees a complete snapshot. Every snapshot in root
+    other than the new one and the one it replaces is deleted (workers that still map a deleted snapshot keep
+    working, since its files are only freed once they are unmapped).
+    """
+    os.makedirs(root, exist_ok=True)
+    strings, arrays = snapshot_arrays(registry)
+    name = strings['version']
+    final_path = os.path.join(root, name)
+    previous = current_name(root)
+
+    if not os.path.isdir(final_path):
+        temp_path = os.path.join(root, f'.{name}.{os.getpid()}.tmp')
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        for array_name, array in arrays.items():
+            np.save(os.path.join(temp_path, array_name + '.npy'), array)
+        with open(os.path.join(temp_path, 'strings.json'), 'w') as file:
+            json.dump(strings, file)
+        os.rename(temp_path, final_path)
+
+    with open(os.path.join(root, CURRENT_NAME + '.tmp'), 'w') as file:
+        file.write(name)
+    os.replace(os.path.join(root, CURRENT_NAME + '.tmp'), os.path.join(root, CURRENT_NAME))
+
+    for old in os.listdir(root):
+        if old not in {name, previous, CURRENT_NAME, LOCK_NAME} and os.path.isdir(os.path.join(root, old)):
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return Snapshot(final_path)
+
+
+def current_name(root: str) -> Optional[str]:
+    """Return the name of the current snapshot directory in root, or None if root has no snapshot."""
+    try:
+        with open(os.path.join(root, CURRENT_NAME), 'r') as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def open_snapshot(root: str) -> Optional[Snapshot]:
+    """Return the current snapshot in root, or None if root has no snapshot."""
+    name = current_name(root)
+    return Snapshot(os.path.join(root, name)) if name else None
+
+
+def ensure_snapshot(registry: DataRegistry, root: str) -> Snapshot:
+    """
+    Return the current snapshot in root if it was written from the same data version as registry, and otherwise
+    write a new one from registry and return it
+
+    Only one process at a time checks and writes the snapshot; the others wait and then map the snapshot written by
+    the first one instead of parsing the data themselves.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_NAME), 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if current_name(root) == registry.data_version():
+                return open_snapshot(root)
+            return write_snapshot(registry, root)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['json', 'os', 'shutil', 'fcntl', 'numpy', 'tree', 'registry'],
+        'allowed-io': ['Snapshot.__init__', 'write_snapshot', 'current_name', 'ensure_snapshot'],
+        'max-nested-blocks': 5
+    })
@@ -0,0 +1,274 @@
+"""Valorant Synthetic Data Generator File
+
+This python module contains functions to generate synthetic versions of every dataset used by the project, in the
+exact same csv formats as the files in graph_data and tree_data, at any scale. The data is generated from a seeded
+random number generator, so the same seed and scale always produce the same files.
+
+A scale of 1 produces files of roughly the same size as the real ones; the number of rows of every file grows
+linearly with the scale.
+
+Run this file to generate a dataset, e.g.
+    python synthetic.py --out-dir synthetic_data --scale 10 --seed 0
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any
+import argparse
+import csv
+import os
+import random
+
+MAPS = ['Ascent', 'Bind', 'Haven', 'Split', 'Icebox', 'Breeze', 'Fracture', 'Pearl', 'Lotus']
+AGENT_ROLES = {
+    'Jett': 'Duelists', 'Phoenix': 'Duelists', 'Reyna': 'Duelists', 'Raze': 'Duelists', 'Yoru': 'Duelists',
+    'Neon': 'Duelists', 'Iso': 'Duelists', 'Astra': 'Controllers', 'Brimstone': 'Controllers',
+    'Clove': 'Controllers', 'Harbor': 'Controllers', 'Omen': 'Controllers', 'Viper': 'Controllers',
+    'Breach': 'Initiators', 'Fade': 'Initiators', 'Gekko': 'Initiators', 'KAYO': 'Initiators', 'Skye': 'Initiators',
+    'Sova': 'Initiators', 'Chamber': 'Sentinels', 'Cypher': 'Sentinels', 'Deadlock': 'Sentinels',
+    'Killjoy': 'Sentinels', 'Sage': 'Sentinels'
+}
+STAGES = ['Group Stage', 'Playoffs', 'Regular Season', 'Main Event', 'League Play', 'Bracket Stage']
+MATCH_TYPES = ['Opening (A)', 'Opening (B)', 'Winner\'s (A)', 'Elimination (A)', 'Upper Final', 'Grand Final']
+
+MAPS_SCORES_HEADER = ['Tournament', 'Stage', 'Match Type', 'Match Name', 'Map', 'Team A', 'Team A Score',
+                      'Team A Attacker Score', 'Team A Defender Score', 'Team A Overtime Score', 'Team B',
+                      'Team B Score', 'Team B Attacker Score', 'Team B Defender Score', 'Team B Overtime Score',
+                      'Duration']
+ECO_HEADER = ['Tournament', 'Stage', 'Match Type', 'Match Name', 'Map', 'Round Number', 'Team', 'Loadout Value',
+              'Remaining Credits', 'Type', 'Outcome']
+PICK_RATES_HEADER = ['Tournament', 'Stage', 'Match Type', 'Map', 'Agent', 'Pick Rate']
+TEAMS_PICKED_HEADER = ['Tournament', 'Stage', 'Match Type', 'Map', 'Team', 'Agent Picked', 'Total Wins By Map',
+                       'Total Loss By Map', 'Total Maps Played']
+
+# number of rows (or matches) of each dataset at scale 1, close to the sizes of the real files
+MATCHES_PER_YEAR = 1800
+ECO_MATCHES_PER_YEAR = 90
+PICK_RATE_BLOCKS = 80
+TEAMS_PICKED_ROWS = 11750
+AGENT_COMBOS = 5300
+
+
+def generate_dataset(out_dir: str, scale: float = 1.0, seed: int = 0,
+                     years: tuple[str, ...] = ('2021', '2022', '2023')) -> dict[str, int]:
+    """
+    Generate a synthetic dataset in out_dir and return the number of rows written to each file, in the format
+    {file_path: rows}
+
+    The files are written to out_dir/graph_data and out_dir/tree_data with the same names as the real files, so
+    that a DataRegistry(graph_dir=..., tree_dir=..., years=years) can load them.
+
+    Preconditions:
+        - scale > 0
+        - every year in years is a 4 digit year
+    """
+    rng = random.Random(seed)
+    graph_dir = os.path.join(out_dir, 'graph_data')
+    tree_dir = os.path.join(out_dir, 'tree_data')
+    os.makedirs(graph_dir, exist_ok=True)
+    os.makedirs(tree_dir, exist_ok=True)
+    teams = [f'Team {i:03d}' for i in range(max(16, int(32 * scale ** 0.5)))]
+
+    counts = {}
+    for year in years:
+        games = generate_games(rng, year, teams, max(1, int(MATCHES_PER_YEAR * scale)))
+        counts[_write(os.path.join(tree_dir, f'maps_scores_{year}.csv'), MAPS_SCORES_HEADER, games)] = len(games)
+        eco = generate_eco(rng, games, max(1, int(ECO_MATCHES_PER_YEAR * scale)))
+        counts[_write(os.path.join(tree_dir, f'eco_data_{year}.csv'), ECO_HEADER, eco)] = len(eco)
+
+    roles = [[agent, role] for agent, role in AGENT_ROLES.items()]
+    counts[_write(os.path.join(graph_dir, 'agent_roles.csv'), ['Agents', 'Roles'], roles)] = len(roles)
+    picks = generate_pick_rates(rng, years[-1], max(1, int(PICK_RATE_BLOCKS * scale)))
+    counts[_write(os.path.join(graph_dir, f'agents_pick_rates{years[-1]}.csv'), PICK_RATES_HEADER, picks)] = len(picks)
+    picked = generate_teams_picked(rng, picks, teams, max(1, int(TEAMS_PICKED_ROWS * scale)))
+    counts[_write(os.path.join(graph_dir, f'teams_picked_agents{years[-1]}.csv'), TEAMS_PICKED_HEADER,
+                  picked)] = len(picked)
+    combos = generate_agent_combos(rng, max(1, int(AGENT_COMBOS * scale)))
+    counts[_write(os.path.join(graph_dir, 'all_agents.csv'), ['Agents'], combos)] = len(combos)
+    return counts
+
+
+def _write(path: str, header: list[str], rows: list[list[Any]]) -> str:
+    """Write header and rows to the csv file at path, and return path."""
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+def generate_games(rng: random.Random, year: str, teams: list[str], matches: int) -> list[list[Any]]:
+    """
+    Return the rows of a maps_scores file with the given number of matches, each of which is a best of three
+
+    The first rows belong to a 'Valorant Champions <year>' tournament, since read_game reads the year from the first
+    row.
+
+    >>> rows = generate_games(random.Random(0), '2021', ['A', 'B', 'C'], 2)
+    >>> rows[0][0], len(rows[0]) == len(MAPS_SCORES_HEADER)
+    ('Valorant Champions 2021', True)
+    >>> all(r[6] == r[7] + r[8] + (r[9] or 0) for r in rows)
+    True
+    """
+    rows = []
+    for i in range(matches):
+        tournament = f'Valorant Champions {year}' if i < matches // 10 + 1 else f'Champions Tour {year}: Event {i % 7}'
+        stage, match_type = rng.choice(STAGES), rng.choice(MATCH_TYPES)
+        team_a, team_b = rng.sample(teams, 2)
+        match_name = f'{team_a} vs {team_b}'
+        wins = {team_a: 0, team_b: 0}
+        for m in rng.sample(MAPS, 3):
+            if max(wins.values()) == 2:
+                break
+            winner_is_a = rng.random() < 0.5
+            score_a, score_b, ot_a, ot_b = _map_score(rng, winner_is_a)
+            wins[team_a if winner_is_a else team_b] += 1
+            att_a = rng.randint(0, min(12, score_a - ot_a))
+            att_b = rng.randint(0, min(12, score_b - ot_b))
+            rows.append([tournament, stage, match_type, match_name, m,
+                         team_a, score_a, att_a, score_a - ot_a - att_a, ot_a or '',
+                         team_b, score_b, att_b, score_b - ot_b - att_b, ot_b or '',
+                         _duration(rng, score_a + score_b)])
+    return rows
+
+
+def _map_score(rng: random.Random, winner_is_a: bool) -> tuple[int, int, int, int]:
+    """Return the scores of team A and B of one map, and their overtime scores."""
+    if rng.random() < 0.1:  # overtime: both teams reach 12, then the winner wins by two
+        extra = rng.randint(0, 3)
+        win_ot, lose_ot = 3 + extra, 1 + extra
+        scores = (12 + win_ot, 12 + lose_ot, win_ot, lose_ot)
+    else:
+        scores = (13, rng.randint(0, 11), 0, 0)
+    return scores if winner_is_a else (scores[1], scores[0], scores[3], scores[2])
+
+
+def _duration(rng: random.Random, rounds: int) -> str:
+    """Return the duration of a map with the given number of rounds, in the format of the Duration column."""
+    if rng.random() < 0.01:
+        return ''
+    seconds = rounds * rng.randint(100, 140)
+    if seconds >= 3600:
+        return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+
+def generate_eco(rng: random.Random, games: list[list[Any]], matches: int) -> list[list[Any]]:
+    """
+    Return the rows of an eco_data file for the maps of the first given number of matches in games
+
+    Every round has two rows, one for each team, in the order Team A then Team B.
+
+    >>> games = generate_games(random.Random(0), '2021', ['A', 'B'], 1)
+    >>> eco = generate_eco(random.Random(0), games, 1)
+    >>> len(eco) == 2 * sum(g[6] + g[11] for g in games)
+    True
+    """
+    rows = []
+    match_names = []
+    for game in games:
+        if game[3] not in match_names:
+            if len(match_names) == matches:
+                break
+            match_names.append(game[3])
+        tournament, stage, match_type, match_name, m = game[:5]
+        outcomes = ['A'] * game[6] + ['B'] * game[11]
+        rng.shuffle(outcomes)
+        for round_num, winner in enumerate(outcomes, start=1):
+            for team, side in ((game[5], 'A'), (game[10], 'B')):
+                loadout, remaining = _loadout(rng, round_num)
+                rows.append([tournament, stage, match_type, match_name, m, round_num, team,
+                             f'{loadout:.1f}k', f'{remaining:.1f}k', _buy_type(loadout),
+                             'Win' if winner == side else 'Loss'])
+    return rows
+
+
+def _loadout(rng: random.Random, round_num: int) -> tuple[float, float]:
+    """Return the loadout value and remaining credits of a team in the given round, in thousands."""
+    if round_num in (1, 13):  # pistol rounds
+        return (round(rng.uniform(2.5, 4.0), 1), round(rng.uniform(0.0, 0.8), 1))
+    return (round(rng.choice([rng.uniform(1, 5), rng.uniform(5, 10), rng.uniform(10, 20), rng.uniform(20, 25),
+                              rng.uniform(20, 25), rng.uniform(20, 25)]), 1),
+            round(rng.uniform(0, 12), 1))
+
+
+def _buy_type(loadout: float) -> str:
+    """
+    Return the buy type of a loadout value in thousands, in the format of the Type column
+
+    >>> _buy_type(3.9), _buy_type(21.0)
+    ('Eco: 0-5k', 'Full buy: 20k+')
+    """
+    if loadout < 5:
+        return 'Eco: 0-5k'
+    elif loadout < 10:
+        return 'Semi-eco: 5-10k'
+    elif loadout < 20:
+        return 'Semi-buy: 10-20k'
+    else:
+        return 'Full buy: 20k+'
+
+
+def generate_pick_rates(rng: random.Random, year: str, blocks: int) -> list[list[Any]]:
+    """
+    Return the rows of an agents_pick_rates file, with a pick rate of every agent on every map (and on 'All Maps')
+    for the given number of (tournament, stage, match type) blocks
+    """
+    rows = []
+    for i in range(blocks):
+        tournament = f'Champions Tour {year}: Event {i % 10}'
+        stage, match_type = STAGES[i // 10 % len(STAGES)], MATCH_TYPES[i // 60 % len(MATCH_TYPES)]
+        for m in ['All Maps'] + MAPS:
+            for agent in AGENT_ROLES:
+                rows.append([tournament, stage, match_type, m, agent.lower(), f'{rng.randint(0, 100)}%'])
+    return rows
+
+
+def generate_teams_picked(rng: random.Random, picks: list[list[Any]], teams: list[str],
+                          rows: int) -> list[list[Any]]:
+    """
+    Return the given number of rows of a teams_picked_agents file, using only (tournament, stage, match type, map,
+    agent) combinations that appear in picks, so that every map and agent also has a pick rate
+    """
+    keys = [p[:5] for p in picks if p[3] != 'All Maps']
+    result = []
+    for _ in range(rows):
+        tournament, stage, match_type, m, agent = rng.choice(keys)
+        played = rng.randint(1, 6)
+        won = rng.randint(0, played)
+        result.append([tournament, stage, match_type, m, rng.choice(teams), agent, won, played - won, played])
+    return result
+
+
+def generate_agent_combos(rng: random.Random, rows: int) -> list[list[str]]:
+    """
+    Return the given number of rows of an all_agents file, each of which is a list of agent names played together
+
+    >>> combos = generate_agent_combos(random.Random(0), 3)
+    >>> all(1 <= len(c[0].split(', ')) <= 5 for c in combos)
+    True
+    """
+    agents = [agent.lower() for agent in AGENT_ROLES]
+    return [[', '.join(rng.sample(agents, rng.choice([2, 3, 3, 3, 4, 4, 5, 5])))] for _ in range(rows)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic Valorant dataset.')
+    parser.add_argument('--out-dir', default='synthetic_data')
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for path, n in generate_dataset(args.out_dir, args.scale, args.seed).items():
+        print(f'{path}: {n} rows')
+
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['argparse', 'csv', 'os', 'random'],
+        'allowed-io': ['_write'],
+        'max-nested-blocks': 5
+    })
@@ -7,6 +7,7 @@ from typing import Any, Optional, TextIO
 from dash.html import Figure
 from igraph import Graph
 import plotly.graph_objects as go
+from instrumentation import timed
 
 
 class Tree:
@@ -25,6 +26,8 @@ class Tree:
     #       of just one item.
     _root: Optional[Any]
     _subtrees: list[Tree]
+    # slots instead of an instance dict: the game and eco trees have a node per match, map, team and round
+    __slots__: tuple[str, ...] = ('_root', '_subtrees')
 
     def __init__(self, root: Optional[Any], subtrees: list[Tree]) -> None:
         """Initialize a new Tree with the given root value and subtrees.
@@ -107,40 +110,70 @@ class Tree:
             for subtree in self._subtrees:
                 subtree._insert_helper(items[1:])
 
-    def _best_side_helper(self) -> tuple[int, int]:
-        return (self._subtrees[0]._root[0], self._subtrees[0]._root[1])
+    def _map_leaves(self, map_played: str) -> list[Any]:
+        """
+        Returns the items two levels below every map node of the given map (map_played) in self, that is, the
+        (attack, defend) rounds of each team in a tree of years of read_game data, or the (team, buy_type) of each
+        round in a tree of years of read_buy_type data.
+
+        >>> t = Tree('VCT', [generate_tree(('2021', [{'A vs B': {'Haven': {'A': (9, 4), 'B': (2, 3)}}}]))])
+        >>> t._map_leaves('haven')
+        [(9, 4), (2, 3)]
+        """
+        leaves = []
+        for year_tree in self._subtrees:
+            for match_tree in year_tree._subtrees:
+                for map_tree in match_tree._subtrees:
+                    if map_tree._root.lower() == map_played:
+                        leaves.extend(leaf._root for subtree in map_tree._subtrees for leaf in subtree._subtrees)
+        return leaves
+
+    def side_totals_for_map(self, map_played: str) -> tuple[int, int]:
+        """
+        Returns the total number of rounds won on the Attacker side and on the Defender side by every team on the
+        given map (map_played), based on the data from self.
 
+        Preconditions:
+            - self is a tree of years generated from read_game data combined with combine_all
+
+        >>> t = Tree('VCT', [generate_tree(('2021', [{'A vs B': {'Haven': {'A': (9, 4), 'B': (2, 3)}}}]))])
+        >>> t.side_totals_for_map('haven')
+        (11, 7)
+        """
+        attack = 0
+        defend = 0
+        for leaf in self._map_leaves(map_played):
+            attack += leaf[0]
+            defend += leaf[1]
+        return (attack, defend)
+
+    @timed('query.best_side_for_map')
     def best_side_for_map(self, map_played: str) -> str:
         """
         Returns a string stating whether the user is more likely to win on the given map (map_player)
         as an Attacker or Defender based on the data from self.
         """
-        attack = 0
-        defend = 0
-        for subtree1 in self._subtrees:
-            for subtree2 in subtree1._subtrees:
-                for subtree3 in subtree2._subtrees:
-                    if subtree3._root.lower() == map_played:
-                        for subtree4 in subtree3._subtrees:
-                            attack, defend = subtree4._best_side_helper()
-        if attack > defend:
-            return "is Attacker sided"
-        if attack < defend:
-            return "is Defender sided"
-        else:
-            return "favours both sides"
-
-    def _best_buy_helper(self, eco: int, semi_eco: int, semi_buy: int, full: int) -> None:
-        for subtree in self._subtrees:
-            if subtree._root[1] == 'Eco: 0-5k':
-                eco += 1
-            elif subtree._root[1] == 'Semi-eco: 5-10k':
-                semi_eco += 1
-            elif subtree._root[1] == 'Semi-buy: 10-20k':
-                semi_buy += 1
-            else:
-                full += 1
+        return side_verdict(*self.side_totals_for_map(map_played))
+
+    def buy_wins_for_map(self, map_played: str) -> dict[str, int]:
+        """
+        Returns a dictionary of the number of rounds won with each buy type on the given map (map_played),
+        in the format {buy_type: wins}, based on the data from self.
+
+        Preconditions:
+            - self is a tree of years generated from read_buy_type data combined with combine_all
+
+        >>> t = Tree('VCT', [generate_tree(('2021', [{'A vs B': {'Haven': {1: ('A', 'Eco: 0-5k'),
+        ...                                                                 2: ('B', 'Full buy: 20k+')}}}]))])
+        >>> t.buy_wins_for_map('haven')
+        {'Eco: 0-5k': 1, 'Semi-eco: 5-10k': 0, 'Semi-buy: 10-20k': 0, 'Full buy: 20k+': 1}
+        """
+        wins = {buy_type: 0 for buy_type in BUY_TYPES}
+        for leaf in self._map_leaves(map_played):
+            wins[leaf[1]] += 1
+        return wins
 
+    @timed('query.best_buy_for_map')
     def best_buy_for_map(self, map_played: str) -> str:
         """
         Returns a string stating which buy type is more likely to win based on the given map (map_played).
@@ -151,25 +184,7 @@ class Tree:
         - Full buy
         Result is determined based on the data from self.
         """
-        eco = 0
-        semi_eco = 0
-        semi_buy = 0
-        full = 0
-        for subtree1 in self._subtrees:
-            for subtree2 in subtree1._subtrees:
-                for subtree3 in subtree2._subtrees:
-                    if subtree3._root.lower() == map_played:
-                        for subtree4 in subtree3._subtrees:
-                            subtree4._best_buy_helper(eco, semi_eco, semi_buy, full)
-        all_buys = [eco, semi_eco, semi_buy, full]
-        if max(all_buys) == eco:
-            return 'Eco buy is most effective'
-        elif max(all_buys) == semi_eco:
-            return 'Semi-eco buy is most effective'
-        elif max(all_buys) == semi_buy:
-            return 'Semi-buy is most effective'
-        else:
-            return 'Full buy is most effective'
+        return buy_verdict(self.buy_wins_for_map(map_played))
 
     def combine_all(self, trees: list) -> None:
         """
@@ -180,6 +195,50 @@ class Tree:
             self._subtrees.append(tree)
 
 
+BUY_TYPES = ('Eco: 0-5k', 'Semi-eco: 5-10k', 'Semi-buy: 10-20k', 'Full buy: 20k+')
+
+
+def side_verdict(attack: int, defend: int) -> str:
+    """
+    Returns a string stating whether a map is Attacker or Defender sided given the number of rounds won on the
+    Attacker side (attack) and on the Defender side (defend).
+
+    >>> side_verdict(11, 7)
+    'is Attacker sided'
+    """
+    if attack > defend:
+        return "is Attacker sided"
+    if attack < defend:
+        return "is Defender sided"
+    else:
+        return "favours both sides"
+
+
+def buy_verdict(wins: dict[str, float]) -> str:
+    """
+    Returns a string stating which buy type is most effective given a score for each buy type, in the format
+    {buy_type: score}, or that there is no eco data if every score is 0 (e.g. a map only played in the years without
+    eco data).
+
+    >>> buy_verdict({'Eco: 0-5k': 1, 'Semi-eco: 5-10k': 0, 'Semi-buy: 10-20k': 3, 'Full buy: 20k+': 2})
+    'Semi-buy is most effective'
+    >>> buy_verdict({'Eco: 0-5k': 0, 'Semi-eco: 5-10k': 0, 'Semi-buy: 10-20k': 0, 'Full buy: 20k+': 0})
+    'There is no eco data'
+    """
+    all_buys = [wins.get(buy_type, 0) for buy_type in BUY_TYPES]
+    if not any(all_buys):
+        return 'There is no eco data'
+    elif max(all_buys) == all_buys[0]:
+        return 'Eco buy is most effective'
+    elif max(all_buys) == all_buys[1]:
+        return 'Semi-eco buy is most effective'
+    elif max(all_buys) == all_buys[2]:
+        return 'Semi-buy is most effective'
+    else:
+        return 'Full buy is most effective'
+
+
+@timed('load.read_game')
 def read_game(game_data: TextIO) -> tuple[str, list[dict]]:
     """
     Returns a tuple consisting of the year a tournament took place and all the information needed to create a tree
@@ -218,6 +277,7 @@ def read_game(game_data: TextIO) -> tuple[str, list[dict]]:
     return (year, info)
 
 
+@timed('load.read_buy_type')
 def read_buy_type(eco_data: TextIO) -> tuple[str, list[dict]]:
     """
     Returns a tuple consisting of the year a tournament took place and all the information needed to create a tree
@@ -275,6 +335,7 @@ def read_buy_type(eco_data: TextIO) -> tuple[str, list[dict]]:
     return (year, info)
 
 
+@timed('build.generate_tree')
 def generate_tree(data: tuple[str, list[dict]]) -> Tree:
     """
     Creates a tree representation of the given data.
@@ -291,11 +352,13 @@ def generate_tree(data: tuple[str, list[dict]]) -> Tree:
     return t
 
 
-def visualize_tree_game(data1: list[dict], data2: list[dict], data3: list[dict]) -> Figure:
+@timed('layout.visualize_tree_game')
+def visualize_tree_game(data1: list[dict], data2: list[dict], data3: list[dict],
+                        years: tuple[str, str, str] = ('2021', '2022', '2023')) -> Figure:
     """
     Returns a tree in the Figure class object from the following data of attack/defender scores given as lists of
-    dictionary. data1 represents the data from 2021, data2 represents the data from 2022, and data3 represents the data
-    from 2023.
+    dictionary. data1, data2 and data3 represent the data from the three years in years, in order (by default 2021,
+    2022 and 2023), which label their branches of the tree.
 
     Parts of the code is taken from: https://stackoverflow.com/questions/77214598/how-do-i-flip-my-igraph-
     tree-in-python-so-that-it-isnt-upside-down
@@ -304,9 +367,9 @@ def visualize_tree_game(data1: list[dict], data2: list[dict], data3: list[dict])
     g = Graph(directed=True)
     g.add_vertex('VCT')
 
-    id_1 = visual_tree_game_helper(g, i_d, data1, '2021')
-    id_2 = visual_tree_game_helper(g, id_1, data2, '2022')
-    visual_tree_game_helper(g, id_2, data3, '2023')
+    id_1 = visual_tree_game_helper(g, i_d, data1, years[0])
+    id_2 = visual_tree_game_helper(g, id_1, data2, years[1])
+    visual_tree_game_helper(g, id_2, data3, years[2])
 
     layt = g.layout("kk")
 
@@ -402,11 +465,13 @@ def visual_tree_game_helper(g: Graph, cur_id: int, data: list[dict], year: str)
     return cur_id + 1
 
 
-def visualize_tree_eco(data1: list[dict], data2: list[dict], data3: list[dict]) -> Figure:
+@timed('layout.visualize_tree_eco')
+def visualize_tree_eco(data1: list[dict], data2: list[dict], data3: list[dict],
+                       years: tuple[str, str, str] = ('2021', '2022', '2023')) -> Figure:
     """
     Returns a tree in the Figure class object from the following data of buy types given as lists of
-    dictionary. data1 represents the data from 2021, data2 represents the data from 2022, and data3 represents the data
-    from 2023.
+    dictionary. data1, data2 and data3 represent the data from the three years in years, in order (by default 2021,
+    2022 and 2023), which label their branches of the tree.
 
     Parts of the code is taken from: https://stackoverflow.com/questions/77214598/how-do-i-flip-my-igraph-tree-
     in-python-so-that-it-isnt-upside-down
@@ -415,9 +480,9 @@ def visualize_tree_eco(data1: list[dict], data2: list[dict], data3: list[dict])
     g = Graph(directed=True)
     g.add_vertex('VCT')
 
-    id_1 = visual_tree_econ_helper(g, i_d, data1, '2021')
-    id_2 = visual_tree_econ_helper(g, id_1, data2, '2022')
-    visual_tree_econ_helper(g, id_2, data3, '2023')
+    id_1 = visual_tree_econ_helper(g, i_d, data1, years[0])
+    id_2 = visual_tree_econ_helper(g, id_1, data2, years[1])
+    visual_tree_econ_helper(g, id_2, data3, years[2])
 
     layt = g.layout("kk")
 
@@ -501,17 +566,22 @@ if __name__ == '__main__':
         game_datas = []
         eco_datas = []
         game_trees, eco_trees = [], []
-        for x in range(1, 4):
-            with open('tree_data/maps_scores_202' + str(x) + '.csv') as game_file:
+        import os
+        from registry import discover_years
+        for data_year in discover_years('tree_data', r'maps_scores_(\d{4})\.csv'):
+            with open('tree_data/maps_scores_' + data_year + '.csv') as game_file:
                 game_dat = read_game(game_file)
 
-            with open('tree_data/eco_data_202' + str(x) + '.csv') as eco_file:
+            # a year without a full eco_data file only has a sample of it, shown in the eco tree but not counted
+            eco_full = os.path.exists('tree_data/eco_data_' + data_year + '.csv')
+            with open('tree_data/eco_data_' + data_year + ('.csv' if eco_full else '_sample.csv')) as eco_file:
                 eco_dat = read_buy_type(eco_file)
 
             game_datas.append(game_dat)
             eco_datas.append(eco_dat)
             game_trees.append(generate_tree(game_dat))
-            eco_trees.append(generate_tree(eco_dat))
+            if eco_full:
+                eco_trees.append(generate_tree(eco_dat))
 
         vct_tree = Tree('VCT', [])
         vct_tree.combine_all(game_trees)
@@ -522,8 +592,11 @@ if __name__ == '__main__':
         current_map = input("What map are you playing?").lower()
         print("This map " + vct_tree.best_side_for_map(current_map))
         print(eco_tree.best_buy_for_map(current_map))
-        visualize_tree_game(game_datas[0][1], game_datas[1][1], game_datas[2][1])
-        visualize_tree_eco(eco_datas[0][1], eco_datas[1][1], eco_datas[2][1])
+        from sampling import GAME_SAMPLE_SIZE, ECO_SAMPLE_SIZE, sample_matches
+        visualize_tree_game(*[sample_matches(dat[1], GAME_SAMPLE_SIZE) for dat in game_datas[-3:]],
+                            years=tuple(dat[0] for dat in game_datas[-3:]))
+        visualize_tree_eco(*[sample_matches(dat[1], ECO_SAMPLE_SIZE) for dat in eco_datas[-3:]],
+                           years=tuple(dat[0] for dat in eco_datas[-3:]))
 
         import doctest
 
@@ -532,7 +605,8 @@ if __name__ == '__main__':
 
         python_ta.check_all(config={
             'max-line-length': 120,
-            'extra-imports': ['igraph', 'plotly.graph_objects', 'plotly.graph_objs', 'dash.html'],
+            'extra-imports': ['igraph', 'plotly.graph_objects', 'plotly.graph_objs', 'dash.html', 'instrumentation',
+                              'os', 'registry', 'sampling'],
             'allowed-io': [],
             'max-nested-blocks': 5
         })
@@ -17,6 +17,7 @@ import networkx as nx
 from plotly.graph_objs import Scatter, Figure
 
 from graph import WeightedGraph
+from instrumentation import timed
 
 # Colours to use when visualizing different clusters.
 COLOUR_SCHEME = [
@@ -32,6 +33,7 @@ MAP_COLOUR = 'rgb(89, 205, 105)'
 AGENT_COLOUR = 'rgb(105, 89, 205)'
 
 
+@timed('layout.setup_weighted_graph')
 def setup_weighted_graph(graph: WeightedGraph, layout: str = 'spring_layout',
                          max_vertices: int = 5000) -> list:
     """
@@ -100,18 +102,26 @@ def return_weighted_graph(graph: WeightedGraph, layout: str = 'spring_layout',
     Returns the weighted graph given as a Figure class object
     """
     weight_positions, data = setup_weighted_graph(graph, layout, max_vertices)
+    return weighted_graph_figure(data, weight_positions)
+
+
+def weighted_graph_figure(data: list, weight_positions: Any) -> Figure:
+    """
+    Return a Figure class object of a weighted graph based on given data
+    where weight_positions are the weights to draw on edges for a weighted graph
+    """
     fig = Figure(data=data)
     fig.update_layout({'showlegend': False})
     fig.update_xaxes(showgrid=False, zeroline=False, visible=False)
     fig.update_yaxes(showgrid=False, zeroline=False, visible=False)
 
-    for w in weight_positions:
-        fig.add_annotation(
-            x=w[0], y=w[1],  # Text annotation position
-            xref="x", yref="y",  # Coordinate reference system
-            text=w[2],  # Text content
-            showarrow=False  # Hide arrow
-        )
+    # set all annotations at once, since add_annotation revalidates every existing annotation on each call
+    fig.update_layout(annotations=[{
+        'x': w[0], 'y': w[1],  # Text annotation position
+        'xref': "x", 'yref': "y",  # Coordinate reference system
+        'text': w[2],  # Text content
+        'showarrow': False  # Hide arrow
+    } for w in weight_positions])
 
     return fig
 
@@ -126,18 +136,7 @@ def draw_weighted_graph(data: list, weight_positions: Any, output_file: str = ''
             in your web browser)
     """
 
-    fig = Figure(data=data)
-    fig.update_layout({'showlegend': False})
-    fig.update_xaxes(showgrid=False, zeroline=False, visible=False)
-    fig.update_yaxes(showgrid=False, zeroline=False, visible=False)
-
-    for w in weight_positions:
-        fig.add_annotation(
-            x=w[0], y=w[1],  # Text annotation position
-            xref="x", yref="y",  # Coordinate reference system
-            text=w[2],  # Text content
-            showarrow=False  # Hide arrow
-        )
+    fig = weighted_graph_figure(data, weight_positions)
 
     if output_file == '':
         fig.show()
@@ -169,6 +168,6 @@ if __name__ == '__main__':
 
     python_ta.check_all(config={
         'max-line-length': 120,
-        'extra-imports': ['networkx', 'plotly.graph_objs', 'graph'],
+        'extra-imports': ['networkx', 'plotly.graph_objs', 'graph', 'instrumentation'],
         'max-nested-blocks': 5
     })
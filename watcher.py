@@ -0,0 +1,210 @@
+"""Valorant Data Watcher File
+
+This python module contains a watcher that keeps a DataRegistry up to date while the app is serving: when a csv file
+is added to or changed in tree_data/ or graph_data/ (e.g. the files of a new tournament year), the new files are
+ingested in the background and a new data version is published to the registry, without restarting the app.
+
+The watcher runs an asyncio loop in a daemon thread. Every interval seconds, it compares the size and modification
+time of every csv file with the ones of the data version being served; once a change has been stable for one whole
+interval (so that files that are still being written are not read), the files are parsed in a worker thread into a
+new registry. Only the files that changed are parsed again: the datasets of the files that did not change are
+carried over from the served registry, and the structures built from them (trees, graph, cube, ...) are rebuilt from
+the carried over datasets. The new registry is then published in one step (see DataRegistry.publish), so requests
+keep being answered from the old data version until the new one is complete.
+
+If the registry answers from a memory-mapped snapshot (see snapshot.py), the watcher is given the snapshot root
+instead: the new files are written into a new snapshot (or the snapshot already written from them by another worker
+is mapped), which is then published to the registry in the same way.
+
+If the files cannot be ingested (e.g. a csv file is malformed), the error is logged and the old data version keeps
+being served; the files are ingested again once they change.
+
+This file is Copyright (c) 2024 of Project Team
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import asyncio
+import logging
+import os
+import threading
+
+from registry import DataRegistry
+from snapshot import ensure_snapshot
+from instrumentation import timed
+
+INTERVAL = 2.0
+LOGGER = logging.getLogger(__name__)
+# the datasets of a registry that are read from a single file, with a function returning that file
+FILE_DATASETS = {
+    'agent_roles': lambda registry: registry.graph_path('agent_roles.csv'),
+    'agent_combos': lambda registry: registry.graph_path('all_agents.csv'),
+}
+
+
+def signature(registry: DataRegistry) -> dict[str, tuple[int, int]]:
+    """
+    Return the (modification time in nanoseconds, size) of every csv file in the graph and tree directories of
+    registry, in the format {path: (mtime_ns, size)}
+    """
+    files = {}
+    for directory in (registry.graph_dir, registry.tree_dir):
+        if os.path.isdir(directory):
+            for entry in os.scandir(directory):
+                if entry.name.endswith('.csv') and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def reusable(fresh: DataRegistry, changed: set[str]) -> list[str]:
+    """
+    Return the names of the datasets of fresh that can be reused from the registry being served, because none of the
+    files they are read from are in changed
+
+    These are the parsed maps_scores and eco_data files of each year, and the datasets of FILE_DATASETS. Every other
+    dataset is built from these, so it is rebuilt instead.
+    """
+    sources = {name: path(fresh) for name, path in FILE_DATASETS.items()}
+    for year in fresh.years:
+        sources[f'game_data_{year}'] = fresh.game_path(year)
+        sources[f'eco_data_{year}'] = fresh.eco_path(year)
+        sources[f'eco_sample_data_{year}'] = fresh.eco_sample_path(year)
+    return [name for name, path in sources.items() if path not in changed]
+
+
+class DataWatcher:
+    """A background watcher that publishes a new data version to a registry when its csv files change.
+
+    Instance Attributes:
+        - registry: the registry being kept up to date
+        - interval: the number of seconds between two checks of the files
+        - on_publish: functions called (in the worker thread) right after each new data version is published, e.g.
+          to compute app-level caches of the new version before requests ask for them
+        - versions: the data versions published by this watcher, in order
+        - snapshot_root: the snapshot root directory that the new data versions are written to and mapped from, or ''
+          if they are published as parsed datasets
+    """
+    registry: DataRegistry
+    interval: float
+    on_publish: list[Callable[[], Any]]
+    versions: list[str]
+    snapshot_root: str
+    # Private Instance Attributes:
+    #     - _served: the signature of the files of the data version being served
+    #     - _pending: the last signature seen that differs from _served, or None if there is none
+    #     - _failed: the signature of the files that last failed to be ingested, or None if there is none
+    #     - _stop: set to stop the watcher
+    #     - _thread: the thread running the asyncio loop, or None if the watcher has not been started
+    _served: dict[str, tuple[int, int]]
+    _pending: Optional[dict[str, tuple[int, int]]]
+    _failed: Optional[dict[str, tuple[int, int]]]
+    _stop: threading.Event
+    _thread: Optional[threading.Thread]
+
+    def __init__(self, registry: DataRegistry, interval: float = INTERVAL,
+                 on_publish: Optional[list[Callable[[], Any]]] = None, snapshot_root: str = '') -> None:
+        """Initialize a watcher of the files of registry, taking their current state as the served data version."""
+        self.registry = registry
+        self.interval = interval
+        self.on_publish = list(on_publish or [])
+        self.versions = []
+        self.snapshot_root = snapshot_root
+        self._served = signature(registry)
+        self._pending = None
+        self._failed = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self) -> bool:
+        """
+        Check the files once, ingesting and publishing them if a change has been stable since the previous check, and
+        return whether a new data version was published
+
+        If the files cannot be ingested, log the error and keep serving the old data version until the files change
+        again.
+        """
+        current = signature(self.registry)
+        if current == self._served:
+            self._pending = None
+            return False
+        if current != self._pending:
+            self._pending = current  # wait for one more interval, in case the files are still being written
+            return False
+        if current == self._failed:
+            return False
+        try:
+            self.ingest(current)
+        except Exception:
+            LOGGER.exception('could not ingest the changed data files, still serving data version %s',
+                             self.registry.data_version())
+            self._failed = current
+            return False
+        return True
+
+    @timed('watcher.ingest')
+    def ingest(self, current: dict[str, tuple[int, int]]) -> None:
+        """
+        Parse the files with the given signature into a new registry, and publish it to self.registry
+
+        A missing file is skipped (the error is raised again when its dataset is asked for), but any other error is
+        raised before anything is published. An error raised by a function of self.on_publish is logged instead.
+        """
+        changed = {path for path in set(current) | set(self._served) if current.get(path) != self._served.get(path)}
+        fresh = DataRegistry(self.registry.graph_dir, self.registry.tree_dir,
+                             columnar_dir=self.registry.columnar_dir)
+        if self.snapshot_root:
+            fresh.use_snapshot(ensure_snapshot(fresh, self.snapshot_root))
+            accessors = [lambda y=year: fresh.eco_sample(y) for year in fresh.years[-3:]]
+        else:
+            fresh.reuse(self.registry, reusable(fresh, changed))
+            accessors = [fresh.map_ref, fresh.map_agent_graph, fresh.vct_tree, fresh.eco_cube]
+            accessors.extend(lambda y=year: fresh.eco_sample(y) for year in fresh.years[-3:])
+        for accessor in accessors:
+            try:
+                accessor()
+            except OSError:
+                pass  # raised again when the dataset is asked for
+
+        self.registry.publish(fresh)
+        self._served, self._pending, self._failed = current, None, None
+        self.versions.append(fresh.data_version())
+        for function in self.on_publish:
+            try:
+                function()
+            except Exception:
+                LOGGER.exception('on_publish function %r failed for data version %s', function, self.versions[-1])
+
+    async def run(self) -> None:
+        """Check the files every self.interval seconds until the watcher is stopped, ingesting in a worker thread."""
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            await asyncio.sleep(self.interval)
+            try:
+                await loop.run_in_executor(None, self.check)
+            except Exception:  # e.g. a file removed while it was being listed: check again next time
+                LOGGER.exception('could not check the data files')
+
+    def start(self) -> threading.Thread:
+        """Start the watcher in a daemon thread, and return that thread."""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), name='data-watcher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        """Stop the watcher after its current check."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
+    import python_ta
+
+    python_ta.check_all(config={
+        'max-line-length': 120,
+        'extra-imports': ['asyncio', 'logging', 'os', 'threading', 'registry', 'snapshot', 'instrumentation'],
+        'allowed-io': [],
+        'max-nested-blocks': 5
+    })